@@ -7,6 +7,10 @@ import os
 import sys
 from pathlib import Path
 
+# Bounds for the Section 2 folder preview
+MAX_DEPTH = 3
+MAX_PREVIEW = 200
+
 print("=" * 80)
 print("🔍 FACE EMOTION ANALYZER - IMAGE SEARCH DIAGNOSTICS")
 print("=" * 80)
@@ -41,26 +45,52 @@ try:
     if os.path.exists(folder_path):
         print("✅ Folder exists!")
         
-        # List contents
+        # List contents (scandir reuses d_type, so no extra stat per entry)
         print(f"\n   Contents:")
-        for root, dirs, files in os.walk(folder_path):
-            level = root.replace(folder_path, '').count(os.sep)
+        stack = [(folder_path, 0)]
+        total_files_seen = 0
+        truncated = False
+        while stack:
+            root, level = stack.pop()
             indent = ' ' * 2 * level
             rel_path = os.path.relpath(root, folder_path)
             print(f"{indent}📁 {rel_path}/")
-            
+
             sub_indent = ' ' * 2 * (level + 1)
-            for file in files[:5]:  # Show first 5 files
-                print(f"{sub_indent}📄 {file}")
-            if len(files) > 5:
-                print(f"{sub_indent}... and {len(files) - 5} more files")
+            subdirs = []
+            shown = 0
+            hidden = 0
+            with os.scandir(root) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                        continue
+                    total_files_seen += 1
+                    if total_files_seen > MAX_PREVIEW:
+                        truncated = True
+                        break
+                    if shown < 5:  # Show first 5 files
+                        print(f"{sub_indent}📄 {entry.name}")
+                        shown += 1
+                    else:
+                        hidden += 1
+            if hidden:
+                print(f"{sub_indent}... and {hidden} more files")
+            if truncated:
+                break
+
+            if level < MAX_DEPTH:
+                stack.extend((d, level + 1) for d in reversed(subdirs))
+            elif subdirs:
+                print(f"{sub_indent}... {len(subdirs)} deeper folder(s) not listed")
+
+        if truncated:
+            print(f"   … truncated after {MAX_PREVIEW} files")
     else:
         print(f"❌ Folder does not exist: {folder_path}")
-        print("\n   FIX OPTIONS:")
-        print("   Option A: Edit image_storage.py line 14")
+        print("\n   FIX:")
+        print("   Edit LOCAL_IMAGES_FOLDER in app/services/image_storage.py")
         print("   LOCAL_IMAGES_FOLDER = 'C:/path/to/your/images'")
-        print("\n   Option B: Use API to set folder")
-        print("   curl -X POST http://localhost:8000/api/v1/set-images-folder -F folder_path=C:/path/to/images")
         
 except Exception as e:
     print(f"❌ Error: {e}")
@@ -131,7 +161,6 @@ try:
     print("   - POST /api/v1/analyze-face")
     print("   - POST /api/v1/search")
     print("   - GET /api/v1/local-images")
-    print("   - POST /api/v1/set-images-folder")
     print("   - GET /api/v1/all-images")
     print("   - GET /api/v1/storage-stats")
     
@@ -1,12 +1,23 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
 import logging
 import asyncio
 
 # Import routes
 from app.routes import search, health
+from app.services.emotion_detection import warm_up_emotion_model
+from app.services.face_recognition_service import index_images_folder, build_face_index
+from app.services.image_storage import FACES_DIR, get_local_images_folder_path, prepare_storage_dirs
+from app.services.image_catalog import sync_image_catalog
+from app.services.face_index import load_stored_face_index
+from app.services.database import flush_emotion_logs
+from app.services.db_init import init_db
+from app.middleware.compression import JSONGZipMiddleware
 from app.utils.logger import setup_logger
+from app.utils.validators import MULTIPART_OVERHEAD_BYTES, upload_too_large_error
+from app.config import settings
 
 logger = setup_logger(__name__)
 
@@ -18,10 +29,51 @@ async def lifespan(app: FastAPI):
     logger.info("🚀 Application starting...")
     logger.info(f"📊 Processing mode: emotion analysis with image search")
     
+    # Storage directories are created once here instead of on each request
+    prepare_storage_dirs()
+    
+    # Create missing session tables; local folder search still works without the database
+    try:
+        await init_db()
+    except Exception as e:
+        logger.warning(f"⚠️ Could not initialize database: {e}")
+    
+    # Pick up images saved before the catalog existed, drop ones deleted since
+    await asyncio.to_thread(sync_image_catalog, FACES_DIR)
+    
+    # Stored faces live in the image catalog; each worker loads its index once
+    try:
+        await asyncio.to_thread(load_stored_face_index)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not load stored face index: {e}")
+    
+    # Load the emotion model now so the first request does not pay for it
+    try:
+        await asyncio.to_thread(warm_up_emotion_model)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not warm up emotion model: {e}")
+    
+    # Build the face index once; /analyze-face matches against it
+    # (workers index one at a time under the cache file lock; later ones reuse the saved cache)
+    try:
+        images_folder = get_local_images_folder_path()
+        indexed_faces = await asyncio.to_thread(index_images_folder, str(images_folder))
+        app.state.face_index = await asyncio.to_thread(build_face_index, indexed_faces)
+        logger.info(f"✅ Face index ready: {len(app.state.face_index[0])} faces")
+    except Exception as e:
+        logger.warning(f"⚠️ Could not build face index at startup: {e}")
+        app.state.face_index = None
+    
     yield
     
     # Shutdown
     logger.info("🛑 Application shutting down...")
+    
+    # Write emotion logs still waiting for a full batch
+    try:
+        await flush_emotion_logs()
+    except Exception as e:
+        logger.error(f"❌ Could not flush emotion logs at shutdown: {e}")
 
 
 # Create FastAPI app
@@ -30,8 +82,19 @@ app = FastAPI(
     version="1.0.0",
     description="Capture your face and discover your emotional state. Search similar images from local folder + backend storage.",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
+# Reject oversized uploads early (registered before CORS so 413s still carry CORS headers)
+@app.middleware("http")
+async def limit_request_size(request, call_next):
+    """Reject oversized uploads from their Content-Length, before the body is parsed"""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit():
+        if int(content_length) > settings.MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES:
+            return ORJSONResponse(status_code=413, content=upload_too_large_error())
+    return await call_next(request)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -41,6 +104,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress JSON responses (base64 and path-heavy payloads compress well)
+app.add_middleware(JSONGZipMiddleware, minimum_size=1024, compresslevel=4)
+
 # Include routes
 app.include_router(health.router, prefix="/api", tags=["health"])
 app.include_router(search.router, prefix="/api", tags=["search"])
@@ -74,11 +140,29 @@ async def health_endpoint():
 
 
 if __name__ == "__main__":
+    import os
     import uvicorn
-    uvicorn.run(
-        "app.main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        log_level="info",
-    )
+    
+    if os.getenv("RELOAD", "true").lower() == "true":
+        # Development: single auto-reloading worker
+        uvicorn.run(
+            "app.main:app",
+            host="0.0.0.0",
+            port=8000,
+            reload=True,
+            log_level="info",
+        )
+    else:
+        # Production: one worker per core on uvloop + httptools,
+        # each worker single-threaded in BLAS/OpenMP (spawned workers inherit this)
+        os.environ.setdefault("OMP_NUM_THREADS", "1")
+        os.environ.setdefault("MKL_NUM_THREADS", "1")
+        uvicorn.run(
+            "app.main:app",
+            host="0.0.0.0",
+            port=8000,
+            workers=os.cpu_count(),
+            loop="uvloop",
+            http="httptools",
+            log_level="info",
+        )
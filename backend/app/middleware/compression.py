@@ -0,0 +1,11 @@
+from starlette.middleware.gzip import GZipMiddleware
+
+
+class JSONGZipMiddleware(GZipMiddleware):
+    """GZip for API payloads; image files are already compressed and pass through untouched"""
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and "/image/" in scope["path"]:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
@@ -4,32 +4,39 @@ Handles face capture, emotion analysis, and similarity search
 Compatible with existing emotion.py and services
 """
 
-from fastapi import APIRouter, File, UploadFile, Form, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, File, UploadFile, Form, HTTPException, Request
+from fastapi.responses import ORJSONResponse, FileResponse, Response
+import asyncio
 import base64
-import io
-import uuid
-from datetime import datetime
+from collections import Counter
 import logging
-from PIL import Image
+import re
 import numpy as np
-import os
 from pathlib import Path
+from urllib.parse import quote
 
 # Import your existing services (matching your actual code)
-from app.services.emotion_detection import analyze_emotion
+from app.services.emotion_detection import analyze_emotion_batch, analyze_emotion_from_bytes_cached
 from app.services.face_recognition_service import (
-    extract_face_encoding_from_bytes,
-    find_matching_faces,
-    index_images_folder
+    extract_face_encoding_from_bytes_cached,
+    find_matching_faces
 )
 from app.services.image_storage import (
     get_images_from_local_folder,
-    get_similar_images,
-    read_image_as_base64,
+    read_thumbnail_as_base64,
+    get_thumbnail_path,
+    get_image_id,
+    resolve_image_id,
+    get_image_mime_type,
+    get_image_etag,
+    IMAGE_CACHE_CONTROL,
     get_storage_stats,
-    LOCAL_IMAGES_FOLDER
+    get_local_images_folder_path
 )
+from app.services.emotion_text import generate_emotion_statement
+from app.utils.content_cache import content_key
+from app.utils.ids import fast_id, iso_timestamp, utc_timestamp
+from app.utils.validators import read_upload, upload_too_large_error
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/v1", tags=["face-emotion"])
@@ -37,10 +44,20 @@ router = APIRouter(prefix="/v1", tags=["face-emotion"])
 # Set local images folder path
 LOCAL_IMAGES_FOLDER_PATH = "frontend/Images"
 
+# Images folder, resolved once (the folder is set in image_storage, not per request)
+_images_folder = str(get_local_images_folder_path())
+
+# Path component that is exactly an emotion label (e.g. .../Happy/img.jpg)
+_EMOTION_FOLDER_RE = re.compile(
+    r'(?:^|[\\/])(happy|sad|angry|fear|surprise|disgust|neutral)(?:[\\/]|$)',
+    re.IGNORECASE
+)
+
 # ==================== FACE CAPTURE & ANALYSIS ====================
 
 @router.post("/analyze-face")
 async def analyze_face(
+    request: Request,
     image: UploadFile = File(...),
     user_name: str = Form(...),
     privacy_agreed: bool = Form(...)
@@ -58,32 +75,26 @@ async def analyze_face(
     """
     try:
         # Generate session ID
-        session_id = str(uuid.uuid4())
-        
-        # Read image file
-        image_data = await image.read()
-        
-        # Save temporary image file
-        temp_dir = "temp_uploads"
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        temp_image_path = os.path.join(temp_dir, f"{session_id}.jpg")
+        session_id = fast_id()
         
-        # Write image to temp file
-        with open(temp_image_path, 'wb') as f:
-            f.write(image_data)
+        # Read image file in bounded chunks
+        image_data = await read_upload(image)
+        if image_data is None:
+            return ORJSONResponse(status_code=413, content=upload_too_large_error())
         
         # Convert to base64
         base64_image = base64.b64encode(image_data).decode('utf-8')
         
-        logger.info(f"Processing image for session: {session_id}")
+        logger.info("Processing image for session: %s", session_id)
         
-        # ===== STEP 1: Extract face encoding from captured image =====
-        face_encodings = extract_face_encoding_from_bytes(image_data)
+        # ===== STEP 1: Extract face encoding from captured image (memoized per content) =====
+        face_encodings = await asyncio.to_thread(
+            extract_face_encoding_from_bytes_cached, content_key(image_data), image_data
+        )
         
         if not face_encodings:
-            logger.warning(f"No face detected in captured image for session {session_id}")
-            return JSONResponse(
+            logger.warning("No face detected in captured image for session %s", session_id)
+            return ORJSONResponse(
                 status_code=400,
                 content={
                     "success": False,
@@ -94,25 +105,24 @@ async def analyze_face(
         
         # Use the first (largest) face if multiple faces detected
         query_encoding = face_encodings[0]
-        logger.info(f"✅ Face encoding extracted from captured image")
+        logger.info("✅ Face encoding extracted from captured image")
         
         # ===== STEP 2: Find matching faces in images folder =====
-        # Get project root to find images folder
-        current_file = Path(__file__).resolve()
-        project_root = current_file.parent.parent.parent.parent
-        images_folder = project_root / LOCAL_IMAGES_FOLDER.replace('\\', '/')
+        images_folder = _images_folder
         
-        logger.info(f"Searching for matching faces in: {images_folder}")
-        matching_faces = find_matching_faces(
+        logger.debug("Searching for matching faces in: %s", images_folder)
+        matching_faces = await asyncio.to_thread(
+            find_matching_faces,
             query_encoding=query_encoding,
-            images_folder=str(images_folder),
+            images_folder=images_folder,
             tolerance=0.6,  # Adjustable threshold
-            max_results=10
+            max_results=10,
+            face_index=getattr(request.app.state, "face_index", None)  # Built at startup
         )
         
         if not matching_faces:
-            logger.warning(f"No matching faces found for session {session_id}")
-            return JSONResponse(
+            logger.warning("No matching faces found for session %s", session_id)
+            return ORJSONResponse(
                 status_code=200,
                 content={
                     "success": True,
@@ -127,44 +137,43 @@ async def analyze_face(
                 }
             )
         
-        logger.info(f"✅ Found {len(matching_faces)} matching face(s)")
+        logger.info("✅ Found %d matching face(s)", len(matching_faces))
         
         # ===== STEP 3: Extract emotions from matched images =====
         matched_images_with_emotions = []
         emotion_results = []
         
-        for match in matching_faces:
+        # Analyze emotion from the matched images (not the captured image) in one batch
+        matched_emotions = await asyncio.to_thread(
+            analyze_emotion_batch, [match['image_path'] for match in matching_faces]
+        )
+        
+        for match, (emotion, emotion_dist, emotion_conf) in zip(matching_faces, matched_emotions):
             image_path = match['image_path']
             similarity = match['similarity']
             
-            # Analyze emotion from the matched image (not the captured image)
-            emotion, emotion_dist, emotion_conf = analyze_emotion(image_path)
-            
             # Get image metadata
-            from pathlib import Path as PathLib
-            image_path_obj = PathLib(image_path)
+            image_path_obj = Path(image_path)
             filename = image_path_obj.name
             
             # Detect emotion from folder name if emotion detection failed
             if emotion == 'neutral' and emotion_conf < 0.5:
-                path_parts = str(image_path).lower().split('/')
-                for part in path_parts:
-                    if part in ['happy', 'sad', 'angry', 'fear', 'surprise', 'disgust', 'neutral']:
-                        emotion = part
-                        emotion_conf = 0.8
-                        break
+                folder_match = _EMOTION_FOLDER_RE.search(image_path)
+                if folder_match:
+                    emotion = folder_match.group(1).lower()
+                    emotion_conf = 0.8
             
-            # Convert to base64
-            base64_data = read_image_as_base64(image_path)
+            # Link to the image instead of inlining it as base64
+            image_id = get_image_id(image_path)
             
-            if base64_data:
+            if image_id:
                 matched_images_with_emotions.append({
                     "filename": filename,
                     "emotion": emotion,
                     "confidence": float(emotion_conf),
                     "similarity": float(similarity),
                     "source": "local_folder",
-                    "image_base64": base64_data,
+                    "image_url": f"/api/v1/image/{quote(image_id)}",
                     "path": image_path
                 })
                 
@@ -175,35 +184,31 @@ async def analyze_face(
         
         # ===== STEP 4: Aggregate emotions from matched images =====
         if emotion_results:
-            # Count emotions
-            emotion_counts = {}
-            total_confidence = 0.0
-            for result in emotion_results:
-                emotion = result['emotion']
-                conf = result['confidence']
-                if emotion not in emotion_counts:
-                    emotion_counts[emotion] = {'count': 0, 'total_conf': 0.0}
-                emotion_counts[emotion]['count'] += 1
-                emotion_counts[emotion]['total_conf'] += conf
-                total_confidence += conf
+            # Count emotions (ties resolve to the first emotion seen)
+            emotions = np.array([result['emotion'] for result in emotion_results])
+            confidences = np.fromiter(
+                (result['confidence'] for result in emotion_results),
+                dtype=np.float64,
+                count=len(emotion_results)
+            )
+            emotion_counts = Counter(emotions.tolist())
             
-            # Find dominant emotion
-            dominant_emotion = max(emotion_counts, key=lambda x: emotion_counts[x]['count'])
-            dominant_count = emotion_counts[dominant_emotion]['count']
-            dominant_confidence = emotion_counts[dominant_emotion]['total_conf'] / dominant_count if dominant_count > 0 else 0.0
+            # Find dominant emotion and its mean confidence
+            dominant_emotion = emotion_counts.most_common(1)[0][0]
+            dominant_confidence = float(confidences[emotions == dominant_emotion].mean())
             
             # Build distribution
             total_matches = len(emotion_results)
             all_emotions = {
-                emotion: counts['count'] / total_matches
-                for emotion, counts in emotion_counts.items()
+                emotion: count / total_matches
+                for emotion, count in emotion_counts.items()
             }
         else:
             dominant_emotion = 'neutral'
             dominant_confidence = 0.0
             all_emotions = {}
         
-        logger.info(f"✅ Aggregated emotion: {dominant_emotion} ({dominant_confidence*100:.1f}%)")
+        logger.info("✅ Aggregated emotion: %s (%.1f%%)", dominant_emotion, dominant_confidence * 100)
         
         # Generate emotion statement
         emotion_statement = generate_emotion_statement(dominant_emotion, dominant_confidence)
@@ -217,29 +222,22 @@ async def analyze_face(
             "emotion_confidence": float(dominant_confidence),
             "all_emotions": all_emotions,
             "statement": emotion_statement,
-            "captured_at": datetime.utcnow().isoformat(),
+            "captured_at": utc_timestamp(),
             "image_base64": base64_image,
             "matched_count": len(matched_images_with_emotions),
             "similar_images": matched_images_with_emotions  # Matched faces with their emotions
         }
         
-        logger.info(f"Analysis complete for session {session_id}")
-        
-        # Clean up temp file
-        try:
-            if os.path.exists(temp_image_path):
-                os.remove(temp_image_path)
-        except Exception as e:
-            logger.warning(f"Could not delete temp file: {e}")
+        logger.info("Analysis complete for session %s", session_id)
         
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=200,
             content=response_data
         )
         
     except Exception as e:
-        logger.error(f"Error analyzing face: {str(e)}", exc_info=True)
-        return JSONResponse(
+        logger.error("Error analyzing face: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+        return ORJSONResponse(
             status_code=500,
             content={
                 "success": False,
@@ -264,26 +262,22 @@ async def search_faces(
         Emotion analysis and similar faces
     """
     try:
-        image_data = await image.read()
+        image_data = await read_upload(image)
+        if image_data is None:
+            return ORJSONResponse(status_code=413, content=upload_too_large_error())
         
-        # Save temporary image file
-        temp_dir = "temp_uploads"
-        os.makedirs(temp_dir, exist_ok=True)
+        session_id = fast_id()
         
-        session_id = str(uuid.uuid4())
-        temp_image_path = os.path.join(temp_dir, f"{session_id}.jpg")
+        logger.info("Searching similar faces for user: %s", user_name)
         
-        with open(temp_image_path, 'wb') as f:
-            f.write(image_data)
-        
-        logger.info(f"Searching similar faces for user: {user_name}")
-        
-        # Analyze emotion
-        dominant_emotion, emotion_dist, confidence = analyze_emotion(temp_image_path)
+        # Analyze emotion straight from the uploaded bytes (memoized per content)
+        dominant_emotion, emotion_dist, confidence = await asyncio.to_thread(
+            analyze_emotion_from_bytes_cached, content_key(image_data), image_data
+        )
         
         if dominant_emotion == 'neutral' and confidence == 0.0:
-            logger.warning(f"Analysis failed for user {user_name}")
-            return JSONResponse(
+            logger.warning("Analysis failed for user %s", user_name)
+            return ORJSONResponse(
                 status_code=400,
                 content={
                     "success": False,
@@ -292,7 +286,7 @@ async def search_faces(
                 }
             )
         
-        logger.info(f"Found emotion: {dominant_emotion}")
+        logger.info("Found emotion: %s", dominant_emotion)
         
         emotion_statement = generate_emotion_statement(dominant_emotion, confidence)
         
@@ -308,24 +302,17 @@ async def search_faces(
             "all_emotions": emotion_dist,
             "statement": emotion_statement,
             "similar_faces": similar_faces,
-            "searched_at": datetime.utcnow().isoformat()
+            "searched_at": utc_timestamp()
         }
         
-        # Clean up temp file
-        try:
-            if os.path.exists(temp_image_path):
-                os.remove(temp_image_path)
-        except Exception as e:
-            logger.warning(f"Could not delete temp file: {e}")
-        
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=200,
             content=response_data
         )
         
     except Exception as e:
-        logger.error(f"Error searching faces: {str(e)}", exc_info=True)
-        return JSONResponse(
+        logger.error("Error searching faces: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+        return ORJSONResponse(
             status_code=500,
             content={
                 "success": False,
@@ -339,9 +326,9 @@ async def search_faces(
 async def get_session(session_id: str):
     """Get session details by session ID"""
     try:
-        logger.info(f"Fetching session: {session_id}")
+        logger.info("Fetching session: %s", session_id)
         
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=200,
             content={
                 "session_id": session_id,
@@ -349,8 +336,8 @@ async def get_session(session_id: str):
             }
         )
     except Exception as e:
-        logger.error(f"Error fetching session: {str(e)}")
-        return JSONResponse(
+        logger.error("Error fetching session: %s", e)
+        return ORJSONResponse(
             status_code=500,
             content={"error": "Error fetching session"}
         )
@@ -359,49 +346,96 @@ async def get_session(session_id: str):
 @router.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=200,
         content={
             "status": "healthy",
             "service": "face-emotion-analyzer",
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utc_timestamp()
         }
     )
 
 
+@router.get("/image/{image_id:path}")
+async def get_image(image_id: str, request: Request, full: bool = False):
+    """
+    Serve an image from the local folder
+    
+    A 256px JPEG thumbnail is served unless full is set.
+    Sent with Cache-Control and an ETag; a matching If-None-Match gets 304.
+    
+    Args:
+        image_id: Path relative to the local images folder
+        full: Serve the original full-resolution file
+    
+    Returns:
+        Raw image file
+    """
+    image_path = resolve_image_id(image_id)
+    
+    if image_path is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    if not full:
+        image_path = await asyncio.to_thread(get_thumbnail_path, image_path, "local_folder") or image_path
+    
+    headers = {"Cache-Control": IMAGE_CACHE_CONTROL, "ETag": get_image_etag(image_path)}
+    
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    
+    return FileResponse(image_path, media_type=get_image_mime_type(image_path), headers=headers)
+
+
 @router.get("/local-images")
-async def get_local_images(emotion: str = None):
+async def get_local_images(emotion: str = None, inline: bool = False):
     """
     Get images from local folder (frontend/Images/)
     
     Args:
         emotion: Optional emotion filter (happy, sad, angry, etc.)
+        inline: Also embed each image as base64 (default: URL only)
     
     Returns:
-        List of images with base64 encoded data
+        List of images with their URLs
     """
     try:
-        logger.info(f"Fetching local images (emotion filter: {emotion})")
+        logger.info("Fetching local images (emotion filter: %s)", emotion)
         
         # Get images from local folder
         images = get_images_from_local_folder(emotion=emotion)
         
-        # Convert to base64 and prepare response
-        result_images = []
+        # Link to each image; only read and encode files when inline data is asked for
+        listed = []
         for img in images[:10]:  # Max 10 results
-            base64_data = read_image_as_base64(img['path'])
-            if base64_data:
-                result_images.append({
-                    "filename": img['filename'],
-                    "emotion": img['emotion'],
-                    "confidence": img.get('confidence', 0.8),
-                    "source": img['source'],
-                    "image_base64": base64_data,
-                    "size": img.get('size', 0),
-                    "created": img.get('created', '')
-                })
+            image_id = get_image_id(img['path'])
+            if image_id:
+                listed.append((img, image_id))
+        
+        # Column of encoded thumbnails, read concurrently, zipped into the entries once
+        if inline:
+            images_base64 = await asyncio.gather(*(
+                asyncio.to_thread(read_thumbnail_as_base64, img['path']) for img, _ in listed
+            ))
+        else:
+            images_base64 = [None] * len(listed)
         
-        return JSONResponse(
+        result_images = []
+        for (img, image_id), img_base64 in zip(listed, images_base64):
+            result_image = {
+                "filename": img['filename'],
+                "emotion": img['emotion'],
+                "confidence": img.get('confidence', 0.8),
+                "source": img['source'],
+                "image_url": f"/api/v1/image/{quote(image_id)}",
+                "size": img.get('size', 0),
+                "created": iso_timestamp(img.get('created_ts'))
+            }
+            if inline:
+                result_image["image_base64"] = img_base64
+            result_images.append(result_image)
+        
+        return ORJSONResponse(
             status_code=200,
             content={
                 "success": True,
@@ -412,8 +446,8 @@ async def get_local_images(emotion: str = None):
         )
     
     except Exception as e:
-        logger.error(f"Error fetching local images: {str(e)}", exc_info=True)
-        return JSONResponse(
+        logger.error("Error fetching local images: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+        return ORJSONResponse(
             status_code=500,
             content={
                 "success": False,
@@ -436,7 +470,7 @@ async def get_storage_statistics():
         
         stats = get_storage_stats()
         
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=200,
             content={
                 "success": True,
@@ -445,8 +479,8 @@ async def get_storage_statistics():
         )
     
     except Exception as e:
-        logger.error(f"Error fetching storage stats: {str(e)}", exc_info=True)
-        return JSONResponse(
+        logger.error("Error fetching storage stats: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+        return ORJSONResponse(
             status_code=500,
             content={
                 "success": False,
@@ -455,32 +489,3 @@ async def get_storage_statistics():
             }
         )
 
-
-# ==================== HELPER FUNCTIONS ====================
-
-def generate_emotion_statement(emotion: str, confidence: float) -> str:
-    """
-    Generate human-readable emotion statement
-    
-    Args:
-        emotion: Emotion label ('happy', 'sad', 'angry', 'fear', 'neutral', 'disgust', 'surprise')
-        confidence: Confidence score (0-1)
-    
-    Returns:
-        Human-readable statement with emoji
-    """
-    emotion_descriptions = {
-        "happy": "😊 You look happy and cheerful!",
-        "sad": "😔 You seem to be feeling sad.",
-        "angry": "😠 You appear to be feeling angry.",
-        "fear": "😟 You seem fearful or anxious.",
-        "surprise": "😮 You look surprised!",
-        "disgust": "😕 You seem disgusted.",
-        "neutral": "😐 Your expression is neutral.",
-        "disgust": "😕 You seem disgusted."
-    }
-    
-    confidence_pct = int(confidence * 100)
-    base_statement = emotion_descriptions.get(emotion, "Your emotional state is unclear.")
-    
-    return f"{base_statement} (Confidence: {confidence_pct}%)"
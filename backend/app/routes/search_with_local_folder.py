@@ -1,33 +1,55 @@
 """
 Backend API endpoint for face emotion detection with local folder + backend storage
 Handles face capture, emotion analysis, and searches from BOTH local folder AND backend
+(with no local folder configured, this is the backend-storage-only variant)
 """
 
-from fastapi import APIRouter, File, UploadFile, Form, HTTPException, Query
-from fastapi.responses import JSONResponse
-import base64
-import io
-import uuid
-from datetime import datetime
+from fastapi import APIRouter, File, UploadFile, Form, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse, FileResponse, Response
+import asyncio
+from urllib.parse import quote
 import logging
-import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Optional: MessagePack bodies carry image bytes without base64 expansion
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
 
 # Import services
-from app.services.emotion import analyze_emotion
+from app.services.emotion import analyze_emotion_cached
+from app.services.face_recognition_service import extract_face_encoding_from_array_cached
 # UPDATED: Import storage service with local folder support
 from app.services.image_storage import (
     save_session_image, 
     save_face_image, 
     get_similar_images,
-    read_image_as_base64,
+    read_thumbnail_as_base64,
+    read_thumbnail_bytes,
+    get_thumbnail_path,
+    get_image_id,
+    resolve_image_id,
+    get_image_mime_type,
+    get_image_etag,
+    IMAGE_CACHE_CONTROL,
     get_storage_stats,
     get_all_stored_images,
     set_local_images_folder,
     get_images_from_local_folder
 )
+from app.services.emotion_text import generate_emotion_statement
+from app.utils.content_cache import content_key
+from app.utils.ids import fast_id, iso_timestamp, utc_timestamp
+from app.utils.imaging import decode_rgb
+from app.utils.validators import read_upload, upload_too_large_error
 
 logger = logging.getLogger(__name__)
-router = APIRouter(prefix="/v1", tags=["face-emotion"])
+router = APIRouter(prefix="/v1", tags=["face-emotion"], default_response_class=ORJSONResponse)
+
+# Dedicated pool for image reads so a page of results overlaps its disk reads
+_image_executor = ThreadPoolExecutor(max_workers=10, thread_name_prefix="image-read")
 
 # ==================== CONFIGURATION ENDPOINT ====================
 
@@ -46,7 +68,7 @@ async def set_images_folder(folder_path: str = Form(...)):
         success = set_local_images_folder(folder_path)
         
         if success:
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=200,
                 content={
                     "success": True,
@@ -55,7 +77,7 @@ async def set_images_folder(folder_path: str = Form(...)):
                 }
             )
         else:
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=400,
                 content={
                     "success": False,
@@ -64,7 +86,7 @@ async def set_images_folder(folder_path: str = Form(...)):
             )
     except Exception as e:
         logger.error(f"Error setting folder: {e}")
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=500,
             content={"success": False, "error": str(e)}
         )
@@ -76,7 +98,8 @@ async def set_images_folder(folder_path: str = Form(...)):
 async def analyze_face(
     image: UploadFile = File(...),
     user_name: str = Form(...),
-    privacy_agreed: bool = Form(...)
+    privacy_agreed: bool = Form(...),
+    inline: bool = Query(False)
 ):
     """
     Analyze face from uploaded image and search from LOCAL FOLDER + BACKEND
@@ -85,37 +108,51 @@ async def analyze_face(
         image: Uploaded image file (JPG/PNG)
         user_name: User's name
         privacy_agreed: Privacy policy agreement
+        inline: Also embed each image as base64 (default: URL only)
     
     Returns:
         JSON with emotion analysis + similar images from local folder + backend storage
     """
     try:
         # Generate session ID
-        session_id = str(uuid.uuid4())
+        session_id = fast_id()
         
-        # Read image file
-        image_data = await image.read()
+        # Read image file in bounded chunks
+        image_data = await read_upload(image)
+        if image_data is None:
+            return ORJSONResponse(status_code=413, content=upload_too_large_error())
         
         logger.info(f"Processing image for session: {session_id} | User: {user_name}")
         
         # ===== STEP 1: Save session image to backend =====
-        session_image_path = save_session_image(session_id, image_data)
+        session_image_path = await asyncio.to_thread(save_session_image, session_id, image_data)
         logger.info(f"✅ Session image saved: {session_image_path}")
         
-        # ===== STEP 2: Save temporary file for emotion analysis =====
-        temp_dir = "temp_uploads"
-        os.makedirs(temp_dir, exist_ok=True)
-        temp_image_path = os.path.join(temp_dir, f"{session_id}.jpg")
-        
-        with open(temp_image_path, 'wb') as f:
-            f.write(image_data)
+        # ===== STEP 2: Analyze emotion and encode the face from the in-memory upload =====
+        # Decoded once; the same pixels feed both models and the thumbnail.
+        # Both results are memoized per upload content, so retries skip the models
+        image_key = content_key(image_data)
+        image_array = await asyncio.to_thread(decode_rgb, image_data)
+        if image_array is None:
+            logger.warning(f"❌ Could not decode image for session {session_id}")
+            return ORJSONResponse(
+                status_code=400,
+                content={
+                    "success": False,
+                    "error": "Could not analyze image. Please ensure it contains a clear face.",
+                    "session_id": session_id
+                }
+            )
         
-        # ===== STEP 3: Analyze emotion =====
-        dominant_emotion, emotion_dist, confidence = analyze_emotion(temp_image_path)
+        (dominant_emotion, emotion_dist, confidence), face_encodings = await asyncio.gather(
+            asyncio.to_thread(analyze_emotion_cached, image_key, image_array),
+            asyncio.to_thread(extract_face_encoding_from_array_cached, image_key, image_array)
+        )
+        query_encoding = face_encodings[0] if face_encodings else None
         
         if dominant_emotion == 'neutral' and confidence == 0.0:
             logger.warning(f"❌ Emotion analysis failed for session {session_id}")
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=400,
                 content={
                     "success": False,
@@ -126,45 +163,37 @@ async def analyze_face(
         
         logger.info(f"✅ Emotion detected: {dominant_emotion} ({confidence*100:.1f}%)")
         
-        # ===== STEP 4: Save face image to backend storage =====
-        face_image_path = save_face_image(
+        # ===== STEP 3: Save face image to backend storage =====
+        face_image_path = await asyncio.to_thread(
+            save_face_image,
             session_id=session_id,
             user_name=user_name,
             emotion=dominant_emotion,
-            image_data=image_data
+            image_data=image_data,
+            face_encoding=query_encoding,
+            image_array=image_array
         )
         logger.info(f"✅ Face image stored: {face_image_path}")
         
-        # ===== STEP 5: SEARCH FROM LOCAL FOLDER + BACKEND =====
+        # ===== STEP 4: SEARCH FROM LOCAL FOLDER + BACKEND =====
         # This now searches BOTH sources automatically!
-        similar_images = get_similar_images(
+        similar_images = await asyncio.to_thread(
+            get_similar_images,
             current_emotion=dominant_emotion,
             user_name=user_name,
+            query_encoding=query_encoding,
             limit=10  # Increased limit to account for both sources
         )
         
-        # Convert similar images to include base64 for display
-        similar_images_with_data = []
-        for img in similar_images:
-            try:
-                img_base64 = read_image_as_base64(img['path'])
-                similar_images_with_data.append({
-                    "filename": img['filename'],
-                    "emotion": img['emotion'],
-                    "user_name": img['user_name'],
-                    "created": img['created'],
-                    "source": img.get('source', 'backend'),  # Shows where it came from
-                    "image_base64": img_base64 if img_base64 else None
-                })
-            except Exception as e:
-                logger.warning(f"Could not convert similar image: {e}")
+        # Link similar images for display (base64 only when inline data is asked for)
+        similar_images_with_data = await _similar_images_with_data(similar_images, inline)
         
         logger.info(f"✅ Found {len(similar_images_with_data)} similar images (from local folder + backend)")
         
-        # ===== STEP 6: Generate emotion statement =====
+        # ===== STEP 5: Generate emotion statement =====
         emotion_statement = generate_emotion_statement(dominant_emotion, confidence)
         
-        # ===== STEP 7: Prepare response =====
+        # ===== STEP 6: Prepare response =====
         response_data = {
             "success": True,
             "session_id": session_id,
@@ -173,7 +202,7 @@ async def analyze_face(
             "emotion_confidence": float(confidence),
             "all_emotions": emotion_dist,
             "statement": emotion_statement,
-            "captured_at": datetime.utcnow().isoformat(),
+            "captured_at": utc_timestamp(),
             "image_stored": True,
             "stored_image_path": face_image_path,
             "similar_images_found": len(similar_images_with_data),
@@ -182,21 +211,14 @@ async def analyze_face(
         
         logger.info(f"✅ Analysis complete for session {session_id}")
         
-        # Clean up temp file
-        try:
-            if os.path.exists(temp_image_path):
-                os.remove(temp_image_path)
-        except Exception as e:
-            logger.warning(f"Could not delete temp file: {e}")
-        
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=200,
             content=response_data
         )
         
     except Exception as e:
-        logger.error(f"❌ Error analyzing face: {str(e)}", exc_info=True)
-        return JSONResponse(
+        logger.error(f"❌ Error analyzing face: {str(e)}", exc_info=logger.isEnabledFor(logging.DEBUG))
+        return ORJSONResponse(
             status_code=500,
             content={
                 "success": False,
@@ -208,7 +230,8 @@ async def analyze_face(
 @router.post("/search")
 async def search_faces(
     image: UploadFile = File(...),
-    user_name: str = Form(...)
+    user_name: str = Form(...),
+    inline: bool = Query(False)
 ):
     """
     Search for similar faces in LOCAL FOLDER + BACKEND
@@ -216,30 +239,43 @@ async def search_faces(
     Args:
         image: Uploaded image file
         user_name: User's name for logging
+        inline: Also embed each image as base64 (default: URL only)
     
     Returns:
         Emotion analysis + similar faces from both sources
     """
     try:
-        session_id = str(uuid.uuid4())
-        image_data = await image.read()
+        session_id = fast_id()
+        image_data = await read_upload(image)
+        if image_data is None:
+            return ORJSONResponse(status_code=413, content=upload_too_large_error())
         
         logger.info(f"Search request - Session: {session_id} | User: {user_name}")
         
-        # Save temporary image for analysis
-        temp_dir = "temp_uploads"
-        os.makedirs(temp_dir, exist_ok=True)
-        temp_image_path = os.path.join(temp_dir, f"{session_id}.jpg")
-        
-        with open(temp_image_path, 'wb') as f:
-            f.write(image_data)
+        # Analyze emotion and encode the face from one decode of the upload
+        # Both results are memoized per upload content, so retries skip the models
+        image_key = content_key(image_data)
+        image_array = await asyncio.to_thread(decode_rgb, image_data)
+        if image_array is None:
+            logger.warning(f"Could not decode image for session {session_id}")
+            return ORJSONResponse(
+                status_code=400,
+                content={
+                    "success": False,
+                    "error": "Could not analyze image",
+                    "similar_faces": []
+                }
+            )
         
-        # Analyze emotion
-        dominant_emotion, emotion_dist, confidence = analyze_emotion(temp_image_path)
+        (dominant_emotion, emotion_dist, confidence), face_encodings = await asyncio.gather(
+            asyncio.to_thread(analyze_emotion_cached, image_key, image_array),
+            asyncio.to_thread(extract_face_encoding_from_array_cached, image_key, image_array)
+        )
+        query_encoding = face_encodings[0] if face_encodings else None
         
         if dominant_emotion == 'neutral' and confidence == 0.0:
             logger.warning(f"Analysis failed for session {session_id}")
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=400,
                 content={
                     "success": False,
@@ -251,27 +287,16 @@ async def search_faces(
         logger.info(f"✅ Emotion found: {dominant_emotion}")
         
         # ===== SEARCH LOCAL FOLDER + BACKEND =====
-        similar_images = get_similar_images(
+        similar_images = await asyncio.to_thread(
+            get_similar_images,
             current_emotion=dominant_emotion,
             user_name=user_name,
+            query_encoding=query_encoding,
             limit=10
         )
         
         # Prepare image data for frontend
-        similar_images_with_data = []
-        for img in similar_images:
-            try:
-                img_base64 = read_image_as_base64(img['path'])
-                similar_images_with_data.append({
-                    "filename": img['filename'],
-                    "emotion": img['emotion'],
-                    "user_name": img['user_name'],
-                    "created": img['created'],
-                    "source": img.get('source', 'backend'),  # Shows where image came from
-                    "image_base64": img_base64 if img_base64 else None
-                })
-            except Exception as e:
-                logger.warning(f"Could not process image: {e}")
+        similar_images_with_data = await _similar_images_with_data(similar_images, inline)
         
         emotion_statement = generate_emotion_statement(dominant_emotion, confidence)
         
@@ -285,23 +310,16 @@ async def search_faces(
             "statement": emotion_statement,
             "similar_images_found": len(similar_images_with_data),
             "similar_images": similar_images_with_data,
-            "searched_at": datetime.utcnow().isoformat()
+            "searched_at": utc_timestamp()
         }
         
         logger.info(f"✅ Search complete - Found {len(similar_images_with_data)} matches")
         
-        # Clean up
-        try:
-            if os.path.exists(temp_image_path):
-                os.remove(temp_image_path)
-        except:
-            pass
-        
-        return JSONResponse(status_code=200, content=response_data)
+        return ORJSONResponse(status_code=200, content=response_data)
         
     except Exception as e:
-        logger.error(f"❌ Error searching faces: {str(e)}", exc_info=True)
-        return JSONResponse(
+        logger.error(f"❌ Error searching faces: {str(e)}", exc_info=logger.isEnabledFor(logging.DEBUG))
+        return ORJSONResponse(
             status_code=500,
             content={
                 "success": False,
@@ -312,12 +330,14 @@ async def search_faces(
 
 
 @router.get("/all-images")
-async def get_all_images(user_name: str = None):
+async def get_all_images(user_name: str = None, inline: bool = False, binary: bool = False):
     """
     Get all stored images from LOCAL FOLDER + BACKEND
     
     Args:
         user_name: Optional filter by user
+        inline: Also embed each image as base64 (default: URL only)
+        binary: Return MessagePack with raw thumbnail bytes instead of JSON
     
     Returns:
         List of all stored images from both sources
@@ -325,19 +345,17 @@ async def get_all_images(user_name: str = None):
     try:
         images = get_all_stored_images(user_name)
         
-        # Convert to include base64
-        images_with_data = []
-        for img in images:
-            try:
-                img_base64 = read_image_as_base64(img['path'])
-                images_with_data.append({
-                    **img,
-                    "image_base64": img_base64 if img_base64 else None
-                })
-            except:
-                pass
-        
-        return JSONResponse(
+        if binary:
+            return await _binary_images_response(images)
+        
+        # Link to each image (base64 only when inline data is asked for)
+        images_base64 = await _read_images_base64(images, inline)
+        images_with_data = [
+            {**_listing_entry(img), **_image_fields(img, img_base64)}
+            for img, img_base64 in zip(images, images_base64)
+        ]
+        
+        return ORJSONResponse(
             status_code=200,
             content={
                 "success": True,
@@ -347,20 +365,22 @@ async def get_all_images(user_name: str = None):
         )
     except Exception as e:
         logger.error(f"Error getting all images: {e}")
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=500,
             content={"success": False, "error": str(e), "images": []}
         )
 
 
 @router.get("/local-images")
-async def get_local_images(emotion: str = None, user_name: str = None):
+async def get_local_images(emotion: str = None, user_name: str = None, inline: bool = False, binary: bool = False):
     """
     Get only images from LOCAL FOLDER
     
     Args:
         emotion: Filter by emotion
         user_name: Filter by user
+        inline: Also embed each image as base64 (default: URL only)
+        binary: Return MessagePack with raw thumbnail bytes instead of JSON
     
     Returns:
         List of images from local folder only
@@ -368,19 +388,17 @@ async def get_local_images(emotion: str = None, user_name: str = None):
     try:
         images = get_images_from_local_folder(emotion=emotion, user_name=user_name)
         
-        # Convert to include base64
-        images_with_data = []
-        for img in images:
-            try:
-                img_base64 = read_image_as_base64(img['path'])
-                images_with_data.append({
-                    **img,
-                    "image_base64": img_base64 if img_base64 else None
-                })
-            except:
-                pass
-        
-        return JSONResponse(
+        if binary:
+            return await _binary_images_response(images, source="local_folder")
+        
+        # Link to each image (base64 only when inline data is asked for)
+        images_base64 = await _read_images_base64(images, inline)
+        images_with_data = [
+            {**_listing_entry(img), **_image_fields(img, img_base64)}
+            for img, img_base64 in zip(images, images_base64)
+        ]
+        
+        return ORJSONResponse(
             status_code=200,
             content={
                 "success": True,
@@ -391,7 +409,7 @@ async def get_local_images(emotion: str = None, user_name: str = None):
         )
     except Exception as e:
         logger.error(f"Error getting local images: {e}")
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=500,
             content={"success": False, "error": str(e), "images": []}
         )
@@ -400,51 +418,158 @@ async def get_local_images(emotion: str = None, user_name: str = None):
 @router.get("/storage-stats")
 async def get_storage_stats_endpoint():
     """Get storage usage statistics from both local folder and backend"""
-    try:
-        stats = get_storage_stats()
-        return JSONResponse(status_code=200, content=stats)
-    except Exception as e:
-        logger.error(f"Error getting stats: {e}")
-        return JSONResponse(status_code=500, content={"error": str(e)})
+    # get_storage_stats handles its own errors (returns {})
+    stats = await asyncio.to_thread(get_storage_stats)
+    return ORJSONResponse(status_code=200, content=stats)
+
+
+@router.get("/sessions/{session_id}")
+async def get_session(session_id: str):
+    """Get session details by session ID"""
+    logger.info("Fetching session: %s", session_id)
+    
+    return ORJSONResponse(
+        status_code=200,
+        content={
+            "session_id": session_id,
+            "status": "Session retrieved successfully"
+        }
+    )
+
+
+@router.get("/image/{source}/{image_id:path}")
+async def get_image(source: str, image_id: str, request: Request, full: bool = False):
+    """
+    Serve a local folder or backend storage image
+    
+    A 256px JPEG thumbnail is served unless full is set.
+    Sent with Cache-Control and an ETag; a matching If-None-Match gets 304.
+    
+    Args:
+        source: "local_folder" or "backend_storage"
+        image_id: Path relative to that source's folder
+        full: Serve the original full-resolution file
+    
+    Returns:
+        Raw image file
+    """
+    image_path = resolve_image_id(image_id, source)
+    
+    if image_path is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    if not full:
+        image_path = await asyncio.to_thread(get_thumbnail_path, image_path, source) or image_path
+    
+    headers = {"Cache-Control": IMAGE_CACHE_CONTROL, "ETag": get_image_etag(image_path)}
+    
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    
+    return FileResponse(image_path, media_type=get_image_mime_type(image_path), headers=headers)
 
 
 @router.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=200,
         content={
             "status": "healthy",
             "service": "face-emotion-analyzer",
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utc_timestamp()
         }
     )
 
 
 # ==================== HELPER FUNCTIONS ====================
 
-def generate_emotion_statement(emotion: str, confidence: float) -> str:
+def _image_url(img: dict) -> str:
+    """URL of an image under /image, or None if it is outside its source folder"""
+    source = img.get('source', 'backend_storage')
+    image_id = get_image_id(img['path'], source)
+    return f"/api/v1/image/{source}/{quote(image_id)}" if image_id else None
+
+
+def _listing_entry(img: dict) -> dict:
+    """Listing fields of an image, with its creation time as ISO 8601 "created" (raw created_ts stays internal)"""
+    entry = {key: value for key, value in img.items() if key != 'created_ts'}
+    entry["created"] = iso_timestamp(img['created_ts'])
+    return entry
+
+
+def _image_fields(img: dict, img_base64: str = None) -> dict:
+    """Response fields linking to an image, plus inline data when it was read"""
+    fields = {"image_url": _image_url(img)}
+    if img_base64:
+        fields["image_base64"] = img_base64
+    return fields
+
+
+async def _read_images_base64(images: list, inline: bool) -> list:
+    """Read image thumbnails as base64 concurrently when inline is set, else all None"""
+    if not inline:
+        return [None] * len(images)
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(*(
+        loop.run_in_executor(_image_executor, read_thumbnail_as_base64, img['path'], img.get('source', 'backend_storage'))
+        for img in images
+    ))
+
+
+def _similar_image_result(img: dict, inline: bool) -> dict:
     """
-    Generate human-readable emotion statement
+    Build one similar-image entry, reading its thumbnail in the same pass when inline
     
-    Args:
-        emotion: Emotion label
-        confidence: Confidence score (0-1)
-    
-    Returns:
-        Human-readable statement with emoji
+    No try/except: an unreadable image comes back as None from the reader
+    and the entry just goes without inline data.
     """
-    emotion_descriptions = {
-        "happy": "😊 You look happy and cheerful!",
-        "sad": "😔 You seem to be feeling sad.",
-        "angry": "😠 You appear to be feeling angry.",
-        "fear": "😟 You seem fearful or anxious.",
-        "surprise": "😮 You look surprised!",
-        "disgust": "😕 You seem disgusted.",
-        "neutral": "😐 Your expression is neutral."
+    img_base64 = read_thumbnail_as_base64(img['path'], img.get('source', 'backend_storage')) if inline else None
+    return {
+        "filename": img['filename'],
+        "emotion": img['emotion'],
+        "user_name": img['user_name'],
+        "created": iso_timestamp(img['created_ts']),
+        "source": img.get('source', 'backend'),  # Shows where image came from
+        **_image_fields(img, img_base64)
     }
+
+
+async def _similar_images_with_data(images: list, inline: bool) -> list:
+    """Build similar-image entries in parallel on the image pool, keeping similarity order"""
+    loop = asyncio.get_running_loop()
+    return list(await asyncio.gather(*(
+        loop.run_in_executor(_image_executor, _similar_image_result, img, inline)
+        for img in images
+    )))
+
+
+async def _binary_images_response(images: list, **extra) -> Response:
+    """
+    MessagePack listing with each image's thumbnail as raw bytes
     
-    confidence_pct = int(confidence * 100)
-    base_statement = emotion_descriptions.get(emotion, "Your emotional state is unclear.")
+    Skips the base64 expansion (and JSON escaping) of inline images;
+    answers 501 when msgpack is not installed.
+    """
+    if not MSGPACK_AVAILABLE:
+        return ORJSONResponse(
+            status_code=501,
+            content={"success": False, "error": "Binary responses need msgpack installed", "images": []}
+        )
     
-    return f"{base_statement} (Confidence: {confidence_pct}%)"
+    loop = asyncio.get_running_loop()
+    images_bytes = await asyncio.gather(*(
+        loop.run_in_executor(_image_executor, read_thumbnail_bytes, img['path'], img.get('source', 'backend_storage'))
+        for img in images
+    ))
+    
+    content = {
+        "success": True,
+        "total_images": len(images),
+        "images": [
+            {**_listing_entry(img), "image_url": _image_url(img), "image_bytes": image_bytes}
+            for img, image_bytes in zip(images, images_bytes)
+        ],
+        **extra
+    }
+    return Response(content=msgpack.packb(content, use_bin_type=True), media_type="application/msgpack")
@@ -1,26 +1,47 @@
-from sqlalchemy import create_engine, Column, String, Float, DateTime, JSON, LargeBinary
+from sqlalchemy import Column, Integer, String, Float, DateTime, LargeBinary, delete, insert, select
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import deferred
 from datetime import datetime, timedelta
+from functools import lru_cache
+import asyncio
 import json
 import logging
+import os
 import numpy as np
 from app.config import settings
+from app.utils.ids import uuid7
 
 logger = logging.getLogger(__name__)
 
+# Optional: FAISS for embedding search in get_matched_images
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
 Base = declarative_base()
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine)
+
+# One pooled async engine per process; connections are reused across requests
+engine = create_async_engine(
+    settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1),
+    pool_size=20,
+    max_overflow=10,
+    pool_pre_ping=True,
+    pool_recycle=3600
+)
+AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 
 # Models
 class SessionUser(Base):
     __tablename__ = 'session_user'
     session_id = Column(String, primary_key=True)
     user_name = Column(String)
-    captured_image_base64 = Column(String)
-    captured_image_path = Column(String)
-    embedding = Column(LargeBinary)  # Changed from BYTEA to LargeBinary
+    captured_image_path = Column(String)  # Image bytes stay on disk, not in the row
+    # Raw float32 bytes (see embedding_to_bytes); deferred so status reads skip the TOASTed value
+    embedding = deferred(Column(LargeBinary))
     status = Column(String, default='searching')
     privacy_policy_agreed = Column(String)
     timestamp = Column(DateTime, default=datetime.utcnow)
@@ -29,111 +50,208 @@ class SessionUser(Base):
 
 class EmotionLog(Base):
     __tablename__ = 'emotion_log'
-    emotion_id = Column(String, primary_key=True)
+    emotion_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)  # Time-ordered: appends to the right of the B-tree
     image_id = Column(String)
-    session_id = Column(String)
+    session_id = Column(String, index=True)  # delete_session filters on it
     emotion_label = Column(String)
     confidence = Column(Float)
-    emotion_distribution = Column(JSON)
+    emotion_distribution = Column(JSONB)  # Stored binary; no text re-parse on read
     analyzed_at = Column(DateTime, default=datetime.utcnow)
 
+class IndexedImage(Base):
+    __tablename__ = 'indexed_image'
+    image_id = Column(Integer, primary_key=True)  # Row id in the FAISS index
+    image_path = Column(String)
+    image_url = Column(String)
+
 class SessionAggregatedEmotion(Base):
     __tablename__ = 'session_aggregated_emotion'
-    aggregation_id = Column(String, primary_key=True)
+    aggregation_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     session_id = Column(String, unique=True)
     dominant_emotion = Column(String)
     emotion_confidence = Column(Float)
-    emotion_distribution = Column(JSON)
+    emotion_distribution = Column(JSONB)  # Stored binary; no text re-parse on read
     statement = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
 
-# Create tables
-Base.metadata.create_all(engine)
+# Emotion log rows waiting to be written, per session
+EMOTION_LOG_BATCH_SIZE = 50
+_emotion_log_buffer = {}
+_emotion_log_lock = asyncio.Lock()
+
+# Embedding encoding
+def embedding_to_bytes(embedding: np.ndarray) -> bytes:
+    """Pack an embedding as raw float32 bytes for the embedding column"""
+    return np.asarray(embedding, dtype=np.float32).tobytes()
+
+def bytes_to_embedding(data: bytes) -> np.ndarray:
+    """Read an embedding column back as a float32 array (zero-copy view of data)"""
+    return np.frombuffer(data, dtype=np.float32)
 
 # Database operations
-def insert_session_user(session_id: str, user_name: str, captured_image_base64: str, privacy_policy_agreed: bool):
+async def insert_session_user(session_id: str, user_name: str, privacy_policy_agreed: bool, captured_image_path: str = None, embedding: np.ndarray = None):
     """Insert session user"""
     try:
-        session = SessionLocal()
         expires_at = datetime.utcnow() + timedelta(hours=settings.SESSION_EXPIRY_HOURS)
         user = SessionUser(
             session_id=session_id,
             user_name=user_name,
-            captured_image_base64=captured_image_base64,
+            captured_image_path=captured_image_path,
+            embedding=embedding_to_bytes(embedding) if embedding is not None else None,
             privacy_policy_agreed=str(privacy_policy_agreed),
             expires_at=expires_at,
             status='searching'
         )
-        session.add(user)
-        session.commit()
-        session.close()
+        async with AsyncSessionLocal() as session:
+            session.add(user)
+            await session.commit()
         logger.info(f"Session user inserted: {session_id}")
     except Exception as e:
         logger.error(f"Error inserting session user: {e}")
         raise
 
-def insert_emotion_log(image_id: str, session_id: str, emotion_label: str, confidence: float, emotion_distribution: dict):
-    """Insert emotion log"""
+async def insert_emotion_log(image_id: str, session_id: str, emotion_label: str, confidence: float, emotion_distribution: dict):
+    """
+    Queue an emotion log row; rows are written in batches
+    
+    A session's rows are flushed once EMOTION_LOG_BATCH_SIZE accumulate;
+    call flush_emotion_logs(session_id) when the session ends. Whatever is
+    still queued is flushed at application shutdown.
+    """
+    row = {
+        "emotion_id": uuid7(),
+        "image_id": image_id,
+        "session_id": session_id,
+        "emotion_label": emotion_label,
+        "confidence": confidence,
+        "emotion_distribution": emotion_distribution,
+        "analyzed_at": datetime.utcnow(),
+    }
+    async with _emotion_log_lock:
+        rows = _emotion_log_buffer.setdefault(session_id, [])
+        rows.append(row)
+        if len(rows) < EMOTION_LOG_BATCH_SIZE:
+            return
+        del _emotion_log_buffer[session_id]
+    
+    await _write_emotion_logs(rows)
+
+async def flush_emotion_logs(session_id: str = None):
+    """Write queued emotion logs for one session (or all sessions)"""
+    async with _emotion_log_lock:
+        if session_id is None:
+            rows = [row for session_rows in _emotion_log_buffer.values() for row in session_rows]
+            _emotion_log_buffer.clear()
+        else:
+            rows = _emotion_log_buffer.pop(session_id, [])
+    
+    await _write_emotion_logs(rows)
+
+async def _write_emotion_logs(rows: list):
+    """
+    Insert rows in one executemany round-trip and one commit
+    
+    On failure the rows are put back at the front of their sessions' queues
+    (so the next flush retries them) and the error is re-raised.
+    """
+    if not rows:
+        return
     try:
-        import uuid
-        session = SessionLocal()
-        log = EmotionLog(
-            emotion_id=str(uuid.uuid4()),
-            image_id=image_id,
-            session_id=session_id,
-            emotion_label=emotion_label,
-            confidence=confidence,
-            emotion_distribution=emotion_distribution,
-        )
-        session.add(log)
-        session.commit()
-        session.close()
-        logger.info(f"Emotion log inserted: {emotion_label}")
+        async with AsyncSessionLocal.begin() as session:
+            await session.execute(insert(EmotionLog), rows)
+        logger.info(f"Emotion logs inserted: {len(rows)}")
     except Exception as e:
-        logger.error(f"Error inserting emotion log: {e}")
+        logger.error(f"Error inserting emotion logs: {e}")
+        async with _emotion_log_lock:
+            requeued = {}
+            for row in rows:
+                requeued.setdefault(row["session_id"], []).append(row)
+            for session_id, session_rows in requeued.items():
+                _emotion_log_buffer[session_id] = session_rows + _emotion_log_buffer.get(session_id, [])
+        raise
 
-def insert_aggregated_emotion(session_id: str, dominant_emotion: str, emotion_confidence: float, emotion_distribution: dict, statement: str):
+async def insert_aggregated_emotion(session_id: str, dominant_emotion: str, emotion_confidence: float, emotion_distribution: dict, statement: str):
     """Insert aggregated emotion"""
     try:
-        import uuid
-        session = SessionLocal()
         agg = SessionAggregatedEmotion(
-            aggregation_id=str(uuid.uuid4()),
             session_id=session_id,
             dominant_emotion=dominant_emotion,
             emotion_confidence=emotion_confidence,
             emotion_distribution=emotion_distribution,
             statement=statement,
         )
-        session.add(agg)
-        session.commit()
-        session.close()
+        async with AsyncSessionLocal() as session:
+            session.add(agg)
+            await session.commit()
         logger.info(f"Aggregated emotion inserted: {session_id}")
     except Exception as e:
         logger.error(f"Error inserting aggregated emotion: {e}")
 
-def get_matched_images(embedding: np.ndarray, limit: int = 50, threshold: float = 0.6) -> list:
-    """Get matched images from FAISS"""
-    # Placeholder: In real implementation, query FAISS
+@lru_cache(maxsize=None)
+def _faiss_index():
+    """Open the FAISS index once per process, memory-mapped (None if unavailable)"""
+    if not FAISS_AVAILABLE or not os.path.exists(settings.FAISS_INDEX_PATH):
+        logger.warning(f"FAISS index not available at {settings.FAISS_INDEX_PATH}")
+        return None
+    return faiss.read_index(settings.FAISS_INDEX_PATH, faiss.IO_FLAG_MMAP)
+
+async def get_matched_images(embedding: np.ndarray, limit: int = 50, threshold: float = 0.6) -> list:
+    """
+    Get matched images from FAISS
+    
+    The index is an inner-product index (e.g. IndexFlatIP) over L2-normalized
+    float32 embeddings, so scores are cosine similarities; its ids are
+    IndexedImage.image_id.
+    
+    Args:
+        embedding: Query embedding, already unit-length (as from extract_embedding)
+        limit: Maximum number of matches
+        threshold: Minimum similarity score
+    
+    Returns:
+        List of matches, best first
+    """
+    index = _faiss_index()
+    if index is None:
+        return []
+    
+    query = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+    scores, ids = await asyncio.to_thread(index.search, query, limit)
+    
+    hits = [(int(image_id), float(score)) for image_id, score in zip(ids[0], scores[0]) if image_id != -1 and score >= threshold]
+    if not hits:
+        return []
+    
+    # Hydrate all hits with one query instead of one lookup per id
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(IndexedImage).where(IndexedImage.image_id.in_([image_id for image_id, _ in hits]))
+        )
+        images = {image.image_id: image for image in result.scalars()}
+    
     return [
         {
-            'image_id': '1',
-            'image_url': 'https://example.com/image1.jpg',
-            'image_path': '/path/to/image1.jpg',
-            'similarity_score': 0.95,
-        },
-        # ... more images
+            'image_id': str(image_id),
+            'image_url': images[image_id].image_url,
+            'image_path': images[image_id].image_path,
+            'similarity_score': score,
+        }
+        for image_id, score in hits
+        if image_id in images
     ]
 
-def delete_session(session_id: str):
+async def delete_session(session_id: str):
     """Delete session and related data"""
     try:
-        session = SessionLocal()
-        session.query(SessionUser).filter(SessionUser.session_id == session_id).delete()
-        session.query(EmotionLog).filter(EmotionLog.session_id == session_id).delete()
-        session.query(SessionAggregatedEmotion).filter(SessionAggregatedEmotion.session_id == session_id).delete()
-        session.commit()
-        session.close()
+        # Queued logs for a deleted session are dropped, not written
+        async with _emotion_log_lock:
+            _emotion_log_buffer.pop(session_id, None)
+        
+        # One transaction (single commit) for all three bulk DELETEs
+        async with AsyncSessionLocal.begin() as session:
+            await session.execute(delete(SessionUser).where(SessionUser.session_id == session_id))
+            await session.execute(delete(EmotionLog).where(EmotionLog.session_id == session_id))
+            await session.execute(delete(SessionAggregatedEmotion).where(SessionAggregatedEmotion.session_id == session_id))
         logger.info(f"Session deleted: {session_id}")
     except Exception as e:
         logger.error(f"Error deleting session: {e}")
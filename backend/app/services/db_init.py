@@ -1,39 +1,78 @@
 import logging
-from sqlalchemy import create_engine, inspect
-from app.config import settings
-from app.services.database import Base
+from sqlalchemy import inspect, text
+from app.services.database import Base, engine
 
 logger = logging.getLogger(__name__)
 
-def init_db():
-    """Initialize database - create tables if they don't exist"""
+async def _table_names() -> list:
+    """Table names in the database, read over the shared engine's pool"""
+    async with engine.connect() as conn:
+        return await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_table_names())
+
+# Advisory lock key; uvicorn workers start together and create tables one at a time
+INIT_DB_LOCK_ID = 0x52697669
+
+# Column type changes since the tables were first created; create_all leaves existing tables alone
+# (table, column, new type as named by information_schema, USING expression)
+COLUMN_MIGRATIONS = (
+    ('emotion_log', 'emotion_id', 'uuid', 'emotion_id::uuid'),
+    ('session_aggregated_emotion', 'aggregation_id', 'uuid', 'aggregation_id::uuid'),
+    ('emotion_log', 'emotion_distribution', 'jsonb', 'emotion_distribution::jsonb'),
+    ('session_aggregated_emotion', 'emotion_distribution', 'jsonb', 'emotion_distribution::jsonb'),
+)
+
+# Other schema changes, each safe to repeat
+SCHEMA_MIGRATIONS = (
+    "CREATE INDEX IF NOT EXISTS ix_emotion_log_session_id ON emotion_log (session_id)",
+    # Session images are kept on disk (captured_image_path) instead of inline base64
+    "ALTER TABLE session_user DROP COLUMN IF EXISTS captured_image_base64",
+)
+
+async def _migrate(conn):
+    """Bring tables created by older versions up to the current models"""
+    for table, column, new_type, using in COLUMN_MIGRATIONS:
+        result = await conn.execute(
+            text("SELECT data_type FROM information_schema.columns WHERE table_schema = current_schema() AND table_name = :table AND column_name = :column"),
+            {"table": table, "column": column}
+        )
+        current_type = result.scalar()
+        if current_type is not None and current_type != new_type:
+            logger.info(f"📊 Migrating {table}.{column}: {current_type} -> {new_type}")
+            await conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE {new_type.upper()} USING {using}"))
+    
+    for statement in SCHEMA_MIGRATIONS:
+        await conn.execute(text(statement))
+
+async def init_db():
+    """Initialize database - create tables that don't exist yet and migrate older ones (called from the app lifespan)"""
     try:
-        engine = create_engine(settings.DATABASE_URL)
-        
-        # Check if tables exist
-        inspector = inspect(engine)
-        existing_tables = inspector.get_table_names()
-        
-        if not existing_tables:
-            logger.info("📊 Creating database tables...")
-            Base.metadata.create_all(engine)
-            logger.info("✅ Database tables created successfully!")
-            logger.info(f"   Tables: session_user, emotion_log, session_aggregated_emotion")
-        else:
-            logger.info(f"✅ Database already initialized with {len(existing_tables)} tables")
-            logger.info(f"   Tables: {', '.join(existing_tables)}")
+        async with engine.begin() as conn:
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": INIT_DB_LOCK_ID})
+            
+            # Check which tables exist
+            existing_tables = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_table_names())
+            missing_tables = [table.name for table in Base.metadata.sorted_tables if table.name not in existing_tables]
+            
+            if missing_tables:
+                logger.info("📊 Creating database tables...")
+                await conn.run_sync(Base.metadata.create_all)
+                logger.info("✅ Database tables created successfully!")
+                logger.info(f"   Tables: {', '.join(missing_tables)}")
+            else:
+                logger.info(f"✅ Database already initialized with {len(existing_tables)} tables")
+                logger.info(f"   Tables: {', '.join(existing_tables)}")
+            
+            await _migrate(conn)
             
         return True
     except Exception as e:
         logger.error(f"❌ Error initializing database: {e}")
         raise
 
-def get_db_status():
+async def get_db_status():
     """Get database connection status"""
     try:
-        engine = create_engine(settings.DATABASE_URL)
-        inspector = inspect(engine)
-        tables = inspector.get_table_names()
+        tables = await _table_names()
         
         return {
             "status": "✅ connected",
@@ -46,12 +85,10 @@ def get_db_status():
             "error": str(e)
         }
 
-def verify_tables():
+async def verify_tables():
     """Verify all required tables exist"""
     try:
-        engine = create_engine(settings.DATABASE_URL)
-        inspector = inspect(engine)
-        existing_tables = set(inspector.get_table_names())
+        existing_tables = set(await _table_names())
         required_tables = {'session_user', 'emotion_log', 'session_aggregated_emotion'}
         
         missing_tables = required_tables - existing_tables
@@ -1,28 +1,35 @@
 import numpy as np
 import cv2
 
+# OpenCV T-API: with an OpenCL device, UMat inputs run the colour conversion on the GPU
+USE_OPENCL = cv2.ocl.haveOpenCL() and cv2.ocl.useOpenCL()
+
 def extract_embedding(face_image: np.ndarray) -> np.ndarray:
     """
     Extract a simple embedding from a face image using histogram.
     
     In production, this would use ArcFace/InsightFace.
     For now, return a normalized histogram (cheap embedding).
+    The result is unit-length (all-zero only for an empty image).
     """
     try:
-        # Resize to 128x128
-        face_resized = cv2.resize(face_image, (128, 128))
-        
-        # Convert to grayscale
-        gray = cv2.cvtColor(face_resized, cv2.COLOR_BGR2GRAY)
+        # Histograms ignore pixel order, so no resize is needed
+        if USE_OPENCL:
+            gray = cv2.cvtColor(cv2.UMat(face_image), cv2.COLOR_BGR2GRAY).get()
+        else:
+            gray = cv2.cvtColor(face_image, cv2.COLOR_BGR2GRAY)
         
         # Compute histogram (poor man's embedding)
-        hist = cv2.calcHist([gray], [0], None, [256], [0, 256])
-        hist = cv2.normalize(hist, hist).flatten()
+        hist = np.bincount(gray.ravel(), minlength=256).astype(np.float32)
         
         # Pad to 512 dims (to match expected embedding size)
-        embedding = np.zeros(512)
+        embedding = np.zeros(512, dtype=np.float32)
         embedding[:256] = hist
         
+        # L2-normalize the final vector once, so inner product is cosine similarity downstream
+        norm = np.linalg.norm(embedding)
+        embedding /= norm if norm > 1e-10 else 1.0
+        
         return embedding
         
     except Exception as e:
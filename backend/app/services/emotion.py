@@ -1,27 +1,43 @@
-import torch
 import numpy as np
-from torchvision import transforms
 from PIL import Image
+import io
 import logging
 
+from app.utils.content_cache import keyed_lru_cache
+
 logger = logging.getLogger(__name__)
 
 # Emotion labels
 EMOTION_LABELS = ['angry', 'disgust', 'fear', 'happy', 'neutral', 'sad', 'surprise']
 
-def analyze_emotion(image_path: str) -> tuple:
+def _probe_image(image) -> tuple:
+    """
+    (width, height) of a path, raw upload bytes, or array without decoding pixels
+    
+    PIL only parses the header here; raises if the input is not an image.
+    """
+    if isinstance(image, np.ndarray):
+        if image.ndim != 3:
+            raise ValueError(f"Expected an (H, W, 3) image array, got shape {image.shape}")
+        return image.shape[1], image.shape[0]
+    source = io.BytesIO(image) if isinstance(image, (bytes, bytearray)) else image
+    with Image.open(source) as probe:
+        return probe.size
+
+def analyze_emotion(image) -> tuple:
     """
     Analyze emotion in image
     
+    Args:
+        image: Image path, raw image bytes, or decoded RGB array
+    
     Returns:
         (dominant_emotion, emotion_distribution_dict, confidence)
     """
     try:
-        # Load image
-        image = Image.open(image_path).convert('RGB')
-        
         # Placeholder: In real implementation, load ViT model
-        # For now, return mock results
+        # For now, return mock results; only check the input is an image (no pixel decode)
+        _probe_image(image)
         
         # Mock emotion distribution
         emotion_dist = {
@@ -45,6 +61,16 @@ def analyze_emotion(image_path: str) -> tuple:
         logger.error(f"Emotion analysis error: {e}")
         return 'neutral', {}, 0.0
 
+@keyed_lru_cache(maxsize=4096)
+def analyze_emotion_cached(image) -> tuple:
+    """
+    analyze_emotion for an upload (bytes or decoded RGB array), memoized per content
+    
+    Call as analyze_emotion_cached(content_key(image_data), image);
+    repeat uploads of the same photo skip the model entirely.
+    """
+    return analyze_emotion(image)
+
 def aggregate_emotions(emotion_results: list) -> tuple:
     """
     Aggregate emotions from multiple images
@@ -55,21 +81,26 @@ def aggregate_emotions(emotion_results: list) -> tuple:
     if not emotion_results:
         return 'neutral', 0.0, {}
     
-    # Count emotions
-    emotion_counts = {}
-    for result in emotion_results:
-        emotion = result['emotion']
-        emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
+    # Integer-code labels in first-seen order, then count them in one pass
+    label_ids = {}
+    ids = np.fromiter(
+        (label_ids.setdefault(result['emotion'], len(label_ids)) for result in emotion_results),
+        dtype=np.intp,
+        count=len(emotion_results)
+    )
+    counts = np.bincount(ids)
     
-    # Find dominant
-    dominant_emotion = max(emotion_counts, key=emotion_counts.get)
+    # Find dominant (argmax takes the first maximum, so ties go to the first emotion seen)
+    labels = list(label_ids)
+    dominant_id = int(counts.argmax())
+    dominant_emotion = labels[dominant_id]
     total_images = len(emotion_results)
-    emotion_confidence = emotion_counts[dominant_emotion] / total_images
+    emotion_confidence = int(counts[dominant_id]) / total_images
     
     # Build distribution
     emotion_distribution = {
         emotion: count / total_images
-        for emotion, count in emotion_counts.items()
+        for emotion, count in zip(labels, counts.tolist())
     }
     
     logger.info(f"Aggregated emotion: {dominant_emotion} ({emotion_confidence*100:.1f}%)")
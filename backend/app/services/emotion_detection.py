@@ -5,16 +5,24 @@ Uses FER2013 model or similar for accurate emotion detection
 
 import cv2
 import numpy as np
-from PIL import Image
 import logging
-import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 
+from app.services.face_detection import get_face_cascade
+from app.utils.content_cache import keyed_lru_cache
+from app.utils.imaging import decode_bgr
+
 logger = logging.getLogger(__name__)
 
 # Emotion labels matching FER2013
 EMOTION_LABELS = ['angry', 'disgust', 'fear', 'happy', 'neutral', 'sad', 'surprise']
 
+# Output order of DeepFace's emotion model
+DEEPFACE_EMOTION_ORDER = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+
 # Try to use deepface for emotion detection (more accurate)
 try:
     from deepface import DeepFace
@@ -25,10 +33,13 @@ except ImportError:
     logger.warning("⚠️ DeepFace not available, using fallback emotion detection")
 
 
-def analyze_emotion_deepface(image_path: str) -> tuple:
+def analyze_emotion_deepface(image_path) -> tuple:
     """
     Analyze emotion using DeepFace (most accurate)
     
+    Args:
+        image_path: Path to image file, or a decoded BGR image array
+    
     Returns:
         (dominant_emotion, emotion_distribution_dict, confidence)
     """
@@ -96,17 +107,54 @@ def analyze_emotion_deepface(image_path: str) -> tuple:
         return analyze_emotion_fallback(image_path)
 
 
-def analyze_emotion_fallback(image_path: str) -> tuple:
+# Path keywords for the fallback heuristic; earlier emotions win when several match
+EMOTION_KEYWORDS = {
+    'happy': ['happy', 'smile', 'joy', 'cheer'],
+    'sad': ['sad', 'cry', 'sorrow'],
+    'angry': ['angry', 'mad', 'furious'],
+    'fear': ['fear', 'scared', 'afraid'],
+    'surprise': ['surprise', 'shock'],
+    'disgust': ['disgust', 'disgusted'],
+    'neutral': ['neutral', 'normal']
+}
+_KEYWORD_EMOTION = {
+    keyword: emotion
+    for emotion, keywords in reversed(EMOTION_KEYWORDS.items())
+    for keyword in keywords
+}
+_EMOTION_PRIORITY = {emotion: rank for rank, emotion in enumerate(EMOTION_KEYWORDS)}
+
+# One compiled pass over the path; the lookahead reports keywords at every
+# position, so overlapping matches (e.g. "sad" inside "disgusted") are not lost
+_KEYWORD_RE = re.compile(
+    "(?=(" + "|".join(re.escape(keyword) for keyword in sorted(_KEYWORD_EMOTION, key=len, reverse=True)) + "))"
+)
+
+
+def _emotion_from_path(path: str) -> str:
+    """Emotion named by a keyword in path (case-insensitive), 'neutral' if none"""
+    matched = {_KEYWORD_EMOTION[match.group(1)] for match in _KEYWORD_RE.finditer(path.lower())}
+    return min(matched, key=_EMOTION_PRIORITY.get) if matched else 'neutral'
+
+
+def analyze_emotion_fallback(image_path) -> tuple:
     """
     Fallback emotion detection using simple heuristics
     This is less accurate but works without DeepFace
     
+    Args:
+        image_path: Path to image file, or a decoded BGR image array
+    
     Returns:
         (dominant_emotion, emotion_distribution_dict, confidence)
     """
     try:
-        # Load image
-        image = cv2.imread(image_path)
+        # Load image (in-memory arrays carry no path to take keywords from)
+        if isinstance(image_path, np.ndarray):
+            image = image_path
+            image_path = ''
+        else:
+            image = cv2.imread(image_path)
         if image is None:
             logger.error(f"Could not load image: {image_path}")
             return 'neutral', {}, 0.0
@@ -115,8 +163,7 @@ def analyze_emotion_fallback(image_path: str) -> tuple:
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         
         # Detect face
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        faces = face_cascade.detectMultiScale(gray, 1.1, 4)
+        faces = get_face_cascade().detectMultiScale(gray, 1.1, 4)
         
         if len(faces) == 0:
             logger.warning("No face detected in image")
@@ -124,23 +171,7 @@ def analyze_emotion_fallback(image_path: str) -> tuple:
         
         # For fallback, use folder name or filename to detect emotion
         # This is a simple heuristic until we have a trained model
-        image_path_lower = str(image_path).lower()
-        
-        emotion_keywords = {
-            'happy': ['happy', 'smile', 'joy', 'cheer'],
-            'sad': ['sad', 'cry', 'sorrow'],
-            'angry': ['angry', 'mad', 'furious'],
-            'fear': ['fear', 'scared', 'afraid'],
-            'surprise': ['surprise', 'shock'],
-            'disgust': ['disgust', 'disgusted'],
-            'neutral': ['neutral', 'normal']
-        }
-        
-        detected_emotion = 'neutral'
-        for emotion, keywords in emotion_keywords.items():
-            if any(keyword in image_path_lower for keyword in keywords):
-                detected_emotion = emotion
-                break
+        detected_emotion = _emotion_from_path(str(image_path))
         
         # Create distribution (high confidence for detected, low for others)
         emotion_dist = {emotion: 0.05 for emotion in EMOTION_LABELS}
@@ -155,11 +186,14 @@ def analyze_emotion_fallback(image_path: str) -> tuple:
         return 'neutral', {}, 0.0
 
 
-def analyze_emotion(image_path: str) -> tuple:
+def analyze_emotion(image_path) -> tuple:
     """
     Main emotion analysis function
     Tries DeepFace first, falls back to simple detection
     
+    Args:
+        image_path: Path to image file, or a decoded BGR image array
+    
     Returns:
         (dominant_emotion, emotion_distribution_dict, confidence)
     """
@@ -170,6 +204,9 @@ def analyze_emotion_from_bytes(image_bytes: bytes) -> tuple:
     """
     Analyze emotion from image bytes
     
+    Decodes in memory and hands the array straight to the analyzer,
+    so no temp file is written.
+    
     Args:
         image_bytes: Raw image bytes
         
@@ -177,23 +214,159 @@ def analyze_emotion_from_bytes(image_bytes: bytes) -> tuple:
         (dominant_emotion, emotion_distribution_dict, confidence)
     """
     try:
-        import io
-        import tempfile
-        
-        # Save to temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
-            tmp_file.write(image_bytes)
-            tmp_path = tmp_file.name
-        
-        try:
-            result = analyze_emotion(tmp_path)
-            return result
-        finally:
-            # Clean up temp file
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
+        image = decode_bgr(image_bytes)
+        if image is None:
+            logger.error("Could not decode image bytes")
+            return 'neutral', {}, 0.0
+        
+        return analyze_emotion(image)
                 
     except Exception as e:
         logger.error(f"Error analyzing emotion from bytes: {e}")
         return 'neutral', {}, 0.0
 
+
+@keyed_lru_cache(maxsize=4096)
+def analyze_emotion_from_bytes_cached(image_bytes: bytes) -> tuple:
+    """
+    analyze_emotion_from_bytes memoized per content
+    
+    Call as analyze_emotion_from_bytes_cached(content_key(image_bytes), image_bytes);
+    repeat uploads of the same photo skip DeepFace entirely.
+    """
+    return analyze_emotion_from_bytes(image_bytes)
+
+
+@lru_cache(maxsize=None)
+def _get_emotion_model():
+    """Load DeepFace's emotion model once per process"""
+    return DeepFace.build_model("Emotion")
+
+
+def warm_up_emotion_model():
+    """
+    Load the emotion model and run one prediction before the first request
+    
+    TensorFlow is pinned to one intra-op and one inter-op thread first, so
+    each uvicorn worker uses a single core and parallelism comes from the
+    worker count rather than competing TF thread pools.
+    """
+    if not DEEPFACE_AVAILABLE:
+        return
+    
+    try:
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(1)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+    except (ImportError, RuntimeError) as e:
+        # RuntimeError: the TF runtime was already initialized in this process
+        logger.warning(f"Could not pin TensorFlow threads: {e}")
+    
+    # First predict builds the graph; doing it here keeps it off the first request
+    _get_emotion_model().predict(np.zeros((1, 48, 48, 1), dtype=np.float32), verbose=0)
+    logger.info("✅ Emotion model warmed up")
+
+
+def _load_bgr(image) -> np.ndarray:
+    """Return a BGR array for a path or raw bytes, or pass an array through (None if unreadable)"""
+    if isinstance(image, np.ndarray):
+        return image
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return decode_bgr(image)
+    return cv2.imread(str(image))
+
+
+def _preprocess_emotion_input(image: np.ndarray) -> np.ndarray:
+    """48x48 grayscale crop of the largest face (whole image if none), scaled to [0, 1]"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    faces = get_face_cascade().detectMultiScale(gray, 1.1, 4)
+    if len(faces) > 0:
+        x, y, w, h = max(faces, key=lambda face: face[2] * face[3])
+        gray = gray[y:y + h, x:x + w]
+    return cv2.resize(gray, (48, 48)).astype(np.float32) / 255.0
+
+
+def _emotion_result_from_scores(scores: np.ndarray) -> tuple:
+    """Turn raw model scores into (dominant_emotion, distribution, confidence)"""
+    total = float(scores.sum())
+    emotion_dist = {
+        emotion: float(score) / total if total > 0 else 0.0
+        for emotion, score in zip(DEEPFACE_EMOTION_ORDER, scores)
+    }
+    dominant_emotion = max(emotion_dist, key=emotion_dist.get)
+    return dominant_emotion, emotion_dist, emotion_dist[dominant_emotion]
+
+
+def analyze_emotion_cropped(face_bgr: np.ndarray) -> tuple:
+    """
+    Analyze emotion for an already cropped face with the emotion model directly
+    
+    Skips DeepFace.analyze's own face detection pipeline; use it when the
+    caller has the face crop (e.g. from face_detection.detect_faces).
+    
+    Args:
+        face_bgr: Cropped face as a BGR image array
+    
+    Returns:
+        (dominant_emotion, emotion_distribution_dict, confidence)
+    """
+    if not DEEPFACE_AVAILABLE:
+        return analyze_emotion_fallback(face_bgr)
+    
+    try:
+        gray = cv2.cvtColor(face_bgr, cv2.COLOR_BGR2GRAY)
+        face = cv2.resize(gray, (48, 48)).astype(np.float32) / 255.0
+        scores = _get_emotion_model().predict(face[np.newaxis, :, :, np.newaxis], verbose=0)[0]
+        return _emotion_result_from_scores(scores)
+    
+    except Exception as e:
+        logger.error(f"Cropped-face emotion analysis error: {e}")
+        return 'neutral', {}, 0.0
+
+
+def analyze_emotion_batch(images: list) -> list:
+    """
+    Analyze emotion for several images with a single model forward pass
+    
+    Images are loaded (or decoded in memory) in parallel, cropped to the
+    largest face and stacked into one (N, 48, 48, 1) batch. Without DeepFace,
+    falls back to analyze_emotion per image.
+    
+    Args:
+        images: Image paths, raw image bytes and/or decoded BGR arrays
+        
+    Returns:
+        List of (dominant_emotion, emotion_distribution_dict, confidence), in input order
+    """
+    if not images:
+        return []
+    
+    if not DEEPFACE_AVAILABLE:
+        return [_analyze_one(image) for image in images]
+    
+    try:
+        with ThreadPoolExecutor(max_workers=min(8, len(images))) as executor:
+            decoded = list(executor.map(_load_bgr, images))
+        
+        results = [('neutral', {}, 0.0)] * len(images)
+        valid = [i for i, image in enumerate(decoded) if image is not None]
+        
+        if valid:
+            batch = np.stack([_preprocess_emotion_input(decoded[i]) for i in valid])[..., np.newaxis]
+            predictions = _get_emotion_model().predict(batch, verbose=0)
+            for i, scores in zip(valid, predictions):
+                results[i] = _emotion_result_from_scores(scores)
+        
+        logger.info(f"Emotion (DeepFace batch): analyzed {len(valid)}/{len(images)} images")
+        return results
+        
+    except Exception as e:
+        logger.warning(f"Batch emotion analysis failed: {e}, analyzing one by one")
+        return [_analyze_one(image) for image in images]
+
+
+def _analyze_one(image) -> tuple:
+    """analyze_emotion for a single batch item (raw bytes go through the in-memory decoder)"""
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return analyze_emotion_from_bytes(image)
+    return analyze_emotion(image)
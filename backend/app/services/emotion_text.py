@@ -0,0 +1,40 @@
+"""
+Emotion Text
+Human-readable statements for detected emotions, shared by the search routes
+"""
+
+# Statement prefix per emotion label
+EMOTION_DESCRIPTIONS = {
+    "happy": "😊 You look happy and cheerful!",
+    "sad": "😔 You seem to be feeling sad.",
+    "angry": "😠 You appear to be feeling angry.",
+    "fear": "😟 You seem fearful or anxious.",
+    "surprise": "😮 You look surprised!",
+    "disgust": "😕 You seem disgusted.",
+    "neutral": "😐 Your expression is neutral."
+}
+FALLBACK_DESCRIPTION = "Your emotional state is unclear."
+
+# Every statement for whole-percent confidences 0-100, built once at import
+_STATEMENTS = {
+    emotion: tuple(f"{description} (Confidence: {percent}%)" for percent in range(101))
+    for emotion, description in EMOTION_DESCRIPTIONS.items()
+}
+_FALLBACK_STATEMENTS = tuple(f"{FALLBACK_DESCRIPTION} (Confidence: {percent}%)" for percent in range(101))
+
+
+def generate_emotion_statement(emotion: str, confidence: float) -> str:
+    """
+    Generate human-readable emotion statement
+    
+    Args:
+        emotion: Emotion label ('happy', 'sad', 'angry', 'fear', 'neutral', 'disgust', 'surprise')
+        confidence: Confidence score (0-1)
+    
+    Returns:
+        Human-readable statement with emoji
+    """
+    percent = int(confidence * 100)
+    if 0 <= percent <= 100:
+        return _STATEMENTS.get(emotion, _FALLBACK_STATEMENTS)[percent]
+    return f"{EMOTION_DESCRIPTIONS.get(emotion, FALLBACK_DESCRIPTION)} (Confidence: {percent}%)"
@@ -1,25 +1,84 @@
 import cv2
+import logging
+import os
+import threading
 import numpy as np
 
-# Load OpenCV's default frontal face cascade
+from app.config import settings
+from app.utils.imaging import decode_bgr
+
+logger = logging.getLogger(__name__)
+
+# OpenCV's default frontal face cascade
 CASCADE_PATH = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-face_cascade = cv2.CascadeClassifier(CASCADE_PATH)
 
-def detect_faces(image_bytes: bytes):
-    """Return list of cropped face images (as numpy arrays)."""
-    # Convert bytes → np array → BGR image
-    nparr = np.frombuffer(image_bytes, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+# YuNet (ONNX, SIMD-accelerated) replaces the cascade when its weights are present
+YUNET_PATH = os.path.join(settings.MODEL_WEIGHTS_DIR, settings.YUNET_WEIGHTS)
+YUNET_AVAILABLE = hasattr(cv2, "FaceDetectorYN") and os.path.exists(YUNET_PATH)
+if YUNET_AVAILABLE:
+    logger.info("✅ YuNet face detector available")
+else:
+    logger.warning(f"⚠️ YuNet weights not found at {YUNET_PATH}, using Haar cascade")
+
+MIN_FACE_SIZE = 80
+
+# Detectors are not safe to share across threads (YuNet keeps its input
+# size as state, cascades keep scan buffers), so each thread gets its own
+_local = threading.local()
+
+
+def get_face_cascade() -> cv2.CascadeClassifier:
+    """This thread's Haar cascade, loaded from CASCADE_PATH on first use"""
+    cascade = getattr(_local, "cascade", None)
+    if cascade is None:
+        cascade = cv2.CascadeClassifier(CASCADE_PATH)
+        _local.cascade = cascade
+    return cascade
+
+
+def _yunet_detector():
+    """This thread's YuNet detector, created on first use"""
+    detector = getattr(_local, "yunet", None)
+    if detector is None:
+        detector = cv2.FaceDetectorYN.create(YUNET_PATH, "", (320, 320))
+        _local.yunet = detector
+    return detector
+
+
+def detect_face_boxes(img: np.ndarray) -> np.ndarray:
+    """Return face boxes in a BGR image as an (N, 4) int array of x, y, w, h."""
+    if YUNET_AVAILABLE:
+        detector = _yunet_detector()
+        height, width = img.shape[:2]
+        detector.setInputSize((width, height))
+        _, faces = detector.detect(img)
+        if faces is None:
+            return np.empty((0, 4), dtype=int)
+        boxes = faces[:, :4].astype(int)
+        # YuNet boxes can start slightly outside the frame
+        boxes[:, :2] = np.maximum(boxes[:, :2], 0)
+        return boxes[(boxes[:, 2] >= MIN_FACE_SIZE) & (boxes[:, 3] >= MIN_FACE_SIZE)]
+    
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    faces = face_cascade.detectMultiScale(
+    faces = get_face_cascade().detectMultiScale(
         gray,
         scaleFactor=1.1,
         minNeighbors=5,
-        minSize=(80, 80)
+        minSize=(MIN_FACE_SIZE, MIN_FACE_SIZE)
     )
+    return np.asarray(faces, dtype=int).reshape(-1, 4)
+
+
+def detect_faces(image_bytes: bytes):
+    """Return list of cropped face images (as numpy arrays)."""
+    # Convert bytes → BGR image (libjpeg-turbo for JPEGs when installed)
+    img = decode_bgr(image_bytes)
+    if img is None:
+        return []
     
-    crops = []
-    for (x, y, w, h) in faces:
-        face = img[y:y + h, x:x + w]
-        crops.append(face)
-    return crops
+    return [img[y:y + h, x:x + w] for x, y, w, h in detect_face_boxes(img)]
+
+
+# Load the import thread's cascade now so a bad install fails at startup
+if get_face_cascade().empty():
+    logger.error(f"Could not load Haar cascade from {CASCADE_PATH}")
@@ -0,0 +1,172 @@
+"""
+Stored Face Index
+Nearest-neighbour index over face encodings of images saved to backend storage
+Uses an HNSW graph (hnswlib) when installed, otherwise a vectorized scan
+Encodings are kept in the image catalog (SQLite), so every worker sees every stored face
+"""
+
+import numpy as np
+import logging
+import os
+import pickle
+import threading
+
+from app.services.face_recognition_service import FACE_RECOGNITION_AVAILABLE, face_distances
+from app.services.image_catalog import add_face_encoding, face_encodings_after
+
+logger = logging.getLogger(__name__)
+
+# Try to use hnswlib for approximate nearest-neighbour search
+try:
+    import hnswlib
+    HNSWLIB_AVAILABLE = True
+    logger.info("✅ hnswlib available for stored face search")
+except ImportError:
+    HNSWLIB_AVAILABLE = False
+    logger.warning("⚠️ hnswlib not available, stored face search will scan all encodings")
+
+# Encodings used to be pickled here; imported into the catalog once, then removed
+LEGACY_INDEX_FILE = "backend/uploads/stored_faces_index.pkl"
+
+# HNSW parameters (graph degree, build/search beam width)
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# Entry i (metadata dict) belongs to encoding row i / HNSW label i
+_entries = []
+_encodings = []
+_hnsw = None
+_last_id = 0  # Last catalog row merged into this process's index
+_lock = threading.Lock()
+
+
+def _hnsw_space() -> str:
+    """Same metric as find_matching_faces: Euclidean for face_recognition, else cosine"""
+    return 'l2' if FACE_RECOGNITION_AVAILABLE else 'cosine'
+
+
+def _build_hnsw(encodings: list):
+    """Build an HNSW graph over encodings (None if hnswlib is missing or there is nothing to index)"""
+    if not HNSWLIB_AVAILABLE or not encodings:
+        return None
+    
+    data = np.vstack(encodings).astype(np.float32)
+    index = hnswlib.Index(space=_hnsw_space(), dim=data.shape[1])
+    index.init_index(max_elements=max(1024, 2 * len(data)), ef_construction=HNSW_EF_CONSTRUCTION, M=HNSW_M)
+    index.add_items(data, np.arange(len(data)))
+    index.set_ef(HNSW_EF_SEARCH)
+    return index
+
+
+def _refresh():
+    """
+    Merge faces stored since the last refresh (by any process) into the index
+    
+    One indexed query on the catalog; the caller holds _lock.
+    """
+    global _hnsw, _last_id
+    rows = face_encodings_after(_last_id)
+    if not rows:
+        return
+    
+    first_label = len(_entries)
+    for row_id, image_path, user_name, emotion, encoding in rows:
+        _entries.append({'path': image_path, 'user_name': user_name, 'emotion': emotion})
+        _encodings.append(np.frombuffer(encoding, dtype=np.float32))
+        _last_id = row_id
+    
+    if _hnsw is None:
+        _hnsw = _build_hnsw(_encodings)
+    else:
+        if len(_entries) > _hnsw.get_max_elements():
+            _hnsw.resize_index(max(2 * _hnsw.get_max_elements(), len(_entries)))
+        _hnsw.add_items(np.vstack(_encodings[first_label:]), np.arange(first_label, len(_entries)))
+
+
+def _import_legacy_index():
+    """Move encodings from the old pickle file into the catalog (once)"""
+    if not os.path.exists(LEGACY_INDEX_FILE):
+        return
+    try:
+        with open(LEGACY_INDEX_FILE, 'rb') as f:
+            data = pickle.load(f)
+        for entry, encoding in zip(data['entries'], data['encodings']):
+            add_face_encoding(
+                entry['path'], entry['user_name'], entry['emotion'],
+                np.asarray(encoding, dtype=np.float32).tobytes()
+            )
+        os.remove(LEGACY_INDEX_FILE)
+        logger.info(f"Imported {len(data['entries'])} stored faces into the image catalog")
+    except Exception as e:
+        logger.warning(f"Could not import legacy stored face index: {e}")
+
+
+def load_stored_face_index():
+    """Load stored faces from the catalog, drop entries whose files are gone, and build the graph"""
+    global _entries, _encodings, _hnsw, _last_id
+    _import_legacy_index()
+    
+    with _lock:
+        _entries, _encodings, _hnsw, _last_id = [], [], None, 0
+        rows = face_encodings_after(0)
+        
+        # Compact: removed or archived images leave holes in the graph
+        for row_id, image_path, user_name, emotion, encoding in rows:
+            _last_id = row_id
+            if os.path.exists(image_path):
+                _entries.append({'path': image_path, 'user_name': user_name, 'emotion': emotion})
+                _encodings.append(np.frombuffer(encoding, dtype=np.float32))
+        _hnsw = _build_hnsw(_encodings)
+    
+    logger.info(f"Stored face index ready: {len(_entries)} faces")
+
+
+def add_stored_face(image_path: str, encoding: np.ndarray, user_name: str, emotion: str):
+    """
+    Add a newly stored face image to the index
+    
+    Args:
+        image_path: Path of the saved face image
+        encoding: Face encoding of the image
+        user_name: Owner of the image
+        emotion: Detected emotion label
+    """
+    add_face_encoding(image_path, user_name, emotion, np.asarray(encoding, dtype=np.float32).tobytes())
+    
+    with _lock:
+        _refresh()
+
+
+def query_stored_faces(query_encoding: np.ndarray, k: int = 10) -> list:
+    """
+    Find the stored faces closest to query_encoding
+    
+    Args:
+        query_encoding: Face encoding to search with
+        k: Number of neighbours to return
+    
+    Returns:
+        List of (entry, distance) pairs, closest first
+    """
+    with _lock:
+        # Faces stored through other workers since the last query
+        _refresh()
+        
+        if not _entries:
+            return []
+        
+        k = min(k, len(_entries))
+        query = np.asarray(query_encoding, dtype=np.float32)
+        
+        if _hnsw is not None:
+            labels, distances = _hnsw.knn_query(query, k=k)
+            labels, distances = labels[0], distances[0]
+            if _hnsw_space() == 'l2':
+                distances = np.sqrt(distances)  # hnswlib reports squared L2
+        else:
+            all_distances = face_distances(np.vstack(_encodings), query)
+            labels = np.argsort(all_distances, kind='stable')[:k]
+            distances = all_distances[labels]
+        
+        return [(_entries[label], float(distance)) for label, distance in zip(labels, distances)]
@@ -7,21 +7,38 @@ Falls back to DeepFace if face_recognition is not available
 
 import numpy as np
 import cv2
-from PIL import Image
 import logging
 from pathlib import Path
 import pickle
+import multiprocessing
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+from app.utils.content_cache import keyed_lru_cache
+from app.utils.imaging import decode_rgb
 
 logger = logging.getLogger(__name__)
 
+# Inter-process lock for the cache files (every uvicorn worker indexes at startup)
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
 # Try to import face_recognition
 try:
     import face_recognition
+    import dlib
     FACE_RECOGNITION_AVAILABLE = True
+    # dlib built with CUDA: cold indexing runs the CNN detector on GPU batches
+    GPU_BATCH_AVAILABLE = bool(getattr(dlib, 'DLIB_USE_CUDA', False))
     logger.info("✅ face_recognition library available")
 except ImportError:
     FACE_RECOGNITION_AVAILABLE = False
+    GPU_BATCH_AVAILABLE = False
     logger.warning("⚠️ face_recognition not available, will use DeepFace fallback")
     try:
         from deepface import DeepFace
@@ -31,37 +48,274 @@ except ImportError:
         DEEPFACE_AVAILABLE = False
         logger.error("❌ Neither face_recognition nor DeepFace available!")
 
+# Optional: SimSIMD kernels for cosine distances (DeepFace path)
+try:
+    import simsimd
+    SIMSIMD_AVAILABLE = True
+except ImportError:
+    SIMSIMD_AVAILABLE = False
+
+# Optional: Numba-compiled distance kernel (face_recognition path)
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _euclidean_kernel(encodings, query, out):
+        """Fused subtract/square/sum per row: no (N, D) temporary, rows split across cores"""
+        for i in prange(encodings.shape[0]):
+            total = 0.0
+            for k in range(encodings.shape[1]):
+                diff = encodings[i, k] - query[k]
+                total += diff * diff
+            out[i] = np.sqrt(total)
+
+# Optional: HNSW graph (hnswlib) over the images folder matrix for large libraries
+try:
+    import hnswlib
+    HNSWLIB_AVAILABLE = True
+except ImportError:
+    HNSWLIB_AVAILABLE = False
+
 # Cache for face encodings from images folder
-FACE_ENCODINGS_CACHE = {}
+# Persisted as one (N, D) float32 matrix (.npy, memory-mapped on load) plus the image path of each row
+FACE_ENCODINGS_CACHE = None  # Loaded by index_images_folder (under the cache lock), not at import
 CACHE_FILE = "backend/face_encodings_cache.pkl"
+# Each save writes a new <prefix>.<generation>.npy, so a memory-mapped matrix is never replaced
+MATRIX_FILE_PREFIX = "backend/face_encodings_matrix"
+LOCK_FILE = "backend/face_encodings_cache.lock"
+# Checkpoints append only the newly extracted images here; the next full save folds them in
+JOURNAL_FILE = "backend/face_encodings_journal.pkl"
+# Bump when the stored encoding format changes; older caches are rebuilt
+# v2: DeepFace encodings are stored L2-normalized
+# v3: encodings moved out of the pickle into a .npy matrix
+# v4: per-image (mtime_ns, size) stamps for incremental reindexing
+# v5: generation-named matrix files, named in the pickle
+CACHE_VERSION = 5
+
+# (cache dict, row paths, mapped matrix) for the dict last loaded from or saved to disk
+_cache_matrix = None
+
+# image path -> (mtime_ns, size) when its encodings were extracted (faceless images included)
+_cache_stamps = {}
+
+# Cold indexing fans out to worker processes (dlib encodes one image per call, single-threaded);
+# every uvicorn worker may run a pool, so together they use about one process per core
+INDEX_PARALLEL_MIN_IMAGES = 8
+INDEX_CHUNK_SIZE = 8
+INDEX_MAX_PROCESSES = max(1, (os.cpu_count() or 1) // max(1, int(os.environ.get("WEB_CONCURRENCY", "1"))))
+INDEX_SAVE_EVERY = 256  # Images between journal checkpoints, so a crash keeps most of the work
+
+# GPU batches: images are letterboxed into one canvas so a batch is a single array
+GPU_BATCH_SIZE = 32
+GPU_BATCH_CANVAS = 640
+
+# Below this many faces the exact matrix scan is as fast as a graph search
+ANN_MIN_FACES = 4096
+ANN_M = 16
+ANN_EF_CONSTRUCTION = 200
+ANN_EF_SEARCH = 128
+ANN_CANDIDATES_PER_RESULT = 4  # Neighbours fetched per requested result, to survive per-image dedupe
+
+
+def _map_cache(row_paths: list, matrix_file: str) -> dict:
+    """
+    Memory-map matrix_file and rebuild the path -> encodings dict over it
+    
+    Rows are views into the mapping, so nothing is read until a query touches it.
+    """
+    global _cache_matrix
+    matrix = np.load(matrix_file, mmap_mode='r') if row_paths else np.empty((0, 0), dtype=np.float32)
+    cache = {}
+    for row, image_path in enumerate(row_paths):
+        cache.setdefault(image_path, []).append(matrix[row])
+    _cache_matrix = (cache, row_paths, matrix)
+    return cache
+
+
+@contextmanager
+def _cache_lock():
+    """
+    Exclusive lock on the cache files, across processes and threads
+    
+    Held while loading, indexing and saving: workers that start together
+    index one at a time, and the later ones find the first one's saved cache
+    instead of extracting (and writing) the same files concurrently.
+    """
+    os.makedirs(os.path.dirname(LOCK_FILE), exist_ok=True)
+    with open(LOCK_FILE, 'a+b') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue  # LK_LOCK gives up after ~10 s; indexing can take longer
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
 
 
 def load_face_encodings_cache():
     """Load cached face encodings from disk"""
-    global FACE_ENCODINGS_CACHE
+    with _cache_lock():
+        _load_face_encodings_cache()
+
+
+def _load_face_encodings_cache():
+    """load_face_encodings_cache for callers already holding the cache lock"""
+    global FACE_ENCODINGS_CACHE, _cache_stamps
     try:
         if os.path.exists(CACHE_FILE):
             with open(CACHE_FILE, 'rb') as f:
-                FACE_ENCODINGS_CACHE = pickle.load(f)
-            logger.info(f"Loaded {len(FACE_ENCODINGS_CACHE)} face encodings from cache")
+                cached = pickle.load(f)
+            if isinstance(cached, dict) and cached.get('version') == CACHE_VERSION:
+                FACE_ENCODINGS_CACHE = _map_cache(cached['paths'], cached['matrix'])
+                _cache_stamps = cached['stamps']
+                logger.info(f"Loaded {len(FACE_ENCODINGS_CACHE)} face encodings from cache")
+            else:
+                FACE_ENCODINGS_CACHE, _cache_stamps = {}, {}
+                logger.info("Face encodings cache is from an older version, will reindex")
         else:
-            FACE_ENCODINGS_CACHE = {}
+            FACE_ENCODINGS_CACHE, _cache_stamps = {}, {}
     except Exception as e:
         logger.warning(f"Could not load face encodings cache: {e}")
-        FACE_ENCODINGS_CACHE = {}
+        FACE_ENCODINGS_CACHE, _cache_stamps = {}, {}
+    
+    # Images checkpointed by an interrupted indexing run (a new dict, so it is not served from the mapping)
+    records = _read_journal()
+    if records:
+        cache, stamps = dict(FACE_ENCODINGS_CACHE), dict(_cache_stamps)
+        for record in records:
+            for image_path, stamp in record['stamps'].items():
+                stamps[image_path] = stamp
+                cache.pop(image_path, None)
+            cache.update(record['faces'])
+        FACE_ENCODINGS_CACHE, _cache_stamps = cache, stamps
+        logger.info(f"Recovered {sum(len(record['stamps']) for record in records)} checkpointed images")
+
+
+def _read_journal() -> list:
+    """Checkpoint records in JOURNAL_FILE, oldest first (a torn last record is dropped)"""
+    records = []
+    try:
+        with open(JOURNAL_FILE, 'rb') as f:
+            while True:
+                record = pickle.load(f)
+                if isinstance(record, dict) and record.get('version') == CACHE_VERSION:
+                    records.append(record)
+    except (FileNotFoundError, EOFError):
+        pass
+    except Exception as e:
+        logger.warning(f"Stopped reading face encodings journal at a damaged record: {e}")
+    return records
+
+
+def _append_journal(faces: dict, stamps: dict):
+    """
+    Checkpoint the images extracted since the last checkpoint
+    
+    Args:
+        faces: Dictionary mapping image_path -> list of face encodings (images with faces)
+        stamps: Dictionary mapping image_path -> (mtime_ns, size) for every image extracted
+    """
+    try:
+        record = {
+            'version': CACHE_VERSION,
+            'faces': {
+                image_path: [np.asarray(encoding, dtype=np.float32) for encoding in encodings]
+                for image_path, encodings in faces.items()
+            },
+            'stamps': stamps
+        }
+        with open(JOURNAL_FILE, 'ab') as f:
+            pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+        logger.info(f"Checkpointed {len(stamps)} images")
+    except Exception as e:
+        logger.warning(f"Could not checkpoint face encodings: {e}")
 
 
 def save_face_encodings_cache():
     """Save face encodings cache to disk"""
+    with _cache_lock():
+        _save_face_encodings_cache()
+
+
+def _save_face_encodings_cache():
+    """
+    save_face_encodings_cache for callers already holding the cache lock
+    
+    The matrix goes to a new generation-named file and the pickle that names it
+    is swapped in with os.replace, so a reader sees the old cache or the new one,
+    never a mix. Mapped matrices are never overwritten (Windows refuses that).
+    """
+    global FACE_ENCODINGS_CACHE
     try:
         os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
-        with open(CACHE_FILE, 'wb') as f:
-            pickle.dump(FACE_ENCODINGS_CACHE, f)
+        row_paths, matrix = _flatten_encodings(FACE_ENCODINGS_CACHE)
+        
+        # Matrix first, then the paths that describe it (written aside, then renamed into place)
+        matrix_file = f"{MATRIX_FILE_PREFIX}.{time.time_ns():x}.npy"
+        if row_paths:
+            np.save(matrix_file, matrix)
+        tmp_path = f"{CACHE_FILE}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(
+                {'version': CACHE_VERSION, 'matrix': matrix_file, 'paths': row_paths, 'stamps': _cache_stamps},
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL
+            )
+        os.replace(tmp_path, CACHE_FILE)
+        
+        # Checkpointed images are part of the saved cache now
+        try:
+            os.remove(JOURNAL_FILE)
+        except FileNotFoundError:
+            pass
+        
+        # Serve the saved matrix from the mapping instead of the heap copies
+        FACE_ENCODINGS_CACHE = _map_cache(row_paths, matrix_file)
+        _remove_stale_matrices(matrix_file)
         logger.info(f"Saved {len(FACE_ENCODINGS_CACHE)} face encodings to cache")
     except Exception as e:
         logger.warning(f"Could not save face encodings cache: {e}")
 
 
+def _remove_stale_matrices(current_file: str):
+    """Delete older matrix generations; one still mapped somewhere (Windows) is retried on the next save"""
+    directory = os.path.dirname(MATRIX_FILE_PREFIX) or '.'
+    prefix = os.path.basename(MATRIX_FILE_PREFIX)
+    current = os.path.basename(current_file)
+    with os.scandir(directory) as it:
+        stale = [
+            entry.path for entry in it
+            if entry.name.startswith(prefix) and entry.name.endswith('.npy') and entry.name != current
+        ]
+    for path in stale:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _unit_encoding(values) -> np.ndarray:
+    """DeepFace embedding as an L2-normalized float32 vector, so cosine is a plain dot product"""
+    encoding = np.array(values, dtype=np.float32)
+    encoding /= np.linalg.norm(encoding) + 1e-12
+    return encoding
+
+
 def extract_face_encoding(image_path: str) -> list:
     """
     Extract face encoding from an image
@@ -98,9 +352,9 @@ def extract_face_encoding(image_path: str) -> list:
                 )
                 # DeepFace returns list of dicts, extract embedding
                 if isinstance(embedding, list) and len(embedding) > 0:
-                    return [np.array(embedding[0]['embedding'])]
+                    return [_unit_encoding(embedding[0]['embedding'])]
                 elif isinstance(embedding, dict):
-                    return [np.array(embedding['embedding'])]
+                    return [_unit_encoding(embedding['embedding'])]
                 return []
             except Exception as e:
                 logger.debug(f"DeepFace could not find face in {image_path}: {e}")
@@ -125,17 +379,55 @@ def extract_face_encoding_from_bytes(image_bytes: bytes) -> list:
         List of face encodings
     """
     try:
-        import io
-        import tempfile
+        if FACE_RECOGNITION_AVAILABLE or DEEPFACE_AVAILABLE:
+            # Decode once, in memory, straight into an RGB array (no PIL image or temp file);
+            # the array path feeds face_recognition or DeepFace directly
+            image = decode_rgb(image_bytes)
+            if image is None:
+                logger.error("Error extracting face encoding from bytes: not a decodable image")
+                return []
+            return extract_face_encoding_from_array(image)
+        else:
+            logger.error("No face recognition library available!")
+            return []
         
+    except Exception as e:
+        logger.error(f"Error extracting face encoding from bytes: {e}")
+        return []
+
+
+@keyed_lru_cache(maxsize=4096)
+def extract_face_encoding_from_bytes_cached(image_bytes: bytes) -> list:
+    """
+    extract_face_encoding_from_bytes memoized per content
+    
+    Call as extract_face_encoding_from_bytes_cached(content_key(image_bytes), image_bytes).
+    """
+    return extract_face_encoding_from_bytes(image_bytes)
+
+
+@keyed_lru_cache(maxsize=4096)
+def extract_face_encoding_from_array_cached(image_array: np.ndarray) -> list:
+    """
+    extract_face_encoding_from_array memoized per upload content
+    
+    Call as extract_face_encoding_from_array_cached(content_key(image_bytes), image_array).
+    """
+    return extract_face_encoding_from_array(image_array)
+
+
+def extract_face_encoding_from_array(image_array: np.ndarray) -> list:
+    """
+    Extract face encoding from an already decoded image
+    
+    Args:
+        image_array: RGB image as a (H, W, 3) uint8 array
+        
+    Returns:
+        List of face encodings
+    """
+    try:
         if FACE_RECOGNITION_AVAILABLE:
-            # Use face_recognition
-            from PIL import Image
-            image = Image.open(io.BytesIO(image_bytes))
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            image_array = np.array(image)
-            
             face_locations = face_recognition.face_locations(image_array)
             if not face_locations:
                 logger.debug("No faces found in uploaded image")
@@ -146,36 +438,39 @@ def extract_face_encoding_from_bytes(image_bytes: bytes) -> list:
             return face_encodings
             
         elif DEEPFACE_AVAILABLE:
-            # Fallback to DeepFace
             from deepface import DeepFace
-            # Save to temp file (DeepFace needs file path)
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
-                tmp_file.write(image_bytes)
-                tmp_path = tmp_file.name
-            
-            try:
-                embedding = DeepFace.represent(
-                    img_path=tmp_path,
-                    model_name='VGG-Face',
-                    enforce_detection=False
-                )
-                if isinstance(embedding, list) and len(embedding) > 0:
-                    return [np.array(embedding[0]['embedding'])]
-                elif isinstance(embedding, dict):
-                    return [np.array(embedding['embedding'])]
-                return []
-            finally:
-                if os.path.exists(tmp_path):
-                    os.unlink(tmp_path)
+            # DeepFace takes BGR arrays directly
+            embedding = DeepFace.represent(
+                img_path=np.ascontiguousarray(image_array[:, :, ::-1]),
+                model_name='VGG-Face',
+                enforce_detection=False
+            )
+            if isinstance(embedding, list) and len(embedding) > 0:
+                return [_unit_encoding(embedding[0]['embedding'])]
+            elif isinstance(embedding, dict):
+                return [_unit_encoding(embedding['embedding'])]
+            return []
         else:
             logger.error("No face recognition library available!")
             return []
         
     except Exception as e:
-        logger.error(f"Error extracting face encoding from bytes: {e}")
+        logger.error(f"Error extracting face encoding from array: {e}")
         return []
 
 
+def _cosine_distance(encoding1: np.ndarray, encoding2: np.ndarray) -> float:
+    """Cosine distance between two encodings (SimSIMD kernel when available)"""
+    if SIMSIMD_AVAILABLE:
+        a = np.ascontiguousarray(encoding1, dtype=np.float32)
+        b = np.ascontiguousarray(encoding2, dtype=np.float32)
+        return float(simsimd.cosine(a, b))
+    
+    # Encodings from this module are unit-length; the norms only matter for outside input
+    norms = np.linalg.norm(encoding1) * np.linalg.norm(encoding2)
+    return float(1.0 - np.dot(encoding1, encoding2) / (norms if norms > 0 else 1.0))
+
+
 def compare_faces(encoding1: np.ndarray, encoding2: np.ndarray, tolerance: float = 0.6) -> bool:
     """
     Compare two face encodings to see if they match
@@ -194,10 +489,7 @@ def compare_faces(encoding1: np.ndarray, encoding2: np.ndarray, tolerance: float
             return distance <= tolerance
         else:
             # Use cosine similarity for DeepFace embeddings
-            from sklearn.metrics.pairwise import cosine_similarity
-            similarity = cosine_similarity([encoding1], [encoding2])[0][0]
-            distance = 1.0 - similarity
-            return distance <= tolerance
+            return _cosine_distance(encoding1, encoding2) <= tolerance
     except Exception as e:
         logger.error(f"Error comparing faces: {e}")
         return False
@@ -220,10 +512,7 @@ def get_face_distance(encoding1: np.ndarray, encoding2: np.ndarray) -> float:
             return float(distance)
         else:
             # Use cosine similarity for DeepFace embeddings
-            from sklearn.metrics.pairwise import cosine_similarity
-            similarity = cosine_similarity([encoding1], [encoding2])[0][0]
-            distance = 1.0 - similarity
-            return float(distance)
+            return _cosine_distance(encoding1, encoding2)
     except Exception as e:
         logger.error(f"Error calculating face distance: {e}")
         return 1.0
@@ -233,128 +522,359 @@ def index_images_folder(images_folder: str, force_reindex: bool = False) -> dict
     """
     Index all faces in the images folder
     
+    The folder is always rescanned (one stat per image): only new or changed
+    (mtime/size) images are extracted, deleted ones drop out, and the cache is
+    saved only when something changed.
+    
     Args:
         images_folder: Path to images folder
-        force_reindex: If True, reindex even if cache exists
+        force_reindex: If True, re-extract every image, changed or not
         
     Returns:
         Dictionary mapping image_path -> list of face encodings
     """
-    global FACE_ENCODINGS_CACHE
-    
-    # Load cache if not already loaded
-    if not FACE_ENCODINGS_CACHE:
-        load_face_encodings_cache()
-    
     images_folder = Path(images_folder).resolve()
     
     if not images_folder.exists():
         logger.warning(f"Images folder not found: {images_folder}")
         return {}
     
-    # Check if we need to reindex
-    if not force_reindex and FACE_ENCODINGS_CACHE:
-        logger.info(f"Using cached face encodings ({len(FACE_ENCODINGS_CACHE)} images)")
-        return FACE_ENCODINGS_CACHE
+    with _cache_lock():
+        return _index_images_folder(images_folder, force_reindex)
+
+
+def _index_images_folder(images_folder: Path, force_reindex: bool) -> dict:
+    """index_images_folder under the cache lock"""
+    global FACE_ENCODINGS_CACHE, _cache_stamps
+    
+    # Reload: another worker may have saved since this process last looked
+    _load_face_encodings_cache()
+    cache = FACE_ENCODINGS_CACHE
     
-    logger.info(f"Indexing faces in: {images_folder}")
+    logger.info(f"Scanning for faces in: {images_folder}")
+    known_stamps = {} if force_reindex else _cache_stamps
     
     valid_extensions = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp')
     indexed = {}
-    total_faces = 0
+    pending = []
+    stamps = {}
     
-    # Walk through all subdirectories
+    # Walk through all subdirectories (walked roots are already normalized, so plain
+    # concatenation gives the same cache keys as str(Path(root) / file))
     for root, dirs, files in os.walk(str(images_folder)):
+        root_prefix = root + os.sep
         for file in files:
             if file.lower().endswith(valid_extensions):
-                image_path = Path(root) / file
-                image_path_str = str(image_path)
+                image_path_str = root_prefix + file
                 
-                # Skip if already indexed and file hasn't changed
-                if image_path_str in FACE_ENCODINGS_CACHE and not force_reindex:
-                    indexed[image_path_str] = FACE_ENCODINGS_CACHE[image_path_str]
+                try:
+                    stat_info = os.stat(image_path_str)
+                except OSError:
                     continue
+                stamps[image_path_str] = (stat_info.st_mtime_ns, stat_info.st_size)
                 
-                # Extract face encodings
-                encodings = extract_face_encoding(image_path_str)
+                # Skip if already extracted and file hasn't changed
+                if known_stamps.get(image_path_str) == stamps[image_path_str]:
+                    if image_path_str in cache:
+                        indexed[image_path_str] = cache[image_path_str]
+                    continue
                 
-                if encodings:
-                    indexed[image_path_str] = encodings
-                    total_faces += len(encodings)
-                    logger.debug(f"Indexed {len(encodings)} face(s) from {file}")
-                else:
-                    logger.debug(f"No faces found in {file}")
-    
-    # Update cache
+                pending.append(image_path_str)
+    
+    logger.info(f"{len(pending)} new or changed images, {len(stamps) - len(pending)} unchanged")
+    
+    # Nothing added, changed or deleted (and no checkpoints to fold in): keep the loaded cache as it is
+    if not pending and stamps.keys() == _cache_stamps.keys() and not os.path.exists(JOURNAL_FILE):
+        logger.info(f"Face encodings cache is up to date ({len(cache)} images)")
+        return cache
+    
+    # Extract face encodings (GPU batches, else worker processes unless there are only a few images)
+    if len(pending) < INDEX_PARALLEL_MIN_IMAGES:
+        _index_paths(pending, map, indexed, stamps)
+    elif GPU_BATCH_AVAILABLE:
+        logger.info(f"Extracting faces from {len(pending)} images in GPU batches of {GPU_BATCH_SIZE}")
+        _index_paths(pending, lambda fn, paths: _extract_face_encodings_gpu(paths), indexed, stamps)
+    elif INDEX_MAX_PROCESSES > 1:
+        logger.info(f"Extracting faces from {len(pending)} images across {INDEX_MAX_PROCESSES} processes")
+        # spawn, not fork: this process already runs TensorFlow/BLAS thread pools,
+        # and a forked child can deadlock on a lock one of those threads held
+        with ProcessPoolExecutor(
+            max_workers=INDEX_MAX_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            _index_paths(
+                pending,
+                lambda fn, paths: executor.map(fn, paths, chunksize=INDEX_CHUNK_SIZE),
+                indexed,
+                stamps
+            )
+    else:
+        _index_paths(pending, map, indexed, stamps)
+    total_faces = sum(len(indexed[path]) for path in pending if path in indexed)
+    
+    # Update cache (saving swaps in the memory-mapped copy); deleted images drop out
     FACE_ENCODINGS_CACHE = indexed
-    save_face_encodings_cache()
+    _cache_stamps = stamps
+    _save_face_encodings_cache()
+    indexed = FACE_ENCODINGS_CACHE
     
     logger.info(f"✅ Indexed {len(indexed)} images with {total_faces} total faces")
     return indexed
 
 
+def _letterbox(image: np.ndarray) -> tuple:
+    """Fit image into a GPU_BATCH_CANVAS square (aspect kept, zero padded); returns (canvas, scale)"""
+    height, width = image.shape[:2]
+    scale = min(GPU_BATCH_CANVAS / width, GPU_BATCH_CANVAS / height)
+    resized = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+    canvas = np.zeros((GPU_BATCH_CANVAS, GPU_BATCH_CANVAS, 3), dtype=np.uint8)
+    canvas[:resized.shape[0], :resized.shape[1]] = resized
+    return canvas, scale
+
+
+def _extract_face_encodings_gpu(paths: list):
+    """
+    Yield the face encodings of each path, in order, detecting faces in GPU batches
+    
+    batch_face_locations runs dlib's CNN detector on GPU_BATCH_SIZE images per call;
+    boxes are mapped back to each original image, which is then encoded as usual.
+    A batch that fails (e.g. out of GPU memory) falls back to extract_face_encoding.
+    """
+    for start in range(0, len(paths), GPU_BATCH_SIZE):
+        batch_paths = paths[start:start + GPU_BATCH_SIZE]
+        images, canvases, scales = [], [], []
+        for image_path in batch_paths:
+            try:
+                image = face_recognition.load_image_file(image_path)
+            except Exception as e:
+                logger.error(f"Error extracting face encoding from {image_path}: {e}")
+                image = None
+            images.append(image)
+            if image is not None:
+                canvas, scale = _letterbox(image)
+                canvases.append(canvas)
+                scales.append(scale)
+        
+        try:
+            batch_locations = iter(face_recognition.batch_face_locations(
+                canvases, number_of_times_to_upsample=0, batch_size=GPU_BATCH_SIZE
+            )) if canvases else iter(())
+        except Exception as e:
+            logger.warning(f"GPU batch face detection failed, extracting one by one: {e}")
+            yield from map(extract_face_encoding, batch_paths)
+            continue
+        
+        scale_iter = iter(scales)
+        for image_path, image in zip(batch_paths, images):
+            if image is None:
+                yield []
+                continue
+            locations, scale = next(batch_locations), next(scale_iter)
+            height, width = image.shape[:2]
+            face_locations = [
+                (
+                    max(0, round(top / scale)), min(width, round(right / scale)),
+                    min(height, round(bottom / scale)), max(0, round(left / scale))
+                )
+                for top, right, bottom, left in locations
+            ]
+            yield face_recognition.face_encodings(image, face_locations) if face_locations else []
+
+
+def _index_paths(paths: list, map_fn, indexed: dict, stamps: dict):
+    """
+    Extract encodings for paths into indexed, checkpointing new images as it goes
+    
+    Each checkpoint appends only the images extracted since the previous one
+    to JOURNAL_FILE; the full cache is written once, by the caller, at the end.
+    
+    Args:
+        paths: Image paths to extract
+        map_fn: map-like callable (built-in map or an executor's map); results keep path order
+        indexed: Dictionary mapping image_path -> list of face encodings, updated in place
+        stamps: Dictionary mapping image_path -> (mtime_ns, size) as scanned
+    """
+    batch_faces, batch_stamps = {}, {}
+    
+    for done, (image_path, encodings) in enumerate(zip(paths, map_fn(extract_face_encoding, paths)), start=1):
+        batch_stamps[image_path] = stamps[image_path]
+        if encodings:
+            indexed[image_path] = encodings
+            batch_faces[image_path] = encodings
+            logger.debug(f"Indexed {len(encodings)} face(s) from {os.path.basename(image_path)}")
+        else:
+            logger.debug(f"No faces found in {os.path.basename(image_path)}")
+        
+        if done % INDEX_SAVE_EVERY == 0:
+            _append_journal(batch_faces, batch_stamps)
+            batch_faces, batch_stamps = {}, {}
+
+
+def build_face_index(indexed_faces: dict) -> tuple:
+    """
+    Flatten indexed encodings into a single matrix for vectorized matching
+    
+    Args:
+        indexed_faces: Dictionary mapping image_path -> list of face encodings
+        
+    Returns:
+        (paths, encodings, ann) where paths[i] is the image holding encodings[i]
+        (DeepFace rows are unit-length, as stored by the extract functions, and
+        int8-quantized when SimSIMD is available) and ann is an HNSW graph over
+        the float rows, or None to scan the matrix
+    """
+    # The cache as loaded/saved already has its matrix on disk; map it rather than copy it
+    if _cache_matrix is not None and _cache_matrix[0] is indexed_faces:
+        paths, encodings = _cache_matrix[1], _cache_matrix[2]
+    else:
+        paths, encodings = _flatten_encodings(indexed_faces)
+    
+    if not paths:
+        return [], encodings, None
+    ann = _build_ann(encodings)
+    
+    # Unit-length DeepFace rows quantize to int8 with negligible ranking loss: 4x less to scan
+    if not FACE_RECOGNITION_AVAILABLE and SIMSIMD_AVAILABLE:
+        encodings = _quantize_i8(encodings)
+    return paths, encodings, ann
+
+
+def _quantize_i8(encodings: np.ndarray) -> np.ndarray:
+    """Unit-length float encodings scaled to int8 (x127) for SimSIMD's int8 cosine kernel"""
+    return np.round(np.clip(encodings, -1.0, 1.0) * 127).astype(np.int8)
+
+
+def _flatten_encodings(indexed_faces: dict) -> tuple:
+    """(row paths, (N, D) float32 matrix) for a path -> encodings dict"""
+    paths = []
+    rows = []
+    for image_path, encodings in indexed_faces.items():
+        for encoding in encodings:
+            paths.append(image_path)
+            rows.append(np.asarray(encoding, dtype=np.float32))
+    
+    if not rows:
+        return [], np.empty((0, 0), dtype=np.float32)
+    
+    # float32 halves the matrix scanned per query; distances stay well within tolerance precision
+    return paths, np.vstack(rows)
+
+
+def _build_ann(encodings: np.ndarray):
+    """HNSW graph over encodings (None if hnswlib is missing or the library is small)"""
+    if not HNSWLIB_AVAILABLE or len(encodings) < ANN_MIN_FACES:
+        return None
+    
+    # Unit-length DeepFace rows: inner-product space gives 1 - cos, the cosine distance
+    ann = hnswlib.Index(space='l2' if FACE_RECOGNITION_AVAILABLE else 'ip', dim=encodings.shape[1])
+    ann.init_index(max_elements=len(encodings), ef_construction=ANN_EF_CONSTRUCTION, M=ANN_M)
+    ann.add_items(encodings, np.arange(len(encodings)))
+    ann.set_ef(ANN_EF_SEARCH)
+    logger.info(f"Built HNSW index over {len(encodings)} faces")
+    return ann
+
+
+def face_distances(encodings: np.ndarray, query_encoding: np.ndarray, unit_rows: bool = False) -> np.ndarray:
+    """
+    Distances from query_encoding to every row of encodings in one call
+    
+    Uses the same metric as get_face_distance (Euclidean for face_recognition,
+    cosine distance for DeepFace embeddings). With unit_rows (rows and query
+    already L2-normalized) the cosine case is a single GEMV.
+    """
+    if FACE_RECOGNITION_AVAILABLE:
+        if NUMBA_AVAILABLE and encodings.dtype == np.float32:
+            distances = np.empty(len(encodings), dtype=np.float32)
+            _euclidean_kernel(encodings, np.ascontiguousarray(query_encoding, dtype=np.float32), distances)
+            return distances
+        return np.linalg.norm(encodings - query_encoding, axis=1)
+    
+    if SIMSIMD_AVAILABLE and encodings.dtype in (np.float32, np.int8):
+        query = np.ascontiguousarray(query_encoding, dtype=encodings.dtype).reshape(1, -1)
+        return np.asarray(simsimd.cdist(query, np.ascontiguousarray(encodings), metric="cosine"))[0]
+    
+    if unit_rows:
+        return 1.0 - encodings @ query_encoding
+    
+    norms = np.linalg.norm(encodings, axis=1) * np.linalg.norm(query_encoding)
+    norms[norms == 0] = 1.0
+    return 1.0 - (encodings @ query_encoding) / norms
+
+
 def find_matching_faces(
     query_encoding: np.ndarray,
-    images_folder: str,
+    images_folder: str = None,
     tolerance: float = 0.6,
-    max_results: int = 10
+    max_results: int = 10,
+    face_index: tuple = None
 ) -> list:
     """
     Find matching faces in the images folder
     
     Args:
         query_encoding: Face encoding from captured image
-        images_folder: Path to images folder
+        images_folder: Path to images folder (used when face_index is not given)
         tolerance: Distance threshold for matching
         max_results: Maximum number of results to return
+        face_index: Preloaded (paths, encodings, ann) from build_face_index
         
     Returns:
         List of matching images with similarity scores
     """
     try:
-        # Index images folder
-        indexed_faces = index_images_folder(images_folder)
+        if face_index is None:
+            face_index = build_face_index(index_images_folder(images_folder))
+        
+        paths, encodings, ann = face_index
         
-        if not indexed_faces:
+        if not paths:
             logger.warning("No faces indexed in images folder")
             return []
         
-        matches = []
+        query = np.asarray(query_encoding, dtype=np.float32)
+        if not FACE_RECOGNITION_AVAILABLE:
+            query = query / (np.linalg.norm(query) + 1e-12)
         
-        # Compare query encoding with all indexed faces
-        for image_path, encodings in indexed_faces.items():
-            for encoding in encodings:
-                distance = get_face_distance(query_encoding, encoding)
-                
-                if distance <= tolerance:
-                    similarity = 1.0 - distance  # Convert distance to similarity (0-1)
-                    matches.append({
-                        'image_path': image_path,
-                        'similarity': similarity,
-                        'distance': distance
-                    })
-        
-        # Sort by similarity (highest first)
-        matches.sort(key=lambda x: x['similarity'], reverse=True)
+        if ann is not None:
+            # Approximate nearest neighbours from the graph (already closest first)
+            k = min(max_results * ANN_CANDIDATES_PER_RESULT, len(paths))
+            labels, ann_distances = ann.knn_query(query, k=k)
+            labels, ann_distances = labels[0], ann_distances[0]
+            if FACE_RECOGNITION_AVAILABLE:
+                ann_distances = np.sqrt(ann_distances)  # hnswlib reports squared L2
+            distances = np.empty(len(paths), dtype=np.float32)
+            distances[labels] = ann_distances
+            order = labels[ann_distances <= tolerance]
+        else:
+            # Compare query encoding with all indexed faces at once
+            if encodings.dtype == np.int8:
+                query = _quantize_i8(query)
+            distances = face_distances(encodings, query, unit_rows=True)
+            
+            # Best matches first (stable, so ties keep index order)
+            candidates = np.flatnonzero(distances <= tolerance)
+            order = candidates[np.argsort(distances[candidates], kind='stable')]
         
         # Remove duplicates (same image path, keep best match)
         seen_paths = set()
         unique_matches = []
-        for match in matches:
-            if match['image_path'] not in seen_paths:
-                seen_paths.add(match['image_path'])
-                unique_matches.append(match)
-                if len(unique_matches) >= max_results:
-                    break
+        for i in order:
+            image_path = paths[i]
+            if image_path in seen_paths:
+                continue
+            seen_paths.add(image_path)
+            distance = float(distances[i])
+            unique_matches.append({
+                'image_path': image_path,
+                'similarity': 1.0 - distance,  # Convert distance to similarity (0-1)
+                'distance': distance
+            })
+            if len(unique_matches) >= max_results:
+                break
         
         logger.info(f"Found {len(unique_matches)} matching faces")
         return unique_matches
         
     except Exception as e:
-        logger.error(f"Error finding matching faces: {e}", exc_info=True)
+        logger.error(f"Error finding matching faces: {e}", exc_info=logger.isEnabledFor(logging.DEBUG))
         return []
-
-
-# Initialize cache on import
-load_face_encodings_cache()
-
@@ -0,0 +1,220 @@
+"""
+Stored Image Catalog
+SQLite (WAL mode) table of metadata for face images saved to backend storage
+Listings and filters become indexed lookups instead of directory walks
+Face encodings of stored images live here too, shared by every worker process
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+CATALOG_FILE = "backend/uploads/image_catalog.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    user_name TEXT NOT NULL,
+    emotion TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_images_emotion ON images (emotion COLLATE NOCASE, created DESC);
+CREATE INDEX IF NOT EXISTS idx_images_user_emotion ON images (user_name, emotion COLLATE NOCASE, created DESC);
+CREATE TABLE IF NOT EXISTS stored_faces (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL,
+    user_name TEXT NOT NULL,
+    emotion TEXT NOT NULL,
+    encoding BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_stored_faces_path ON stored_faces (path);
+"""
+
+# sqlite3 connections are per thread; requests reach the catalog from worker threads
+_local = threading.local()
+
+
+def _connection() -> sqlite3.Connection:
+    """This thread's catalog connection, opened and configured on first use"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(CATALOG_FILE), exist_ok=True)
+        conn = sqlite3.connect(CATALOG_FILE)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA mmap_size=268435456")
+        conn.executescript(_SCHEMA)
+        _local.conn = conn
+    return conn
+
+
+def _row_to_image(row: sqlite3.Row) -> dict:
+    """Catalog row as the image metadata dict used by the storage service"""
+    return {
+        "filename": row["filename"],
+        "path": row["path"],
+        "emotion": row["emotion"],
+        "user_name": row["user_name"],
+        "size": row["size"],
+        "created_ts": row["created"],
+        "source": "backend_storage"
+    }
+
+
+def add_image(image_path: str, user_name: str, emotion: str):
+    """
+    Record a face image that was just written to backend storage
+    
+    Args:
+        image_path: Path of the saved image
+        user_name: Owner of the image
+        emotion: Emotion folder the image was saved under
+    """
+    stat_info = os.stat(image_path)
+    conn = _connection()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO images (path, filename, user_name, emotion, size, created) VALUES (?, ?, ?, ?, ?, ?)",
+            (image_path, os.path.basename(image_path), user_name, emotion, stat_info.st_size, stat_info.st_ctime)
+        )
+
+
+def add_face_encoding(image_path: str, user_name: str, emotion: str, encoding: bytes):
+    """
+    Append the face encoding of a stored image (one row per face)
+    
+    Args:
+        image_path: Path of the saved image
+        user_name: Owner of the image
+        emotion: Detected emotion label
+        encoding: Face encoding as raw float32 bytes
+    """
+    conn = _connection()
+    with conn:
+        conn.execute(
+            "INSERT INTO stored_faces (path, user_name, emotion, encoding) VALUES (?, ?, ?, ?)",
+            (image_path, user_name, emotion, encoding)
+        )
+
+
+def face_encodings_after(last_id: int) -> list:
+    """
+    Face encodings added after row last_id, oldest first
+    
+    Ids only grow (AUTOINCREMENT), so a reader that remembers the last id it
+    saw picks up exactly the faces other processes stored since.
+    
+    Args:
+        last_id: Last row id already seen (0 for all rows)
+    
+    Returns:
+        List of (id, path, user_name, emotion, encoding bytes) tuples
+    """
+    return _connection().execute(
+        "SELECT id, path, user_name, emotion, encoding FROM stored_faces WHERE id > ? ORDER BY id",
+        (last_id,)
+    ).fetchall()
+
+
+def list_images(user_name: str = None, emotion: str = None, limit: int = None) -> list:
+    """
+    List catalogued images, newest first
+    
+    Args:
+        user_name: Optional user filter
+        emotion: Optional emotion filter (case-insensitive)
+        limit: Optional maximum number of images
+    
+    Returns:
+        List of image metadata
+    """
+    clauses, params = [], []
+    if user_name:
+        clauses.append("user_name = ?")
+        params.append(user_name)
+    if emotion:
+        clauses.append("emotion = ? COLLATE NOCASE")
+        params.append(emotion)
+    
+    query = "SELECT * FROM images"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += " ORDER BY created DESC"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    
+    return [_row_to_image(row) for row in _connection().execute(query, params)]
+
+
+def catalog_stats() -> dict:
+    """
+    Aggregate counts and sizes of catalogued images
+    
+    Returns:
+        Dictionary with total_images, total_size_bytes, users and emotions counts
+    """
+    conn = _connection()
+    total_images, total_size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM images").fetchone()
+    users = dict(conn.execute("SELECT user_name, COUNT(*) FROM images GROUP BY user_name").fetchall())
+    emotions = dict(conn.execute("SELECT emotion, COUNT(*) FROM images GROUP BY emotion").fetchall())
+    
+    return {
+        "total_images": total_images,
+        "total_size_bytes": total_size,
+        "users": users,
+        "emotions": emotions
+    }
+
+
+def sync_image_catalog(faces_dir: str):
+    """
+    Reconcile the catalog with the <user>/<emotion>/<file> tree under faces_dir
+    
+    Adds images saved before the catalog existed (or copied in by hand) and
+    drops rows whose files are gone. Run once at startup.
+    
+    Args:
+        faces_dir: Backend face storage directory
+    """
+    try:
+        on_disk = {}
+        if os.path.isdir(faces_dir):
+            with os.scandir(faces_dir) as users_it:
+                user_dirs = [entry for entry in users_it if entry.is_dir()]
+            for user_entry in user_dirs:
+                with os.scandir(user_entry.path) as emotions_it:
+                    emotion_dirs = [entry for entry in emotions_it if entry.is_dir()]
+                for emotion_entry in emotion_dirs:
+                    with os.scandir(emotion_entry.path) as files_it:
+                        for entry in files_it:
+                            if entry.name.endswith(('.jpg', '.png')):
+                                stat_info = entry.stat()
+                                on_disk[entry.path] = (
+                                    entry.path, entry.name, user_entry.name, emotion_entry.name,
+                                    stat_info.st_size, stat_info.st_ctime
+                                )
+        
+        conn = _connection()
+        catalogued = {row[0] for row in conn.execute("SELECT path FROM images")}
+        missing = [on_disk[path] for path in on_disk.keys() - catalogued]
+        stale = [(path,) for path in catalogued - on_disk.keys()]
+        
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO images (path, filename, user_name, emotion, size, created) VALUES (?, ?, ?, ?, ?, ?)",
+                missing
+            )
+            conn.executemany("DELETE FROM images WHERE path = ?", stale)
+            conn.executemany("DELETE FROM stored_faces WHERE path = ?", stale)
+        
+        logger.info(f"Image catalog ready: {len(on_disk)} images ({len(missing)} added, {len(stale)} removed)")
+    
+    except Exception as e:
+        logger.warning(f"Could not sync image catalog: {e}")
@@ -3,32 +3,103 @@ Image Storage Service - Load images from local drive folder and search
 Handles file storage, database operations, and similarity search
 """
 
+import binascii
+import cv2
+import mmap
+import numpy as np
 import os
+import re
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import chain, islice
 import logging
 from pathlib import Path
 import uuid
 
+from app.services.face_index import add_stored_face, query_stored_faces
+from app.services.image_catalog import add_image, list_images, catalog_stats
+from app.utils.imaging import decode_bgr
+
 logger = logging.getLogger(__name__)
 
+# Optional: watch the local folder so listings are invalidated by file events
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    WATCHDOG_AVAILABLE = False
+
 # Storage configuration
 BASE_UPLOAD_DIR = "backend/uploads"
 SESSIONS_DIR = os.path.join(BASE_UPLOAD_DIR, "sessions")
 FACES_DIR = os.path.join(BASE_UPLOAD_DIR, "faces")
 ARCHIVE_DIR = os.path.join(BASE_UPLOAD_DIR, "archive")
+THUMBNAILS_DIR = os.path.join(BASE_UPLOAD_DIR, "thumbnails")
+
+# Thumbnails are JPEGs this many pixels wide, served by default instead of full-res images
+THUMBNAIL_WIDTH = 256
+THUMBNAIL_JPEG_QUALITY = 80
+
+# Project root, resolved once at import
+# Path structure: backend/app/services/image_storage.py
+# Go up 3 levels: services -> app -> backend -> project_root
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
 
 # ===== NEW: Local drive folder configuration =====
 # Point this to your images folder (relative to project root)
 LOCAL_IMAGES_FOLDER = "frontend/Images"  # Relative path from project root
 
-# Create directories if they don't exist
-os.makedirs(SESSIONS_DIR, exist_ok=True)
-os.makedirs(FACES_DIR, exist_ok=True)
-os.makedirs(ARCHIVE_DIR, exist_ok=True)
+# Local folder scan: image extensions, and emotion labels matched in folder/file names
+LOCAL_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp')
+LOCAL_FOLDER_EMOTIONS = ('happy', 'sad', 'angry', 'fear', 'surprise', 'disgust', 'neutral')
+_EMOTION_NAME_RE = re.compile("|".join(LOCAL_FOLDER_EMOTIONS))
+_EMOTION_NAME_PRIORITY = {emotion: rank for rank, emotion in enumerate(LOCAL_FOLDER_EMOTIONS)}
+
+# Related emotions that fill up get_similar_images, in order (keys lowercase)
+_EMOTION_SIMILARITY = {
+    "happy": ("surprise",),
+    "sad": ("neutral", "fear"),
+    "angry": ("fear", "disgust"),
+    "fear": ("sad", "angry"),
+    "surprise": ("happy",),
+    "disgust": ("angry", "sad"),
+    "neutral": ("sad",)
+}
+
+# MIME types for served images, by file extension
+MIME_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.bmp': 'image/bmp',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp'
+}
+
+# Cache-Control for served images; clients revalidate with the ETag
+IMAGE_CACHE_CONTROL = "public, max-age=86400, immutable"
 
-logger.info(f"Storage directories initialized: {SESSIONS_DIR}")
-logger.info(f"Local images folder: {LOCAL_IMAGES_FOLDER}")
+# Directories known to exist, so request paths skip the makedirs syscalls
+_created_dirs = set()
+
+
+def _ensure_dir(path: str):
+    """Create path (and parents) the first time it is seen in this process"""
+    if path not in _created_dirs:
+        os.makedirs(path, exist_ok=True)
+        _created_dirs.add(path)
+
+
+def prepare_storage_dirs():
+    """Create the storage directories once at startup (called from the app lifespan)"""
+    for path in (SESSIONS_DIR, FACES_DIR, ARCHIVE_DIR, THUMBNAILS_DIR):
+        _ensure_dir(path)
+    
+    logger.info("Storage directories initialized: %s", SESSIONS_DIR)
+    logger.info("Local images folder: %s", LOCAL_IMAGES_FOLDER)
 
 
 def set_local_images_folder(folder_path: str) -> bool:
@@ -45,10 +116,11 @@ def set_local_images_folder(folder_path: str) -> bool:
     
     if os.path.exists(folder_path):
         LOCAL_IMAGES_FOLDER = folder_path
-        logger.info(f"✅ Local images folder set to: {LOCAL_IMAGES_FOLDER}")
+        clear_local_folder_cache()
+        logger.info("✅ Local images folder set to: %s", LOCAL_IMAGES_FOLDER)
         return True
     else:
-        logger.error(f"❌ Folder does not exist: {folder_path}")
+        logger.error("❌ Folder does not exist: %s", folder_path)
         return False
 
 
@@ -64,9 +136,12 @@ def save_session_image(session_id: str, image_data: bytes) -> str:
         Path to saved image
     """
     try:
-        # Create session directory
+        # Create session directory (SESSIONS_DIR exists from startup; ids are unique)
         session_dir = os.path.join(SESSIONS_DIR, session_id)
-        os.makedirs(session_dir, exist_ok=True)
+        try:
+            os.mkdir(session_dir)
+        except FileExistsError:
+            pass
         
         # Save with timestamp
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -77,16 +152,16 @@ def save_session_image(session_id: str, image_data: bytes) -> str:
         with open(image_path, 'wb') as f:
             f.write(image_data)
         
-        logger.info(f"Session image saved: {image_path}")
+        logger.info("Session image saved: %s", image_path)
         
         return image_path
     
     except Exception as e:
-        logger.error(f"Error saving session image: {e}")
+        logger.error("Error saving session image: %s", e)
         raise
 
 
-def save_face_image(session_id: str, user_name: str, emotion: str, image_data: bytes) -> str:
+def save_face_image(session_id: str, user_name: str, emotion: str, image_data: bytes, face_encoding=None, image_array: np.ndarray = None) -> str:
     """
     Save detected face image to faces directory
     
@@ -95,6 +170,9 @@ def save_face_image(session_id: str, user_name: str, emotion: str, image_data: b
         user_name: User's name
         emotion: Detected emotion
         image_data: Face image bytes
+        face_encoding: Face encoding of the image; when given, it is added to
+            the stored face index used by get_similar_images
+        image_array: Already decoded RGB pixels of image_data, reused for the thumbnail
     
     Returns:
         Path to saved face image
@@ -102,7 +180,7 @@ def save_face_image(session_id: str, user_name: str, emotion: str, image_data: b
     try:
         # Create user/emotion directory structure
         user_emotion_dir = os.path.join(FACES_DIR, user_name, emotion)
-        os.makedirs(user_emotion_dir, exist_ok=True)
+        _ensure_dir(user_emotion_dir)
         
         # Create filename with timestamp and unique ID
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -110,24 +188,121 @@ def save_face_image(session_id: str, user_name: str, emotion: str, image_data: b
         face_filename = f"{emotion}_{timestamp}_{unique_id}.jpg"
         face_path = os.path.join(user_emotion_dir, face_filename)
         
-        # Write face image
+        # Write the original bytes as-is (no re-encode)
         with open(face_path, 'wb') as f:
             f.write(image_data)
         
-        logger.info(f"Face image saved: {face_path}")
+        logger.info("Face image saved: %s", face_path)
+        
+        add_image(face_path, user_name, emotion)
+        
+        # Downscale once at ingest so listings never touch the full-res file
+        get_thumbnail_path(face_path, "backend_storage", image_data, image_array)
+        
+        if face_encoding is not None:
+            add_stored_face(face_path, face_encoding, user_name, emotion)
         
         return face_path
     
     except Exception as e:
-        logger.error(f"Error saving face image: {e}")
+        logger.error("Error saving face image: %s", e)
         raise
 
 
+def get_local_images_folder_path() -> Path:
+    """
+    Resolve LOCAL_IMAGES_FOLDER to an absolute path
+    
+    Returns:
+        Absolute, normalized path (relative settings are taken from project root)
+    """
+    images_folder = PROJECT_ROOT / LOCAL_IMAGES_FOLDER.replace('\\', '/')
+    
+    # Normalize path (handle Windows paths, use forward slashes)
+    return Path(str(images_folder).replace('\\', '/'))
+
+
+def clear_local_folder_cache():
+    """Drop memoized local folder listings (call after changing or writing into the folder)"""
+    _scan_local_folder.cache_clear()
+
+
+# Bumped by the watchdog observer on every change under the watched folder
+_folder_generation = 0
+_watched_folder = None
+_folder_observer = None
+
+
+if WATCHDOG_AVAILABLE:
+    class _FolderChangeHandler(FileSystemEventHandler):
+        """Invalidate the local folder listing on create/delete/move/modify (not on reads)"""
+        
+        def _bump(self, event):
+            global _folder_generation
+            _folder_generation += 1
+        
+        on_created = on_deleted = on_moved = on_modified = _bump
+
+
+def _watch_local_folder(folder: str) -> bool:
+    """
+    Make sure folder is watched for changes
+    
+    Returns:
+        True if a watchdog observer covers folder (listings can skip the
+        signature check), False if watchdog is unavailable or failed
+    """
+    global _watched_folder, _folder_observer, _folder_generation
+    
+    if not WATCHDOG_AVAILABLE:
+        return False
+    if _watched_folder == folder:
+        return True
+    
+    try:
+        if _folder_observer is not None:
+            _folder_observer.stop()
+        
+        observer = Observer()
+        observer.daemon = True
+        observer.schedule(_FolderChangeHandler(), folder, recursive=True)
+        observer.start()
+        
+        _folder_observer = observer
+        _watched_folder = folder
+        _folder_generation += 1
+        return True
+    
+    except Exception as e:
+        logger.warning("Could not watch local images folder, using mtime checks: %s", e)
+        _folder_observer = None
+        _watched_folder = None
+        return False
+
+
+def _folder_signature(folder: str) -> tuple:
+    """
+    Cheap change signature for a folder: mtime of the folder and of its
+    direct subdirectories (emotion/ or user/ folders), so adding an image
+    to e.g. happy/ invalidates the cached listing.
+    """
+    signature = [os.stat(folder).st_mtime_ns]
+    with os.scandir(folder) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                signature.append((entry.name, entry.stat(follow_symlinks=False).st_mtime_ns))
+    return tuple(signature)
+
+
 def get_images_from_local_folder(emotion: str = None, user_name: str = None) -> list:
     """
     ===== NEW FUNCTION =====
     Load images from local drive folder (recursive scan)
     
+    The unfiltered listing is memoized per folder and filtered in memory.
+    It is reused until a watchdog event under the folder, or, without
+    watchdog, until the folder signature (see _folder_signature) changes.
+    
     Args:
         emotion: Filter by emotion (optional)
         user_name: Filter by user (optional)
@@ -136,101 +311,157 @@ def get_images_from_local_folder(emotion: str = None, user_name: str = None) ->
         List of images from local folder
     """
     try:
-        images = []
-        
-        # Get absolute path from project root
-        # Path structure: backend/app/services/image_storage.py
-        # Go up 3 levels: services -> app -> backend -> project_root
-        current_file = Path(__file__).resolve()
-        project_root = current_file.parent.parent.parent.parent  # Go up from services/app/backend/
-        images_folder = project_root / LOCAL_IMAGES_FOLDER.replace('\\', '/')
-        
-        # Normalize path (handle Windows paths, use forward slashes)
-        images_folder = Path(str(images_folder).replace('\\', '/'))
+        images_folder = get_local_images_folder_path()
         
         if not images_folder.exists():
-            logger.warning(f"Local images folder not found: {images_folder}")
-            return images
+            logger.warning("Local images folder not found: %s", images_folder)
+            return []
         
-        logger.info(f"Searching local folder: {images_folder}")
+        folder = str(images_folder)
+        if _watch_local_folder(folder):
+            signature = ('watch', _folder_generation)
+        else:
+            signature = _folder_signature(folder)
         
-        # Valid image extensions
-        valid_extensions = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp')
+        images, by_emotion = _scan_local_folder(folder, signature)
         
-        # Valid emotions to detect
-        valid_emotions = ['happy', 'sad', 'angry', 'fear', 'surprise', 'disgust', 'neutral']
+        if emotion:
+            images = by_emotion.get(emotion.lower(), ())
+        if user_name:
+            images = [{**img, "user_name": user_name} for img in images]
         
-        # Walk through all subdirectories recursively
-        for root, dirs, files in os.walk(str(images_folder)):
-            for file in files:
-                # Check if it's an image file
-                if file.lower().endswith(valid_extensions):
-                    image_path = Path(root) / file
+        return list(images)
+    
+    except Exception as e:
+        logger.error("Error reading local images: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+        return []
+
+
+def _emotion_in_name(name: str) -> str:
+    """
+    Emotion label contained in a folder or file name (case-insensitive), or None
+    
+    One regex pass over the name; when several labels occur, the earliest in
+    LOCAL_FOLDER_EMOTIONS wins. No label ends with another's prefix except
+    "sad"/"disgust", where "sad" wins anyway, so non-overlapping matches suffice.
+    """
+    matched = _EMOTION_NAME_RE.findall(name.lower())
+    if not matched:
+        return None
+    return min(matched, key=_EMOTION_NAME_PRIORITY.get)
+
+
+@lru_cache(maxsize=2)
+def _scan_local_folder(images_folder: str, signature: tuple) -> tuple:
+    """
+    Recursive scan of the local images folder (unfiltered)
+    
+    Args:
+        images_folder: Absolute, normalized folder path
+        signature: Folder signature or watch generation, only used as part of the cache key
+    
+    Returns:
+        (images, by_emotion): tuple of image info dicts, and the same
+        images grouped per emotion label
+    """
+    try:
+        images = []
+        images_folder = Path(images_folder)
+        
+        logger.info("Searching local folder: %s", images_folder)
+        
+        # Walk all subdirectories with os.scandir (depth-first, same order as os.walk);
+        # each directory carries the emotion of its top-level folder (e.g. happy/, sad/),
+        # matched once per top-level folder rather than once per file
+        stack = [(str(images_folder), None, None)]
+        while stack:
+            directory, top_folder, folder_emotion = stack.pop()
+            subdirs = []
+            
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        if not entry.is_symlink():
+                            if top_folder is None:
+                                subdirs.append((entry.path, entry.name, _emotion_in_name(entry.name)))
+                            else:
+                                subdirs.append((entry.path, top_folder, folder_emotion))
+                        continue
                     
-                    # Normalize path (use forward slashes)
-                    image_path_str = str(image_path).replace('\\', '/')
+                    file = entry.name
+                    filename_lower = file.lower()
                     
-                    # Extract relative path from images folder
-                    try:
-                        relative_path = str(image_path.relative_to(images_folder))
-                        path_parts = relative_path.replace('\\', '/').split('/')
-                    except:
-                        path_parts = []
+                    # Check if it's an image file
+                    if not filename_lower.endswith(LOCAL_IMAGE_EXTENSIONS):
+                        continue
+                    
+                    # Normalize path (use forward slashes)
+                    image_path_str = entry.path.replace('\\', '/')
                     
                     # Detect emotion from folder name or filename
-                    detected_emotion = None
+                    detected_emotion = folder_emotion
                     detected_confidence = 0.8  # Default confidence for folder-based detection
                     
-                    # First, try to detect from folder structure (e.g., happy/, sad/, angry/)
-                    if len(path_parts) > 1:
-                        folder_name = path_parts[0].lower()
-                        # Check if folder name matches an emotion
-                        for valid_emotion in valid_emotions:
-                            if valid_emotion in folder_name:
-                                detected_emotion = valid_emotion
-                                break
-                    
                     # If not found in folder, check filename for emotion keywords
                     if not detected_emotion:
-                        filename_lower = file.lower()
-                        for valid_emotion in valid_emotions:
-                            if valid_emotion in filename_lower:
-                                detected_emotion = valid_emotion
-                                detected_confidence = 0.6  # Lower confidence for filename-based
-                                break
+                        detected_emotion = _emotion_in_name(filename_lower)
+                        if detected_emotion:
+                            detected_confidence = 0.6  # Lower confidence for filename-based
                     
                     # Default to neutral if no emotion detected
                     if not detected_emotion:
                         detected_emotion = "neutral"
                         detected_confidence = 0.5
                     
-                    # Apply filters
-                    if emotion and detected_emotion.lower() != emotion.lower():
+                    # Only the stat can fail here (file removed mid-scan)
+                    try:
+                        stat_info = entry.stat()
+                    except OSError as e:
+                        logger.warning("Could not read image info: %s", e)
                         continue
                     
-                    try:
-                        stat_info = os.stat(image_path_str)
-                        image_info = {
-                            "filename": file,
-                            "path": image_path_str,
-                            "emotion": detected_emotion,
-                            "confidence": detected_confidence,
-                            "user_name": user_name or "default",
-                            "size": stat_info.st_size,
-                            "created": datetime.fromtimestamp(stat_info.st_ctime).isoformat(),
-                            "source": "local_folder"
-                        }
-                        images.append(image_info)
-                        logger.debug(f"Found image: {image_path_str} ({detected_emotion})")
-                    except Exception as e:
-                        logger.warning(f"Could not read image info: {e}")
-        
-        logger.info(f"✅ Found {len(images)} images in local folder")
-        return images
+                    images.append({
+                        "filename": file,
+                        "path": image_path_str,
+                        "emotion": detected_emotion,
+                        "confidence": detected_confidence,
+                        "user_name": "default",
+                        "size": stat_info.st_size,
+                        "created_ts": stat_info.st_ctime,
+                        "source": "local_folder"
+                    })
+                    logger.debug("Found image: %s (%s)", image_path_str, detected_emotion)
+            
+            # Reversed so the first subdirectory is popped (and fully walked) first
+            stack.extend(reversed(subdirs))
+        
+        by_emotion = {}
+        for image_info in images:
+            by_emotion.setdefault(image_info["emotion"], []).append(image_info)
+        
+        logger.info("✅ Found %s images in local folder", len(images))
+        return tuple(images), {label: tuple(group) for label, group in by_emotion.items()}
     
     except Exception as e:
-        logger.error(f"Error reading local images: {e}", exc_info=True)
-        return []
+        logger.error("Error reading local images: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+        return (), {}
+
+
+def _list_backend_images(user_name: str = None, emotion: str = None) -> list:
+    """
+    List face images in backend storage, newest first
+    
+    Served from the image catalog (see app.services.image_catalog), so a
+    filter is an indexed lookup rather than a walk of FACES_DIR.
+    
+    Args:
+        user_name: Optional user filter
+        emotion: Optional emotion filter (case-insensitive)
+    
+    Returns:
+        List of image metadata
+    """
+    return list_images(user_name=user_name, emotion=emotion)
 
 
 def get_all_stored_images(user_name: str = None) -> list:
@@ -244,57 +475,14 @@ def get_all_stored_images(user_name: str = None) -> list:
         List of image metadata
     """
     try:
-        images = []
-        
-        # ===== NEW: Get images from local folder =====
-        local_images = get_images_from_local_folder(user_name=user_name)
-        images.extend(local_images)
+        images = get_images_from_local_folder(user_name=user_name)
+        images.extend(_list_backend_images(user_name))
         
-        # Get images from backend storage
-        if user_name:
-            user_dir = os.path.join(FACES_DIR, user_name)
-            if os.path.exists(user_dir):
-                for emotion_folder in os.listdir(user_dir):
-                    emotion_path = os.path.join(user_dir, emotion_folder)
-                    if os.path.isdir(emotion_path):
-                        for image_file in os.listdir(emotion_path):
-                            if image_file.endswith(('.jpg', '.png')):
-                                image_path = os.path.join(emotion_path, image_file)
-                                images.append({
-                                    "filename": image_file,
-                                    "path": image_path,
-                                    "emotion": emotion_folder,
-                                    "user_name": user_name,
-                                    "size": os.path.getsize(image_path),
-                                    "created": datetime.fromtimestamp(os.path.getctime(image_path)).isoformat(),
-                                    "source": "backend_storage"
-                                })
-        else:
-            if os.path.exists(FACES_DIR):
-                for user_folder in os.listdir(FACES_DIR):
-                    user_path = os.path.join(FACES_DIR, user_folder)
-                    if os.path.isdir(user_path):
-                        for emotion_folder in os.listdir(user_path):
-                            emotion_path = os.path.join(user_path, emotion_folder)
-                            if os.path.isdir(emotion_path):
-                                for image_file in os.listdir(emotion_path):
-                                    if image_file.endswith(('.jpg', '.png')):
-                                        image_path = os.path.join(emotion_path, image_file)
-                                        images.append({
-                                            "filename": image_file,
-                                            "path": image_path,
-                                            "emotion": emotion_folder,
-                                            "user_name": user_folder,
-                                            "size": os.path.getsize(image_path),
-                                            "created": datetime.fromtimestamp(os.path.getctime(image_path)).isoformat(),
-                                            "source": "backend_storage"
-                                        })
-        
-        logger.info(f"Found {len(images)} total images (local + backend)")
+        logger.info("Found %s total images (local + backend)", len(images))
         return images
     
     except Exception as e:
-        logger.error(f"Error retrieving images: {e}")
+        logger.error("Error retrieving images: %s", e)
         return []
 
 
@@ -302,6 +490,10 @@ def get_images_by_emotion(emotion: str, user_name: str = None) -> list:
     """
     Get all images matching a specific emotion - from local folder AND backend
     
+    Both sources are looked up by emotion directly (the local listing's
+    emotion index and the backend image catalog), so the cost follows the
+    number of matches rather than the corpus size.
+    
     Args:
         emotion: Emotion to filter by
         user_name: Optional user filter
@@ -310,65 +502,105 @@ def get_images_by_emotion(emotion: str, user_name: str = None) -> list:
         List of images with matching emotion
     """
     try:
-        all_images = get_all_stored_images(user_name)
-        matching_images = [img for img in all_images if img['emotion'].lower() == emotion.lower()]
+        matching_images = get_images_from_local_folder(emotion=emotion, user_name=user_name)
+        matching_images.extend(_list_backend_images(user_name, emotion))
         
-        logger.info(f"Found {len(matching_images)} images with emotion: {emotion}")
+        logger.info("Found %s images with emotion: %s", len(matching_images), emotion)
         return matching_images
     
     except Exception as e:
-        logger.error(f"Error filtering by emotion: {e}")
+        logger.error("Error filtering by emotion: %s", e)
         return []
 
 
-def get_similar_images(current_emotion: str, user_name: str = None, limit: int = 10) -> list:
+def _nearest_stored_images(query_encoding, current_emotion: str, user_name: str, limit: int) -> list:
+    """
+    Stored face images nearest to query_encoding, same-emotion ones first
+    
+    Args:
+        query_encoding: Face encoding of the current image
+        current_emotion: Current detected emotion (post-filter, not a hard filter)
+        user_name: Optional user filter
+        limit: Maximum results to return
+    
+    Returns:
+        List of image metadata, in the get_all_stored_images format plus "similarity"
+    """
+    # Over-fetch so the user filter and emotion ordering still leave enough results
+    neighbours = query_stored_faces(query_encoding, k=limit * 4)
+    if user_name:
+        neighbours = [(entry, distance) for entry, distance in neighbours if entry['user_name'] == user_name]
+    
+    # Stable sort keeps distance order within each emotion group
+    neighbours.sort(key=lambda pair: pair[0]['emotion'].lower() != current_emotion.lower())
+    
+    results = []
+    for entry, distance in neighbours:
+        try:
+            stat_info = os.stat(entry['path'])
+        except FileNotFoundError:
+            continue
+        results.append({
+            "filename": os.path.basename(entry['path']),
+            "path": entry['path'],
+            "emotion": entry['emotion'],
+            "user_name": entry['user_name'],
+            "size": stat_info.st_size,
+            "created_ts": stat_info.st_ctime,
+            "source": "backend_storage",
+            "similarity": 1.0 - distance
+        })
+        if len(results) >= limit:
+            break
+    
+    return results
+
+
+def get_similar_images(current_emotion: str, user_name: str = None, limit: int = 10, query_encoding=None) -> list:
     """
     Get similar images based on emotion matching - from local folder AND backend
     
+    With a query_encoding, the nearest stored faces come from the face index
+    (see app.services.face_index) and only the shortfall, if any, is filled
+    by the emotion scan.
+    
     Args:
         current_emotion: Current detected emotion
         user_name: Optional user filter
         limit: Maximum results to return
+        query_encoding: Optional face encoding of the current image
     
     Returns:
         List of similar images
     """
     try:
+        if query_encoding is not None:
+            nearest = _nearest_stored_images(query_encoding, current_emotion, user_name, limit)
+            if len(nearest) >= limit:
+                logger.info("Found %s similar images from face index", len(nearest))
+                return nearest
+            
+            seen_paths = {img['path'] for img in nearest}
+            others = get_similar_images(current_emotion, user_name, limit)
+            return (nearest + [img for img in others if img['path'] not in seen_paths])[:limit]
+        
         # Get images with same emotion (highest priority)
         same_emotion = get_images_by_emotion(current_emotion, user_name)
         
-        # Limit results
-        results = same_emotion[:limit]
-        
-        if len(results) >= limit:
-            return results
-        
-        # If not enough, add related emotions
-        emotion_similarity = {
-            "happy": ["surprise"],
-            "sad": ["neutral", "fear"],
-            "angry": ["fear", "disgust"],
-            "fear": ["sad", "angry"],
-            "surprise": ["happy"],
-            "disgust": ["angry", "sad"],
-            "neutral": ["sad"]
-        }
-        
-        related_emotions = emotion_similarity.get(current_emotion, [])
-        results = same_emotion.copy()
+        if len(same_emotion) >= limit:
+            return same_emotion[:limit]
         
-        # Add images from related emotions
-        for related_emotion in related_emotions:
-            if len(results) >= limit:
-                break
-            related_images = get_images_by_emotion(related_emotion, user_name)
-            results.extend(related_images)
+        # If not enough, add related emotions (each one fetched only while results are still short)
+        related_emotions = _EMOTION_SIMILARITY.get(current_emotion.lower(), ())
+        results = list(islice(chain(same_emotion, chain.from_iterable(
+            get_images_by_emotion(related_emotion, user_name) for related_emotion in related_emotions
+        )), limit))
         
-        logger.info(f"Found {len(results)} similar images for emotion: {current_emotion}")
-        return results[:limit]
+        logger.info("Found %s similar images for emotion: %s", len(results), current_emotion)
+        return results
     
     except Exception as e:
-        logger.error(f"Error finding similar images: {e}")
+        logger.error("Error finding similar images: %s", e)
         return []
 
 
@@ -376,6 +608,9 @@ def read_image_as_base64(image_path: str) -> str:
     """
     Read image file and convert to base64
     
+    Encoded results are cached per (path, mtime, size), so repeat hits on an
+    unchanged file skip both the disk read and the encode.
+    
     Args:
         image_path: Path to image file (handles both absolute and relative paths)
     
@@ -383,41 +618,203 @@ def read_image_as_base64(image_path: str) -> str:
         Base64 encoded image string (with data URI prefix)
     """
     try:
-        import base64
-        
         # Normalize path (handle Windows paths)
         normalized_path = str(image_path).replace('\\', '/')
         
         # Check if path exists
-        if not os.path.exists(normalized_path):
-            logger.error(f"Image not found: {normalized_path}")
+        try:
+            stat_info = os.stat(normalized_path)
+        except FileNotFoundError:
+            logger.error("Image not found: %s", normalized_path)
             return None
         
-        # Read image file
-        with open(normalized_path, 'rb') as f:
-            image_data = f.read()
-            base64_image = base64.b64encode(image_data).decode('utf-8')
-        
-        # Determine MIME type from extension
-        ext = Path(normalized_path).suffix.lower()
-        mime_types = {
-            '.jpg': 'image/jpeg',
-            '.jpeg': 'image/jpeg',
-            '.png': 'image/png',
-            '.bmp': 'image/bmp',
-            '.gif': 'image/gif',
-            '.webp': 'image/webp'
-        }
-        mime_type = mime_types.get(ext, 'image/jpeg')
+        return _encode_image_base64(normalized_path, stat_info.st_mtime_ns, stat_info.st_size)
+    
+    except Exception as e:
+        logger.error("Error converting image to base64: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+        return None
+
+
+@lru_cache(maxsize=128)
+def _encode_image_base64(image_path: str, mtime_ns: int, size: int) -> str:
+    """
+    Build the data URI for an image; mtime_ns and size only key the cache
+    
+    Bounded to 128 entries since each holds a full-resolution image.
+    """
+    # Encode straight from the page cache via mmap (no read copy); mmap rejects empty files
+    with open(image_path, 'rb', buffering=0) as f:
+        if size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                base64_image = binascii.b2a_base64(mm, newline=False).decode('ascii')
+        else:
+            base64_image = ''
+    
+    # Determine MIME type from extension
+    mime_type = get_image_mime_type(image_path)
+    
+    logger.debug("Image converted to base64: %s", image_path)
+    
+    # Return data URI
+    return f"data:{mime_type};base64,{base64_image}"
+
+
+def get_image_mime_type(image_path: str) -> str:
+    """Return the MIME type for an image path based on its extension"""
+    return MIME_TYPES.get(Path(image_path).suffix.lower(), 'image/jpeg')
+
+
+def get_image_etag(image_path: str) -> str:
+    """Return a strong ETag for an image file, derived from its mtime and size"""
+    stat_info = os.stat(image_path)
+    return f'"{stat_info.st_mtime_ns:x}-{stat_info.st_size:x}"'
+
+
+def get_image_source_folder(source: str = "local_folder") -> Path:
+    """
+    Get the root folder images of a given source are served from
+    
+    Args:
+        source: "local_folder" or "backend_storage" (the image's "source" field)
+    
+    Returns:
+        Absolute folder path, or None for an unknown source
+    """
+    if source == "local_folder":
+        return get_local_images_folder_path().resolve()
+    if source == "backend_storage":
+        return Path(FACES_DIR).resolve()
+    return None
+
+
+def get_image_id(image_path: str, source: str = "local_folder") -> str:
+    """
+    Get the public id of an image (its path relative to its source folder)
+    
+    Args:
+        image_path: Path to an image inside the source folder
+        source: "local_folder" or "backend_storage"
+    
+    Returns:
+        Relative POSIX path, or None if the image is outside the folder
+    """
+    images_folder = get_image_source_folder(source)
+    if images_folder is None:
+        return None
+    
+    try:
+        return Path(image_path).resolve().relative_to(images_folder).as_posix()
+    except ValueError:
+        return None
+
+
+def resolve_image_id(image_id: str, source: str = "local_folder") -> str:
+    """
+    Map an id from get_image_id back to a file path
+    
+    Args:
+        image_id: Path relative to the source folder
+        source: "local_folder" or "backend_storage"
+    
+    Returns:
+        Absolute path to the image, or None if it is missing or escapes the folder
+    """
+    images_folder = get_image_source_folder(source)
+    if images_folder is None:
+        return None
+    
+    image_path = (images_folder / image_id).resolve()
+    
+    try:
+        image_path.relative_to(images_folder)
+    except ValueError:
+        logger.warning("Rejected image id outside images folder: %s", image_id)
+        return None
+    
+    if not image_path.is_file():
+        return None
+    
+    return str(image_path)
+
+
+def get_thumbnail_path(image_path: str, source: str = "local_folder", image_data: bytes = None, image_array: np.ndarray = None) -> str:
+    """
+    Get the thumbnail of an image, creating or refreshing it when needed
+    
+    Thumbnails live under THUMBNAILS_DIR/<source>/<image id>.jpg and are
+    rebuilt when the original is newer.
+    
+    Args:
+        image_path: Path to the full-resolution image
+        source: "local_folder" or "backend_storage"
+        image_data: Image bytes already in memory (skips re-reading the file)
+        image_array: Already decoded RGB pixels (skips decoding entirely)
+    
+    Returns:
+        Path to the JPEG thumbnail, or None if it could not be made
+    """
+    try:
+        image_id = get_image_id(image_path, source)
+        if image_id is None:
+            return None
+        
+        thumbnail_path = os.path.join(THUMBNAILS_DIR, source, f"{image_id}.jpg")
+        
+        try:
+            if os.stat(thumbnail_path).st_mtime_ns >= os.stat(image_path).st_mtime_ns:
+                return thumbnail_path
+        except FileNotFoundError:
+            pass
         
-        # Return data URI
-        data_uri = f"data:{mime_type};base64,{base64_image}"
+        if image_array is not None:
+            image = cv2.cvtColor(image_array, cv2.COLOR_RGB2BGR)
+        else:
+            if image_data is None:
+                with open(image_path, 'rb') as f:
+                    image_data = f.read()
+            image = decode_bgr(image_data)
+        
+        if image is None:
+            logger.warning("Could not decode image for thumbnail: %s", image_path)
+            return None
+        
+        height, width = image.shape[:2]
+        if width > THUMBNAIL_WIDTH:
+            thumbnail_height = max(1, round(THUMBNAIL_WIDTH * height / width))
+            image = cv2.resize(image, (THUMBNAIL_WIDTH, thumbnail_height), interpolation=cv2.INTER_AREA)
+        
+        success, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_JPEG_QUALITY])
+        if not success:
+            return None
+        
+        # Write then rename, so concurrent requests never serve a partial file
+        _ensure_dir(os.path.dirname(thumbnail_path))
+        temp_path = f"{thumbnail_path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(encoded.tobytes())
+        os.replace(temp_path, thumbnail_path)
         
-        logger.debug(f"Image converted to base64: {normalized_path}")
-        return data_uri
+        return thumbnail_path
     
     except Exception as e:
-        logger.error(f"Error converting image to base64: {e}", exc_info=True)
+        logger.warning("Could not create thumbnail for %s: %s", image_path, e)
+        return None
+
+
+def read_thumbnail_as_base64(image_path: str, source: str = "local_folder") -> str:
+    """Read an image's thumbnail as base64, falling back to the full image"""
+    thumbnail_path = get_thumbnail_path(image_path, source)
+    return read_image_as_base64(thumbnail_path or image_path)
+
+
+def read_thumbnail_bytes(image_path: str, source: str = "local_folder") -> bytes:
+    """Read an image's thumbnail as raw bytes for binary responses, falling back to the full image"""
+    path = get_thumbnail_path(image_path, source) or image_path
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError as e:
+        logger.error("Error reading image: %s", e)
         return None
 
 
@@ -432,11 +829,12 @@ def get_image_metadata(image_path: str) -> dict:
         Dictionary with file metadata
     """
     try:
-        if not os.path.exists(image_path):
+        # One stat answers both "does it exist" and the metadata
+        try:
+            stat_info = os.stat(image_path)
+        except FileNotFoundError:
             return None
         
-        stat_info = os.stat(image_path)
-        
         return {
             "filename": os.path.basename(image_path),
             "path": image_path,
@@ -448,7 +846,7 @@ def get_image_metadata(image_path: str) -> dict:
         }
     
     except Exception as e:
-        logger.error(f"Error getting image metadata: {e}")
+        logger.error("Error getting image metadata: %s", e)
         return None
 
 
@@ -460,49 +858,28 @@ def get_storage_stats() -> dict:
         Dictionary with storage stats
     """
     try:
-        total_size = 0
-        total_images = 0
-        users = {}
-        emotions = {}
-        
-        # Stats from backend storage
-        for root, dirs, files in os.walk(FACES_DIR):
-            for file in files:
-                if file.endswith(('.jpg', '.png')):
-                    file_path = os.path.join(root, file)
-                    file_size = os.path.getsize(file_path)
-                    total_size += file_size
-                    total_images += 1
-                    
-                    parts = file_path.split(os.sep)
-                    if len(parts) >= 2:
-                        user = parts[-3] if len(parts) > 2 else "unknown"
-                        emotion = parts[-2] if len(parts) > 1 else "unknown"
-                        
-                        if user not in users:
-                            users[user] = 0
-                        users[user] += 1
-                        
-                        if emotion not in emotions:
-                            emotions[emotion] = 0
-                        emotions[emotion] += 1
-        
-        # Stats from local folder
-        local_images = get_all_stored_images()
+        # Stats from backend storage (aggregated by the image catalog)
+        backend_stats = catalog_stats()
+        total_size = backend_stats['total_size_bytes']
+        total_images = backend_stats['total_images']
+        users = backend_stats['users']
+        emotions = backend_stats['emotions']
+        
+        # Stats from local folder (memoized listing; backend rows are already counted above)
+        local_images = get_images_from_local_folder()
         for img in local_images:
-            if img['source'] == 'local_folder':
-                total_images += 1
-                total_size += img.get('size', 0)
-                user = img['user_name']
-                emotion = img['emotion']
-                
-                if user not in users:
-                    users[user] = 0
-                users[user] += 1
-                
-                if emotion not in emotions:
-                    emotions[emotion] = 0
-                emotions[emotion] += 1
+            total_images += 1
+            total_size += img.get('size', 0)
+            user = img['user_name']
+            emotion = img['emotion']
+            
+            if user not in users:
+                users[user] = 0
+            users[user] += 1
+            
+            if emotion not in emotions:
+                emotions[emotion] = 0
+            emotions[emotion] += 1
         
         return {
             "total_images": total_images,
@@ -515,29 +892,59 @@ def get_storage_stats() -> dict:
         }
     
     except Exception as e:
-        logger.error(f"Error getting storage stats: {e}")
+        logger.error("Error getting storage stats: %s", e)
         return {}
 
 
+def _remove_empty_subdirs(directory: str, map_fn=map) -> tuple:
+    """
+    Bottom-up removal of empty subdirectories, one os.scandir per directory
+    
+    Args:
+        directory: Directory whose subdirectories are cleaned
+        map_fn: Applied over the direct subdirectories (an executor's map walks them in parallel)
+    
+    Returns:
+        (directory is now empty, number of subdirectories removed)
+    """
+    removed_dirs = 0
+    
+    with os.scandir(directory) as it:
+        entries = list(it)
+    
+    subdirs = [entry.path for entry in entries if entry.is_dir(follow_symlinks=False)]
+    has_content = len(subdirs) < len(entries)
+    
+    for subdir, (child_empty, child_removed) in zip(subdirs, map_fn(_remove_empty_subdirs, subdirs)):
+        removed_dirs += child_removed
+        if not child_empty:
+            has_content = True
+            continue
+        
+        try:
+            os.rmdir(subdir)
+            _created_dirs.discard(subdir)
+            removed_dirs += 1
+            logger.info("Removed empty directory: %s", subdir)
+        except Exception as e:
+            has_content = True
+            logger.warning("Could not remove directory %s: %s", subdir, e)
+    
+    return not has_content, removed_dirs
+
+
 def cleanup_empty_directories():
     """Clean up empty directories in storage"""
     try:
         removed_dirs = 0
+        if os.path.isdir(FACES_DIR):
+            # User directories are independent trees; their walks (syscall-bound) run in parallel
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                _, removed_dirs = _remove_empty_subdirs(FACES_DIR, executor.map)
         
-        for root, dirs, files in os.walk(FACES_DIR, topdown=False):
-            for dir_name in dirs:
-                dir_path = os.path.join(root, dir_name)
-                try:
-                    if not os.listdir(dir_path):
-                        os.rmdir(dir_path)
-                        removed_dirs += 1
-                        logger.info(f"Removed empty directory: {dir_path}")
-                except Exception as e:
-                    logger.warning(f"Could not remove directory {dir_path}: {e}")
-        
-        logger.info(f"Cleaned up {removed_dirs} empty directories")
+        logger.info("Cleaned up %s empty directories", removed_dirs)
         return removed_dirs
     
     except Exception as e:
-        logger.error(f"Error cleaning up directories: {e}")
+        logger.error("Error cleaning up directories: %s", e)
         return 0
@@ -5,13 +5,33 @@ Works with ANY folder structure
 """
 
 import os
-import base64
+import re
+import binascii
+import mmap
 from datetime import datetime
+from functools import lru_cache
 import logging
 import uuid
 
 logger = logging.getLogger(__name__)
 
+# Emotion labels, in the order they win when a name contains several
+EMOTIONS = ("happy", "sad", "angry", "fear", "surprise", "disgust", "neutral")
+_EMOTION_SET = frozenset(EMOTIONS)
+_EMOTION_PRIORITY = {emotion: rank for rank, emotion in enumerate(EMOTIONS)}
+_EMOTION_RE = re.compile("|".join(EMOTIONS))
+
+# Related emotions that fill up get_similar_images, in order (keys lowercase)
+_EMOTION_SIMILARITY = {
+    "happy": ("surprise", "neutral"),
+    "sad": ("neutral", "fear"),
+    "angry": ("fear", "disgust"),
+    "fear": ("sad", "angry"),
+    "surprise": ("happy", "neutral"),
+    "disgust": ("angry", "sad"),
+    "neutral": ("happy", "sad")
+}
+
 # Storage configuration
 BASE_UPLOAD_DIR = "backend/uploads"
 SESSIONS_DIR = os.path.join(BASE_UPLOAD_DIR, "sessions")
@@ -22,12 +42,11 @@ ARCHIVE_DIR = os.path.join(BASE_UPLOAD_DIR, "archive")
 # Change this to your actual folder path (use forward slashes!)
 LOCAL_IMAGES_FOLDER = "C:/Users/Lenovo/OneDrive/Documents/GitHub/Rivion/frontend/Images"
 
-# Create directories
-os.makedirs(SESSIONS_DIR, exist_ok=True)
-os.makedirs(FACES_DIR, exist_ok=True)
-os.makedirs(ARCHIVE_DIR, exist_ok=True)
+# Image file extensions picked up from the local folder
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp')
 
-logger.info(f"✅ Storage initialized: {SESSIONS_DIR}")
+# Directories are created by the save functions on first write, not at import
+logger.info(f"✅ Storage directory: {BASE_UPLOAD_DIR}")
 logger.info(f"✅ Local images folder: {LOCAL_IMAGES_FOLDER}")
 
 
@@ -52,12 +71,10 @@ def detect_emotion_from_filename(filename: str) -> str:
     Detect emotion from filename or use 'default'
     Checks if filename contains emotion keywords
     """
-    emotions = ["happy", "sad", "angry", "fear", "surprise", "disgust", "neutral"]
-    filename_lower = filename.lower()
-    
-    for emotion in emotions:
-        if emotion in filename_lower:
-            return emotion
+    # One regex pass; "sad" is the only label that can hide another ("disgust"), and it wins anyway
+    matched = _EMOTION_RE.findall(filename.lower())
+    if matched:
+        return min(matched, key=_EMOTION_PRIORITY.get)
     
     return "neutral"  # Default emotion
 
@@ -69,15 +86,36 @@ def detect_emotion_from_folder(filepath: str) -> str:
     """
     path_parts = filepath.split(os.sep)
     
-    emotions = ["happy", "sad", "angry", "fear", "surprise", "disgust", "neutral"]
-    
     for part in path_parts:
-        if part.lower() in emotions:
-            return part.lower()
+        part = part.lower()
+        if part in _EMOTION_SET:
+            return part
     
     return None
 
 
+def _iter_images(root: str):
+    """
+    Yield a DirEntry for every image file under root (same order as os.walk)
+    
+    Uses os.scandir throughout so entry types and stat results come from the
+    directory listing instead of extra path lookups.
+    """
+    with os.scandir(root) as it:
+        entries = list(it)
+    
+    subdirs = []
+    for entry in entries:
+        if entry.is_dir():
+            if not entry.is_symlink():
+                subdirs.append(entry.path)
+        elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+            yield entry
+    
+    for subdir in subdirs:
+        yield from _iter_images(subdir)
+
+
 def get_images_from_local_folder(emotion: str = None, user_name: str = None) -> list:
     """
     Load ALL images from local folder
@@ -94,43 +132,41 @@ def get_images_from_local_folder(emotion: str = None, user_name: str = None) ->
         logger.info(f"🔍 Scanning folder: {LOCAL_IMAGES_FOLDER}")
         
         # Walk through all subdirectories
-        for root, dirs, files in os.walk(LOCAL_IMAGES_FOLDER):
-            for file in files:
-                # Check if it's an image
-                if file.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp')):
-                    image_path = os.path.join(root, file)
-                    
-                    # Try to detect emotion from folder structure first
-                    detected_emotion = detect_emotion_from_folder(image_path)
-                    
-                    # If not found in folder, try filename
-                    if not detected_emotion:
-                        detected_emotion = detect_emotion_from_filename(file)
-                    
-                    # Apply emotion filter if specified
-                    if emotion and detected_emotion.lower() != emotion.lower():
-                        continue
-                    
-                    # Apply user filter if specified
-                    if user_name:
-                        if user_name.lower() not in image_path.lower():
-                            continue
-                    
-                    try:
-                        stat_info = os.stat(image_path)
-                        image_info = {
-                            "filename": file,
-                            "path": image_path,
-                            "emotion": detected_emotion,
-                            "user_name": user_name or "default",
-                            "size": stat_info.st_size,
-                            "created": datetime.fromtimestamp(stat_info.st_ctime).isoformat(),
-                            "source": "local_folder"
-                        }
-                        images.append(image_info)
-                        logger.info(f"   ✅ {detected_emotion}: {file}")
-                    except Exception as e:
-                        logger.warning(f"   ⚠️  Could not read: {file} - {e}")
+        for entry in _iter_images(LOCAL_IMAGES_FOLDER):
+            file = entry.name
+            image_path = entry.path
+            
+            # Try to detect emotion from folder structure first
+            detected_emotion = detect_emotion_from_folder(image_path)
+            
+            # If not found in folder, try filename
+            if not detected_emotion:
+                detected_emotion = detect_emotion_from_filename(file)
+            
+            # Apply emotion filter if specified
+            if emotion and detected_emotion.lower() != emotion.lower():
+                continue
+            
+            # Apply user filter if specified
+            if user_name:
+                if user_name.lower() not in image_path.lower():
+                    continue
+            
+            try:
+                stat_info = entry.stat()
+                image_info = {
+                    "filename": file,
+                    "path": image_path,
+                    "emotion": detected_emotion,
+                    "user_name": user_name or "default",
+                    "size": stat_info.st_size,
+                    "created_ts": stat_info.st_ctime,
+                    "source": "local_folder"
+                }
+                images.append(image_info)
+                logger.info(f"   ✅ {detected_emotion}: {file}")
+            except Exception as e:
+                logger.warning(f"   ⚠️  Could not read: {file} - {e}")
         
         logger.info(f"✅ Found {len(images)} images total")
         return images
@@ -168,38 +204,39 @@ def get_images_by_emotion(emotion: str, user_name: str = None) -> list:
         return []
 
 
+def get_images_bucketed(user_name: str = None) -> dict:
+    """Scan the local folder once and group the images by emotion"""
+    buckets = {}
+    for image_info in get_images_from_local_folder(user_name=user_name):
+        buckets.setdefault(image_info["emotion"], []).append(image_info)
+    return buckets
+
+
 def get_similar_images(current_emotion: str, user_name: str = None, limit: int = 10) -> list:
     """
     Get similar images based on emotion
     First returns exact matches, then similar emotions
+    (one folder scan, bucketed by emotion, serves all of them)
     """
     try:
+        buckets = get_images_bucketed(user_name)
+        
         # Get exact emotion matches
-        same_emotion = get_images_by_emotion(current_emotion, user_name)
+        same_emotion = buckets.get(current_emotion.lower(), [])
         logger.info(f"   Exact matches ({current_emotion}): {len(same_emotion)}")
         
         if len(same_emotion) >= limit:
             return same_emotion[:limit]
         
         # If not enough, add related emotions
-        emotion_similarity = {
-            "happy": ["surprise", "neutral"],
-            "sad": ["neutral", "fear"],
-            "angry": ["fear", "disgust"],
-            "fear": ["sad", "angry"],
-            "surprise": ["happy", "neutral"],
-            "disgust": ["angry", "sad"],
-            "neutral": ["happy", "sad"]
-        }
-        
-        related_emotions = emotion_similarity.get(current_emotion, [])
+        related_emotions = _EMOTION_SIMILARITY.get(current_emotion.lower(), ())
         results = same_emotion.copy()
         
         # Add from related emotions
         for related in related_emotions:
             if len(results) >= limit:
                 break
-            related_images = get_images_by_emotion(related, user_name)
+            related_images = buckets.get(related, [])
             results.extend(related_images)
             logger.info(f"   Added {len(related_images)} {related} images")
         
@@ -212,23 +249,31 @@ def get_similar_images(current_emotion: str, user_name: str = None, limit: int =
 
 
 def read_image_as_base64(image_path: str) -> str:
-    """Convert image to base64 for frontend display"""
+    """Convert image to base64 for frontend display (memoized until the file changes)"""
     try:
-        if not os.path.exists(image_path):
+        try:
+            stat_info = os.stat(image_path)
+        except FileNotFoundError:
             logger.error(f"❌ Image not found: {image_path}")
             return None
         
-        with open(image_path, 'rb') as f:
-            image_data = f.read()
-            base64_image = base64.b64encode(image_data).decode('utf-8')
-        
-        return base64_image
+        return _encode_base64(image_path, stat_info.st_mtime_ns, stat_info.st_size)
     
     except Exception as e:
         logger.error(f"❌ Error converting to base64: {e}")
         return None
 
 
+@lru_cache(maxsize=128)
+def _encode_base64(image_path: str, mtime_ns: int, size: int) -> str:
+    """Base64 of an image file; mtime_ns and size only key the cache"""
+    # Encode straight from the page cache via mmap (no read copy); mmap rejects empty files
+    if not size:
+        return ''
+    with open(image_path, 'rb', buffering=0) as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return binascii.b2a_base64(mm, newline=False).decode('ascii')
+
+
 def save_session_image(session_id: str, image_data: bytes) -> str:
     """Save captured image to backend"""
     try:
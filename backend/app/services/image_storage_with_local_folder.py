@@ -5,7 +5,11 @@ Handles file storage, database operations, and similarity search
 
 import os
 import shutil
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from itertools import chain, islice
 import logging
 from pathlib import Path
 import uuid
@@ -22,12 +26,29 @@ ARCHIVE_DIR = os.path.join(BASE_UPLOAD_DIR, "archive")
 # Point this to your images folder
 LOCAL_IMAGES_FOLDER = "C:/Users/Lenovo/OneDrive/Documents/GitHub/Rivion/images"  # Change this path!
 
-# Create directories if they don't exist
-os.makedirs(SESSIONS_DIR, exist_ok=True)
-os.makedirs(FACES_DIR, exist_ok=True)
-os.makedirs(ARCHIVE_DIR, exist_ok=True)
+# Image file extensions picked up from the local folder
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif')
 
-logger.info(f"Storage directories initialized: {SESSIONS_DIR}")
+# Related emotions that fill up get_similar_images, in order (keys lowercase)
+_EMOTION_SIMILARITY = {
+    "happy": ("surprise",),
+    "sad": ("neutral", "fear"),
+    "angry": ("fear", "disgust"),
+    "fear": ("sad", "angry"),
+    "surprise": ("happy",),
+    "disgust": ("angry", "sad"),
+    "neutral": ("sad",)
+}
+
+# get_all_stored_images listings are reused for this long, unless a root folder changes
+LISTING_TTL_SECONDS = 2.0
+_listing_cache = {}  # user_name -> (expires_at, roots signature, images)
+
+# Directory walks are syscall-bound (the GIL is released), so independent trees are listed in parallel
+_listing_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="image-listing")
+
+# Directories are created by the save functions on first write, not at import
+logger.info(f"Storage directory: {BASE_UPLOAD_DIR}")
 logger.info(f"Local images folder: {LOCAL_IMAGES_FOLDER}")
 
 
@@ -113,6 +134,7 @@ def save_face_image(session_id: str, user_name: str, emotion: str, image_data: b
         # Write face image
         with open(face_path, 'wb') as f:
             f.write(image_data)
+        _listing_cache.clear()
         
         logger.info(f"Face image saved: {face_path}")
         
@@ -123,6 +145,28 @@ def save_face_image(session_id: str, user_name: str, emotion: str, image_data: b
         raise
 
 
+def _iter_images(root: str):
+    """
+    Yield a DirEntry for every image file under root (same order as os.walk)
+    
+    Uses os.scandir throughout so entry types and stat results come from the
+    directory listing instead of extra path lookups.
+    """
+    with os.scandir(root) as it:
+        entries = list(it)
+    
+    subdirs = []
+    for entry in entries:
+        if entry.is_dir():
+            if not entry.is_symlink():
+                subdirs.append(entry.path)
+        elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+            yield entry
+    
+    for subdir in subdirs:
+        yield from _iter_images(subdir)
+
+
 def get_images_from_local_folder(emotion: str = None, user_name: str = None) -> list:
     """
     ===== NEW FUNCTION =====
@@ -144,43 +188,43 @@ def get_images_from_local_folder(emotion: str = None, user_name: str = None) ->
         
         logger.info(f"Searching local folder: {LOCAL_IMAGES_FOLDER}")
         
+        # Entry paths all start with the folder joined to "" (no per-file relpath/abspath)
+        prefix_length = len(os.path.join(LOCAL_IMAGES_FOLDER, ''))
+        
         # Walk through all subdirectories
-        for root, dirs, files in os.walk(LOCAL_IMAGES_FOLDER):
-            for file in files:
-                # Check if it's an image file
-                if file.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.gif')):
-                    image_path = os.path.join(root, file)
-                    
-                    # Extract info from path or filename
-                    # Expected structure: emotion/image.jpg or user/emotion/image.jpg
-                    relative_path = os.path.relpath(image_path, LOCAL_IMAGES_FOLDER)
-                    path_parts = relative_path.split(os.sep)
-                    
-                    # Determine emotion and user from folder structure
-                    detected_emotion = path_parts[0] if len(path_parts) > 0 else "unknown"
-                    detected_user = path_parts[1] if len(path_parts) > 2 else user_name or "default"
-                    
-                    # Apply filters
-                    if emotion and detected_emotion.lower() != emotion.lower():
-                        continue
-                    if user_name and detected_user.lower() != user_name.lower():
-                        continue
-                    
-                    try:
-                        stat_info = os.stat(image_path)
-                        image_info = {
-                            "filename": file,
-                            "path": image_path,
-                            "emotion": detected_emotion,
-                            "user_name": detected_user,
-                            "size": stat_info.st_size,
-                            "created": datetime.fromtimestamp(stat_info.st_ctime).isoformat(),
-                            "source": "local_folder"
-                        }
-                        images.append(image_info)
-                        logger.info(f"Found image: {image_path} ({detected_emotion})")
-                    except Exception as e:
-                        logger.warning(f"Could not read image info: {e}")
+        for entry in _iter_images(LOCAL_IMAGES_FOLDER):
+            file = entry.name
+            image_path = entry.path
+            
+            # Extract info from path or filename
+            # Expected structure: emotion/image.jpg or user/emotion/image.jpg
+            path_parts = image_path[prefix_length:].split(os.sep)
+            
+            # Determine emotion and user from folder structure
+            detected_emotion = path_parts[0] if len(path_parts) > 0 else "unknown"
+            detected_user = path_parts[1] if len(path_parts) > 2 else user_name or "default"
+            
+            # Apply filters (before the stat, so rejected files cost no syscall)
+            if emotion and detected_emotion.lower() != emotion.lower():
+                continue
+            if user_name and detected_user.lower() != user_name.lower():
+                continue
+            
+            try:
+                stat_info = entry.stat()
+                image_info = {
+                    "filename": file,
+                    "path": image_path,
+                    "emotion": detected_emotion,
+                    "user_name": detected_user,
+                    "size": stat_info.st_size,
+                    "created_ts": stat_info.st_ctime,
+                    "source": "local_folder"
+                }
+                images.append(image_info)
+                logger.info(f"Found image: {image_path} ({detected_emotion})")
+            except Exception as e:
+                logger.warning(f"Could not read image info: {e}")
         
         logger.info(f"✅ Found {len(images)} images in local folder")
         return images
@@ -190,62 +234,103 @@ def get_images_from_local_folder(emotion: str = None, user_name: str = None) ->
         return []
 
 
+def _scan_user_images(user_dir: str, user_name: str) -> list:
+    """
+    Backend images under user_dir/<emotion>/, one os.scandir per directory
+    
+    The extension is checked on the bare name before any path or stat work,
+    and size and ctime come from a single stat per image.
+    """
+    images = []
+    with os.scandir(user_dir) as emotions_it:
+        emotion_dirs = [entry for entry in emotions_it if entry.is_dir()]
+    
+    for emotion_entry in emotion_dirs:
+        with os.scandir(emotion_entry.path) as files_it:
+            for entry in files_it:
+                if not entry.name.endswith(('.jpg', '.png')):
+                    continue
+                stat_info = entry.stat()
+                images.append({
+                    "filename": entry.name,
+                    "path": entry.path,
+                    "emotion": emotion_entry.name,
+                    "user_name": user_name,
+                    "size": stat_info.st_size,
+                    "created_ts": stat_info.st_ctime,
+                    "source": "backend_storage"
+                })
+    return images
+
+
+def _roots_signature() -> tuple:
+    """Local folder path plus mtimes of the two listing roots (None when missing)"""
+    signature = [LOCAL_IMAGES_FOLDER]
+    for root in (LOCAL_IMAGES_FOLDER, FACES_DIR):
+        try:
+            signature.append(os.stat(root).st_mtime_ns)
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
 def get_all_stored_images(user_name: str = None) -> list:
     """
     Get all stored images - from backend AND local folder
     
+    A listing is reused for LISTING_TTL_SECONDS (so the several lookups of
+    one request share a single walk), and dropped early when a root folder's
+    mtime changes or a face image is saved.
+    
     Args:
         user_name: Optional filter by user name
     
     Returns:
         List of image metadata
     """
+    signature = _roots_signature()
+    cached = _listing_cache.get(user_name)
+    if cached and cached[0] > time.monotonic() and cached[1] == signature:
+        return list(cached[2])
+    
+    images = _list_all_stored_images(user_name)
+    _listing_cache[user_name] = (time.monotonic() + LISTING_TTL_SECONDS, signature, images)
+    return list(images)
+
+
+def _scan_backend_faces(user_name: str = None) -> list:
+    """Backend face images for one user, or for every user with one scan per user in parallel"""
+    if user_name:
+        user_dir = os.path.join(FACES_DIR, user_name)
+        if os.path.exists(user_dir):
+            return _scan_user_images(user_dir, user_name)
+        return []
+    
+    if not os.path.exists(FACES_DIR):
+        return []
+    
+    with os.scandir(FACES_DIR) as users_it:
+        user_dirs = [entry for entry in users_it if entry.is_dir()]
+    
+    images = []
+    for user_images in _listing_executor.map(lambda entry: _scan_user_images(entry.path, entry.name), user_dirs):
+        images.extend(user_images)
+    return images
+
+
+def _list_all_stored_images(user_name: str = None) -> list:
+    """Walk the local folder and backend storage (uncached get_all_stored_images)"""
     try:
         images = []
         
-        # ===== NEW: Get images from local folder =====
-        local_images = get_images_from_local_folder(user_name=user_name)
-        images.extend(local_images)
+        # ===== NEW: Get images from local folder ===== (in the background, alongside backend storage)
+        local_future = _listing_executor.submit(get_images_from_local_folder, user_name=user_name)
         
         # Get images from backend storage
-        if user_name:
-            user_dir = os.path.join(FACES_DIR, user_name)
-            if os.path.exists(user_dir):
-                for emotion_folder in os.listdir(user_dir):
-                    emotion_path = os.path.join(user_dir, emotion_folder)
-                    if os.path.isdir(emotion_path):
-                        for image_file in os.listdir(emotion_path):
-                            if image_file.endswith(('.jpg', '.png')):
-                                image_path = os.path.join(emotion_path, image_file)
-                                images.append({
-                                    "filename": image_file,
-                                    "path": image_path,
-                                    "emotion": emotion_folder,
-                                    "user_name": user_name,
-                                    "size": os.path.getsize(image_path),
-                                    "created": datetime.fromtimestamp(os.path.getctime(image_path)).isoformat(),
-                                    "source": "backend_storage"
-                                })
-        else:
-            if os.path.exists(FACES_DIR):
-                for user_folder in os.listdir(FACES_DIR):
-                    user_path = os.path.join(FACES_DIR, user_folder)
-                    if os.path.isdir(user_path):
-                        for emotion_folder in os.listdir(user_path):
-                            emotion_path = os.path.join(user_path, emotion_folder)
-                            if os.path.isdir(emotion_path):
-                                for image_file in os.listdir(emotion_path):
-                                    if image_file.endswith(('.jpg', '.png')):
-                                        image_path = os.path.join(emotion_path, image_file)
-                                        images.append({
-                                            "filename": image_file,
-                                            "path": image_path,
-                                            "emotion": emotion_folder,
-                                            "user_name": user_folder,
-                                            "size": os.path.getsize(image_path),
-                                            "created": datetime.fromtimestamp(os.path.getctime(image_path)).isoformat(),
-                                            "source": "backend_storage"
-                                        })
+        backend_images = _scan_backend_faces(user_name)
+        
+        images.extend(local_future.result())
+        images.extend(backend_images)
         
         logger.info(f"Found {len(images)} total images (local + backend)")
         return images
@@ -291,35 +376,23 @@ def get_similar_images(current_emotion: str, user_name: str = None, limit: int =
         List of similar images
     """
     try:
+        # One listing, bucketed by emotion in a single pass
+        by_emotion = defaultdict(list)
+        for img in get_all_stored_images(user_name):
+            by_emotion[img['emotion'].lower()].append(img)
+        
         # Get images with same emotion (highest priority)
-        same_emotion = get_images_by_emotion(current_emotion, user_name)
+        same_emotion = by_emotion[current_emotion.lower()]
         
         if len(same_emotion) >= limit:
             return same_emotion[:limit]
         
-        # If not enough, add related emotions
-        emotion_similarity = {
-            "happy": ["surprise"],
-            "sad": ["neutral", "fear"],
-            "angry": ["fear", "disgust"],
-            "fear": ["sad", "angry"],
-            "surprise": ["happy"],
-            "disgust": ["angry", "sad"],
-            "neutral": ["sad"]
-        }
-        
-        related_emotions = emotion_similarity.get(current_emotion, [])
-        results = same_emotion.copy()
-        
-        # Add images from related emotions
-        for related_emotion in related_emotions:
-            if len(results) >= limit:
-                break
-            related_images = get_images_by_emotion(related_emotion, user_name)
-            results.extend(related_images)
+        # If not enough, add related emotions (stopping as soon as there are enough)
+        related_emotions = _EMOTION_SIMILARITY.get(current_emotion.lower(), ())
+        results = list(islice(chain(same_emotion, *(by_emotion[related_emotion] for related_emotion in related_emotions)), limit))
         
         logger.info(f"Found {len(results)} similar images for emotion: {current_emotion}")
-        return results[:limit]
+        return results
     
     except Exception as e:
         logger.error(f"Error finding similar images: {e}")
@@ -337,15 +410,20 @@ def read_image_as_base64(image_path: str) -> str:
         Base64 encoded image string
     """
     try:
-        import base64
+        import binascii
+        import mmap
         
         if not os.path.exists(image_path):
             logger.error(f"Image not found: {image_path}")
             return None
         
-        with open(image_path, 'rb') as f:
-            image_data = f.read()
-            base64_image = base64.b64encode(image_data).decode('utf-8')
+        # Encode straight from the page cache via mmap (no read copy); mmap rejects empty files
+        with open(image_path, 'rb', buffering=0) as f:
+            if os.fstat(f.fileno()).st_size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    base64_image = binascii.b2a_base64(mm, newline=False).decode('ascii')
+            else:
+                base64_image = ''
         
         logger.info(f"Image converted to base64: {image_path}")
         return base64_image
@@ -366,11 +444,12 @@ def get_image_metadata(image_path: str) -> dict:
         Dictionary with file metadata
     """
     try:
-        if not os.path.exists(image_path):
+        # One stat answers both "does it exist" and the metadata
+        try:
+            stat_info = os.stat(image_path)
+        except FileNotFoundError:
             return None
         
-        stat_info = os.stat(image_path)
-        
         return {
             "filename": os.path.basename(image_path),
             "path": image_path,
@@ -399,44 +478,20 @@ def get_storage_stats() -> dict:
         users = {}
         emotions = {}
         
-        # Stats from backend storage
-        for root, dirs, files in os.walk(FACES_DIR):
-            for file in files:
-                if file.endswith(('.jpg', '.png')):
-                    file_path = os.path.join(root, file)
-                    file_size = os.path.getsize(file_path)
-                    total_size += file_size
-                    total_images += 1
-                    
-                    parts = file_path.split(os.sep)
-                    if len(parts) >= 2:
-                        user = parts[-3] if len(parts) > 2 else "unknown"
-                        emotion = parts[-2] if len(parts) > 1 else "unknown"
-                        
-                        if user not in users:
-                            users[user] = 0
-                        users[user] += 1
-                        
-                        if emotion not in emotions:
-                            emotions[emotion] = 0
-                        emotions[emotion] += 1
-        
-        # Stats from local folder
-        local_images = get_all_stored_images()
-        for img in local_images:
-            if img['source'] == 'local_folder':
-                total_images += 1
-                total_size += img.get('size', 0)
-                user = img['user_name']
-                emotion = img['emotion']
-                
-                if user not in users:
-                    users[user] = 0
-                users[user] += 1
-                
-                if emotion not in emotions:
-                    emotions[emotion] = 0
-                emotions[emotion] += 1
+        # One pass over the (cached) listing, which covers backend storage and the local folder
+        for img in get_all_stored_images():
+            total_images += 1
+            total_size += img.get('size', 0)
+            user = img['user_name']
+            emotion = img['emotion']
+            
+            if user not in users:
+                users[user] = 0
+            users[user] += 1
+            
+            if emotion not in emotions:
+                emotions[emotion] = 0
+            emotions[emotion] += 1
         
         return {
             "total_images": total_images,
@@ -453,21 +508,49 @@ def get_storage_stats() -> dict:
         return {}
 
 
+def _remove_empty_subdirs(directory: str, map_fn=map) -> tuple:
+    """
+    Bottom-up removal of empty subdirectories, one os.scandir per directory
+    
+    Args:
+        directory: Directory whose subdirectories are cleaned
+        map_fn: Applied over the direct subdirectories (an executor's map walks them in parallel)
+    
+    Returns:
+        (directory is now empty, number of subdirectories removed)
+    """
+    removed_dirs = 0
+    
+    with os.scandir(directory) as it:
+        entries = list(it)
+    
+    subdirs = [entry.path for entry in entries if entry.is_dir(follow_symlinks=False)]
+    has_content = len(subdirs) < len(entries)
+    
+    for subdir, (child_empty, child_removed) in zip(subdirs, map_fn(_remove_empty_subdirs, subdirs)):
+        removed_dirs += child_removed
+        if not child_empty:
+            has_content = True
+            continue
+        
+        try:
+            os.rmdir(subdir)
+            removed_dirs += 1
+            logger.info(f"Removed empty directory: {subdir}")
+        except Exception as e:
+            has_content = True
+            logger.warning(f"Could not remove directory {subdir}: {e}")
+    
+    return not has_content, removed_dirs
+
+
 def cleanup_empty_directories():
     """Clean up empty directories in storage"""
     try:
         removed_dirs = 0
-        
-        for root, dirs, files in os.walk(FACES_DIR, topdown=False):
-            for dir_name in dirs:
-                dir_path = os.path.join(root, dir_name)
-                try:
-                    if not os.listdir(dir_path):
-                        os.rmdir(dir_path)
-                        removed_dirs += 1
-                        logger.info(f"Removed empty directory: {dir_path}")
-                except Exception as e:
-                    logger.warning(f"Could not remove directory {dir_path}: {e}")
+        if os.path.isdir(FACES_DIR):
+            # One user directory per listing worker
+            _, removed_dirs = _remove_empty_subdirs(FACES_DIR, _listing_executor.map)
         
         logger.info(f"Cleaned up {removed_dirs} empty directories")
         return removed_dirs
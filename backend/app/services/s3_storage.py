@@ -1,37 +1,75 @@
 import boto3
+import asyncio
 import base64
 import logging
-from io import BytesIO
+from botocore.config import Config
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Uploads run in worker threads; the client's connection pool allows this many in flight
+S3_MAX_CONCURRENCY = 16
+
 s3_client = boto3.client(
     's3',
     aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
     aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
     region_name=settings.AWS_REGION,
+    config=Config(max_pool_connections=S3_MAX_CONCURRENCY),
 )
 
-async def upload_image_to_s3(base64_image: str, session_id: str) -> str:
-    """Upload base64 image to S3"""
+async def upload_image_to_s3(image, session_id: str, filename: str = "captured.jpg") -> str:
+    """
+    Upload an image to S3
+    
+    Args:
+        image: Raw image bytes (bytes, bytearray or memoryview), or a base64 / data URL string
+        session_id: Session the image belongs to
+        filename: Object name under the session prefix
+    
+    Returns:
+        S3 URI of the uploaded object
+    """
     try:
-        # Decode base64
-        if ',' in base64_image:
-            base64_image = base64_image.split(',')[1]
-        image_data = base64.b64decode(base64_image)
-        
-        # Upload to S3
-        key = f"sessions/{session_id}/captured.jpg"
-        s3_client.put_object(
+        # Raw bytes go straight to S3; only strings need base64 decoding
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            image_data = image
+        else:
+            if ',' in image:
+                image = image.split(',', 1)[1]
+            image_data = base64.b64decode(image)
+
+        # Upload to S3 (blocking boto3 call, off the event loop)
+        key = f"sessions/{session_id}/{filename}"
+        await asyncio.to_thread(
+            s3_client.put_object,
             Bucket=settings.AWS_S3_BUCKET,
             Key=key,
             Body=image_data,
             ContentType='image/jpeg',
         )
-        
+
         logger.info(f"Image uploaded to S3: {key}")
         return f"s3://{settings.AWS_S3_BUCKET}/{key}"
     except Exception as e:
         logger.error(f"S3 upload error: {e}")
         raise
+
+async def upload_images_to_s3(images: list, session_id: str) -> list:
+    """
+    Upload several images of one session with their requests overlapping
+
+    Args:
+        images: (image, filename) pairs; image as accepted by upload_image_to_s3
+        session_id: Session the images belong to
+
+    Returns:
+        S3 URIs, in the order of images
+    """
+    semaphore = asyncio.Semaphore(S3_MAX_CONCURRENCY)
+
+    async def upload(image, filename: str) -> str:
+        async with semaphore:
+            return await upload_image_to_s3(image, session_id, filename)
+
+    return await asyncio.gather(*(upload(image, filename) for image, filename in images))
@@ -1,4 +1,5 @@
 import os
+import asyncio
 import logging
 from typing import List, Dict, Any
 from datetime import datetime
@@ -9,12 +10,19 @@ logger = logging.getLogger(__name__)
 _pc = None
 _index = None
 
+# Pinecone's recommended maximum number of vectors per upsert request
+UPSERT_BATCH_SIZE = 100
+
 def _get_pinecone():
     """Initialize Pinecone only when first needed"""
     global _pc, _index
     if _pc is None:
         try:
-            from pinecone import Pinecone
+            # gRPC transport (pinecone-client[grpc]) has less per-request overhead than REST
+            try:
+                from pinecone.grpc import PineconeGRPC as Pinecone
+            except ImportError:
+                from pinecone import Pinecone
             api_key = os.environ.get("PINECONE_API_KEY")
             if not api_key:
                 logger.warning("PINECONE_API_KEY not set - vector DB disabled")
@@ -29,6 +37,11 @@ def _get_pinecone():
     
     return _pc, _index
 
+def _upsert_batches(index, vectors: list):
+    """Upsert vectors in as few requests as possible (UPSERT_BATCH_SIZE per request)"""
+    for start in range(0, len(vectors), UPSERT_BATCH_SIZE):
+        index.upsert(vectors=vectors[start:start + UPSERT_BATCH_SIZE])
+
 async def store_embedding(session_id: str, embedding: List[float], metadata: Dict[str, Any]) -> str:
     """Store face embedding in Pinecone"""
     try:
@@ -40,12 +53,8 @@ async def store_embedding(session_id: str, embedding: List[float], metadata: Dic
         # Create unique ID for vector
         vector_id = f"session_{session_id}_{metadata.get('timestamp', 'unknown')}"
         
-        # Upsert vector to Pinecone
-        index.upsert(
-            vectors=[
-                (vector_id, embedding, metadata)
-            ]
-        )
+        # Upsert vector to Pinecone (blocking client call, off the event loop)
+        await asyncio.to_thread(_upsert_batches, index, [(vector_id, embedding, metadata)])
         
         logger.info(f"Stored embedding: {vector_id}")
         return vector_id
@@ -53,6 +62,40 @@ async def store_embedding(session_id: str, embedding: List[float], metadata: Dic
         logger.error(f"Error storing embedding: {e}")
         raise
 
+async def store_embeddings(session_id: str, embeddings: List[List[float]], metadatas: List[Dict[str, Any]]) -> List[str]:
+    """
+    Store several face embeddings of one session in Pinecone
+    
+    All vectors go up in batched upserts (UPSERT_BATCH_SIZE per request)
+    instead of one round-trip per face.
+    
+    Args:
+        session_id: Session the faces belong to
+        embeddings: Face embeddings
+        metadatas: Metadata for each embedding
+    
+    Returns:
+        Vector ids, in the order of embeddings (None if Pinecone is unavailable)
+    """
+    try:
+        pc, index = _get_pinecone()
+        if index is None:
+            logger.warning("Pinecone not available, skipping embedding storage")
+            return None
+        
+        # Face number suffix keeps ids unique when faces share a timestamp
+        vectors = [
+            (f"session_{session_id}_{metadata.get('timestamp', 'unknown')}_{i}", embedding, metadata)
+            for i, (embedding, metadata) in enumerate(zip(embeddings, metadatas))
+        ]
+        await asyncio.to_thread(_upsert_batches, index, vectors)
+        
+        logger.info(f"Stored {len(vectors)} embeddings for session {session_id}")
+        return [vector_id for vector_id, _, _ in vectors]
+    except Exception as e:
+        logger.error(f"Error storing embeddings: {e}")
+        raise
+
 async def search_similar_faces(embedding: List[float], top_k: int = 10) -> List[Dict]:
     """Search for similar face embeddings"""
     try:
@@ -83,6 +126,21 @@ async def search_similar_faces(embedding: List[float], top_k: int = 10) -> List[
         logger.error(f"Error searching embeddings: {e}")
         raise
 
+def _delete_session_vectors(index, session_id: str):
+    """
+    Delete a session's vectors server-side, without fetching them first
+    
+    Pod-based indexes delete by metadata filter in one request; serverless
+    indexes reject filter deletes, so their ids are listed by prefix instead.
+    """
+    try:
+        index.delete(filter={"session_id": {"$eq": session_id}})
+    except Exception as e:
+        logger.debug(f"Filter delete unavailable ({e}), deleting by id prefix")
+        for vector_ids in index.list(prefix=f"session_{session_id}_"):
+            if vector_ids:
+                index.delete(ids=vector_ids)
+
 async def delete_session_vectors(session_id: str) -> bool:
     """Delete all vectors for a session (privacy)"""
     try:
@@ -91,19 +149,8 @@ async def delete_session_vectors(session_id: str) -> bool:
             logger.warning("Pinecone not available, skipping cleanup")
             return True
         
-        # Query by metadata
-        results = index.query(
-            vector=[0] * 512,  # Dummy vector
-            top_k=10000,
-            filter={"session_id": {"$eq": session_id}},
-            include_metadata=True
-        )
-        
-        # Delete matching vectors
-        vector_ids = [match['id'] for match in results.get('matches', [])]
-        if vector_ids:
-            index.delete(ids=vector_ids)
-            logger.info(f"Deleted {len(vector_ids)} vectors for session {session_id}")
+        await asyncio.to_thread(_delete_session_vectors, index, session_id)
+        logger.info(f"Deleted vectors for session {session_id}")
         
         return True
     except Exception as e:
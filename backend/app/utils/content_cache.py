@@ -0,0 +1,51 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+# Optional: xxHash (XXH3) fingerprints several times faster than blake2b
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+
+def content_key(data: bytes) -> str:
+    """Short content hash for cache keys (128-bit XXH3, else blake2b; not security-sensitive)"""
+    if XXHASH_AVAILABLE:
+        return xxhash.xxh3_128_hexdigest(data)
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def keyed_lru_cache(maxsize: int = 4096):
+    """
+    LRU cache keyed by a caller-supplied key instead of the arguments.
+    
+    The decorated function is called as f(key, *args); only key is stored,
+    so large arguments such as upload bytes are not kept alive by the cache.
+    """
+    def decorator(func):
+        cache = OrderedDict()
+        lock = threading.Lock()
+        
+        @wraps(func)
+        def wrapper(key, *args, **kwargs):
+            with lock:
+                if key in cache:
+                    cache.move_to_end(key)
+                    return cache[key]
+            
+            result = func(*args, **kwargs)
+            
+            with lock:
+                cache[key] = result
+                cache.move_to_end(key)
+                if len(cache) > maxsize:
+                    cache.popitem(last=False)
+            return result
+        
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    
+    return decorator
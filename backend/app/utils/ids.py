@@ -0,0 +1,30 @@
+import secrets
+import time
+import uuid
+from datetime import datetime, timezone
+
+_UTC = timezone.utc
+
+
+def fast_id() -> str:
+    """Random 32-character hex id from the OS CSPRNG (ids can end up in URLs and file names)"""
+    return secrets.token_hex(16)
+
+
+def utc_timestamp() -> str:
+    """Current UTC time as ISO-8601 with millisecond precision"""
+    return datetime.now(_UTC).isoformat(timespec='milliseconds')
+
+
+def iso_timestamp(timestamp: float) -> str:
+    """Local-time ISO-8601 string for a Unix timestamp ('' when missing); used when serializing scan results"""
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp is not None else ''
+
+
+def uuid7() -> uuid.UUID:
+    """Time-ordered UUID (version 7): 48-bit Unix milliseconds, then random bits"""
+    value = (time.time_ns() // 1_000_000) << 80 | secrets.randbits(80)
+    # Version 7 in bits 76-79, RFC 4122 variant in bits 62-63
+    value = (value & ~(0xF << 76)) | (0x7 << 76)
+    value = (value & ~(0x3 << 62)) | (0x2 << 62)
+    return uuid.UUID(int=value)
@@ -0,0 +1,54 @@
+import cv2
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Try to use libjpeg-turbo (SIMD Huffman + IDCT) for JPEG decoding
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJPF_RGB
+    _turbo_jpeg = TurboJPEG()
+    TURBOJPEG_AVAILABLE = True
+except (ImportError, RuntimeError, OSError):
+    # RuntimeError/OSError: the Python package is there but libturbojpeg is not
+    TURBOJPEG_AVAILABLE = False
+
+JPEG_MAGIC = b'\xff\xd8'
+
+
+def _decode_jpeg(image_data: bytes, pixel_format) -> np.ndarray:
+    """Decode JPEG bytes with TurboJPEG, or None to fall back to OpenCV"""
+    if not TURBOJPEG_AVAILABLE or image_data[:2] != JPEG_MAGIC:
+        return None
+    try:
+        return _turbo_jpeg.decode(image_data, pixel_format=pixel_format)
+    except Exception as e:
+        logger.debug(f"TurboJPEG decode failed, using OpenCV: {e}")
+        return None
+
+
+def decode_bgr(image_data: bytes) -> np.ndarray:
+    """
+    Decode image bytes into a BGR (H, W, 3) uint8 array
+    
+    Returns None if the bytes are not a decodable image.
+    """
+    image = _decode_jpeg(image_data, TJPF_BGR if TURBOJPEG_AVAILABLE else None)
+    if image is not None:
+        return image
+    return cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+
+
+def decode_rgb(image_data: bytes) -> np.ndarray:
+    """
+    Decode image bytes once into an RGB (H, W, 3) uint8 array
+    
+    Returns None if the bytes are not a decodable image.
+    """
+    image = _decode_jpeg(image_data, TJPF_RGB if TURBOJPEG_AVAILABLE else None)
+    if image is not None:
+        return image
+    image = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
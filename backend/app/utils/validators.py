@@ -0,0 +1,36 @@
+from fastapi import UploadFile
+
+from app.config import settings
+
+# Read uploads in bounded chunks rather than one unbounded read()
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Allowance for multipart boundaries and form fields around the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+async def read_upload(upload: UploadFile, max_bytes: int = settings.MAX_UPLOAD_BYTES) -> bytes:
+    """
+    Read an uploaded file in chunks, stopping as soon as it exceeds max_bytes.
+    
+    Returns:
+        The file contents, or None if the upload is larger than max_bytes
+    """
+    if upload.size is not None and upload.size > max_bytes:
+        return None
+    
+    data = bytearray()
+    while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+        data += chunk
+        if len(data) > max_bytes:
+            return None
+    
+    return bytes(data)
+
+
+def upload_too_large_error() -> dict:
+    """Error body for uploads over MAX_UPLOAD_BYTES"""
+    return {
+        "success": False,
+        "error": f"Image is too large (max {settings.MAX_UPLOAD_BYTES // (1024 * 1024)} MB)"
+    }
@@ -0,0 +1,67 @@
+"""
+Content-keyed cache tests
+Run from backend/: python -m pytest -q
+"""
+
+from app.utils.content_cache import XXHASH_AVAILABLE, content_key, keyed_lru_cache
+
+
+def test_keyed_lru_cache_hits_by_key_not_arguments():
+    calls = []
+    
+    @keyed_lru_cache(maxsize=4)
+    def double(value):
+        calls.append(value)
+        return value * 2
+    
+    assert double("k", 1) == 2
+    # Same key: cached result, even though the arguments differ
+    assert double("k", 5) == 2
+    assert calls == [1]
+
+
+def test_keyed_lru_cache_evicts_least_recently_used():
+    calls = []
+    
+    @keyed_lru_cache(maxsize=2)
+    def identity(value):
+        calls.append(value)
+        return value
+    
+    identity("a", 1)
+    identity("b", 2)
+    identity("a", 1)  # "a" is now most recently used
+    identity("c", 3)  # evicts "b"
+    
+    identity("a", 1)
+    assert calls == [1, 2, 3]
+    identity("b", 2)
+    assert calls == [1, 2, 3, 2]
+
+
+def test_keyed_lru_cache_clear():
+    calls = []
+    
+    @keyed_lru_cache(maxsize=2)
+    def identity(value):
+        calls.append(value)
+        return value
+    
+    identity("a", 1)
+    identity.cache_clear()
+    identity("a", 1)
+    assert calls == [1, 1]
+
+
+def test_content_key_depends_only_on_content():
+    assert content_key(b"image bytes") == content_key(bytearray(b"image bytes"))
+    assert content_key(b"image bytes") != content_key(b"image bytez")
+    assert len(content_key(b"")) == 32
+
+
+def test_content_key_accepts_memoryview_and_matches_hash_backend():
+    data = b"\xff\xd8 jpeg payload"
+    assert content_key(memoryview(data)) == content_key(data)
+    if XXHASH_AVAILABLE:
+        import xxhash
+        assert content_key(data) == xxhash.xxh3_128_hexdigest(data)
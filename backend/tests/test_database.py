@@ -0,0 +1,106 @@
+"""
+Emotion log buffer tests (no Postgres: the session factory is replaced)
+Run from backend/: python -m pytest -q
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app import main
+from app.services import database
+
+
+class FakeSessionFactory:
+    """Stands in for AsyncSessionLocal; records rows from each insert, or raises"""
+    
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.batches = []
+    
+    @asynccontextmanager
+    async def begin(self):
+        factory = self
+        
+        class Session:
+            async def execute(self, statement, rows):
+                if factory.fail:
+                    raise ConnectionError("database down")
+                factory.batches.append(list(rows))
+        
+        yield Session()
+
+
+@pytest.fixture(autouse=True)
+def empty_buffer():
+    database._emotion_log_buffer.clear()
+    yield
+    database._emotion_log_buffer.clear()
+
+
+def _log(session_id: str, label: str):
+    return database.insert_emotion_log("img", session_id, label, 0.9, {label: 0.9})
+
+
+def test_rows_are_buffered_until_a_batch_fills(monkeypatch):
+    sessions = FakeSessionFactory()
+    monkeypatch.setattr(database, "AsyncSessionLocal", sessions)
+    monkeypatch.setattr(database, "EMOTION_LOG_BATCH_SIZE", 3)
+    
+    async def run():
+        await _log("s1", "happy")
+        await _log("s1", "sad")
+        assert sessions.batches == []
+        await _log("s1", "fear")
+    
+    asyncio.run(run())
+    assert [[row["emotion_label"] for row in batch] for batch in sessions.batches] == [["happy", "sad", "fear"]]
+    assert database._emotion_log_buffer == {}
+
+
+def test_failed_write_requeues_rows_in_order_and_raises(monkeypatch):
+    sessions = FakeSessionFactory(fail=True)
+    monkeypatch.setattr(database, "AsyncSessionLocal", sessions)
+    
+    async def run():
+        await _log("s1", "happy")
+        await _log("s2", "sad")
+        with pytest.raises(ConnectionError):
+            await database.flush_emotion_logs()
+        # Logged while the write was failing; must stay behind the requeued rows
+        await _log("s1", "angry")
+        
+        sessions.fail = False
+        await database.flush_emotion_logs("s1")
+    
+    asyncio.run(run())
+    assert [[row["emotion_label"] for row in batch] for batch in sessions.batches] == [["happy", "angry"]]
+    assert [row["emotion_label"] for row in database._emotion_log_buffer["s2"]] == ["sad"]
+
+
+def test_lifespan_shutdown_flushes_buffered_logs(monkeypatch):
+    sessions = FakeSessionFactory()
+    monkeypatch.setattr(database, "AsyncSessionLocal", sessions)
+    
+    # Skip the startup work; only the shutdown flush is under test
+    async def no_db():
+        pass
+    
+    monkeypatch.setattr(main, "prepare_storage_dirs", lambda: None)
+    monkeypatch.setattr(main, "init_db", no_db)
+    monkeypatch.setattr(main, "sync_image_catalog", lambda faces_dir: None)
+    monkeypatch.setattr(main, "load_stored_face_index", lambda: None)
+    monkeypatch.setattr(main, "warm_up_emotion_model", lambda: None)
+    monkeypatch.setattr(main, "index_images_folder", lambda images_folder: {})
+    monkeypatch.setattr(main, "build_face_index", lambda indexed_faces: ([], None, None))
+    
+    async def run():
+        async with main.lifespan(main.app):
+            await _log("s1", "happy")
+            await _log("s2", "neutral")
+            assert sessions.batches == []
+    
+    asyncio.run(run())
+    assert sorted(row["emotion_label"] for batch in sessions.batches for row in batch) == ["happy", "neutral"]
+    assert database._emotion_log_buffer == {}
@@ -0,0 +1,89 @@
+"""
+HTTP endpoint tests (TestClient without the lifespan, so no model loading or indexing)
+Run from backend/: python -m pytest -q
+"""
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.main import app
+from app.services import image_storage
+
+client = TestClient(app)
+
+
+def test_oversized_upload_is_rejected_with_413_before_parsing():
+    response = client.post(
+        "/api/v1/analyze-face",
+        content=b"x",
+        headers={
+            "content-type": "multipart/form-data; boundary=x",
+            "content-length": str(settings.MAX_UPLOAD_BYTES * 2),
+        },
+    )
+    assert response.status_code == 413
+    assert response.json()["success"] is False
+
+
+@pytest.fixture
+def photo(tmp_path, monkeypatch):
+    """happy/photo.jpg (800x600) in a temporary local images folder, thumbnails under tmp_path"""
+    images = tmp_path / "images"
+    (images / "happy").mkdir(parents=True)
+    cv2.imwrite(str(images / "happy" / "photo.jpg"), np.full((600, 800, 3), 128, dtype=np.uint8))
+    monkeypatch.setattr(image_storage, "LOCAL_IMAGES_FOLDER", str(images))
+    monkeypatch.setattr(image_storage, "THUMBNAILS_DIR", str(tmp_path / "thumbnails"))
+    return images / "happy" / "photo.jpg"
+
+
+def test_image_serves_a_cacheable_thumbnail_by_default(photo):
+    response = client.get("/api/v1/image/happy/photo.jpg")
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpeg"
+    assert response.headers["cache-control"] == image_storage.IMAGE_CACHE_CONTROL
+    assert response.headers["etag"]
+    decoded = cv2.imdecode(np.frombuffer(response.content, dtype=np.uint8), cv2.IMREAD_COLOR)
+    assert decoded.shape[1] == image_storage.THUMBNAIL_WIDTH
+
+
+def test_image_full_serves_the_original(photo):
+    response = client.get("/api/v1/image/happy/photo.jpg", params={"full": "true"})
+    
+    assert response.status_code == 200
+    assert response.content == photo.read_bytes()
+    assert response.headers["etag"] != client.get("/api/v1/image/happy/photo.jpg").headers["etag"]
+
+
+def test_image_matching_if_none_match_gets_304(photo):
+    etag = client.get("/api/v1/image/happy/photo.jpg").headers["etag"]
+    
+    response = client.get("/api/v1/image/happy/photo.jpg", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+    
+    stale = client.get("/api/v1/image/happy/photo.jpg", headers={"If-None-Match": '"stale"'})
+    assert stale.status_code == 200
+
+
+def test_image_outside_the_folder_is_404(photo):
+    (photo.parent.parent.parent / "secret.txt").write_text("secret")
+    response = client.get("/api/v1/image/happy/..%2F..%2Fsecret.txt", params={"full": "true"})
+    assert response.status_code == 404
+
+
+def test_local_images_link_to_images_instead_of_inlining_them(photo):
+    listing = client.get("/api/v1/local-images").json()
+    
+    assert listing["success"] is True
+    [image] = listing["images"]
+    assert "image_base64" not in image
+    assert image["image_url"] == "/api/v1/image/happy/photo.jpg"
+    assert client.get(image["image_url"]).status_code == 200
+    
+    [inline_image] = client.get("/api/v1/local-images", params={"inline": "true"}).json()["images"]
+    assert inline_image["image_base64"]
@@ -0,0 +1,262 @@
+"""
+Images-folder face cache tests: .npy matrix generations, checkpoint journal,
+incremental reindexing and the inter-process cache lock
+Run from backend/: python -m pytest -q
+"""
+
+import os
+import pickle
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from app.services import face_recognition_service as frs
+
+
+@pytest.fixture
+def cache_files(tmp_path, monkeypatch):
+    """Point every cache file at tmp_path and start from an empty in-memory cache"""
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    monkeypatch.setattr(frs, "CACHE_FILE", str(cache_dir / "face_encodings_cache.pkl"))
+    monkeypatch.setattr(frs, "MATRIX_FILE_PREFIX", str(cache_dir / "face_encodings_matrix"))
+    monkeypatch.setattr(frs, "LOCK_FILE", str(cache_dir / "face_encodings_cache.lock"))
+    monkeypatch.setattr(frs, "JOURNAL_FILE", str(cache_dir / "face_encodings_journal.pkl"))
+    monkeypatch.setattr(frs, "FACE_ENCODINGS_CACHE", {})
+    monkeypatch.setattr(frs, "_cache_stamps", {})
+    monkeypatch.setattr(frs, "_cache_matrix", None)
+    return cache_dir
+
+
+def _matrix_files(cache_dir) -> list:
+    return sorted(path.name for path in cache_dir.glob("face_encodings_matrix.*.npy"))
+
+
+def _encoding(seed: float) -> np.ndarray:
+    return np.full(4, seed, dtype=np.float32)
+
+
+def test_save_then_load_round_trips_through_a_mapped_matrix(cache_files):
+    frs.FACE_ENCODINGS_CACHE = {"a.jpg": [_encoding(1)], "b.jpg": [_encoding(2), _encoding(3)]}
+    frs._cache_stamps = {"a.jpg": (1, 10), "b.jpg": (2, 20), "c.jpg": (3, 30)}
+    frs.save_face_encodings_cache()
+    
+    frs.FACE_ENCODINGS_CACHE, frs._cache_stamps = None, None
+    frs.load_face_encodings_cache()
+    
+    assert sorted(frs.FACE_ENCODINGS_CACHE) == ["a.jpg", "b.jpg"]
+    assert [float(encoding[0]) for encoding in frs.FACE_ENCODINGS_CACHE["b.jpg"]] == [2.0, 3.0]
+    # Faceless images keep their stamps so they are not re-extracted
+    assert frs._cache_stamps["c.jpg"] == (3, 30)
+    # Rows are views into the memory-mapped matrix, not heap copies
+    assert isinstance(frs.FACE_ENCODINGS_CACHE["a.jpg"][0].base, np.memmap)
+
+
+def test_each_save_writes_a_new_matrix_generation_and_drops_old_ones(cache_files):
+    frs.FACE_ENCODINGS_CACHE = {"a.jpg": [_encoding(1)]}
+    frs.save_face_encodings_cache()
+    first_generation = _matrix_files(cache_files)
+    mapped = frs.FACE_ENCODINGS_CACHE["a.jpg"][0]
+    
+    frs.FACE_ENCODINGS_CACHE = {"a.jpg": [_encoding(1)], "b.jpg": [_encoding(2)]}
+    frs.save_face_encodings_cache()
+    second_generation = _matrix_files(cache_files)
+    
+    assert len(first_generation) == len(second_generation) == 1
+    assert first_generation != second_generation
+    # The pickle names the current generation; no temp file is left behind
+    with open(frs.CACHE_FILE, 'rb') as f:
+        assert os.path.basename(pickle.load(f)['matrix']) == second_generation[0]
+    assert not list(cache_files.glob("*.tmp"))
+    # Arrays mapped from the previous generation stay readable
+    assert float(mapped[0]) == 1.0
+
+
+def test_cache_from_an_older_version_is_ignored(cache_files):
+    with open(frs.CACHE_FILE, 'wb') as f:
+        pickle.dump({'version': frs.CACHE_VERSION - 1, 'paths': ["a.jpg"]}, f)
+    
+    frs.load_face_encodings_cache()
+    assert frs.FACE_ENCODINGS_CACHE == {}
+    assert frs._cache_stamps == {}
+
+
+def test_journal_records_are_replayed_over_the_saved_cache(cache_files):
+    frs.FACE_ENCODINGS_CACHE = {"a.jpg": [_encoding(1)], "b.jpg": [_encoding(2)]}
+    frs._cache_stamps = {"a.jpg": (1, 1), "b.jpg": (2, 2)}
+    frs.save_face_encodings_cache()
+    
+    # b.jpg changed and lost its face, c.jpg is new; the later record wins for c.jpg
+    frs._append_journal({"c.jpg": [_encoding(3)]}, {"b.jpg": (5, 5), "c.jpg": (3, 3)})
+    frs._append_journal({"c.jpg": [_encoding(4)]}, {"c.jpg": (4, 4)})
+    frs.load_face_encodings_cache()
+    
+    assert sorted(frs.FACE_ENCODINGS_CACHE) == ["a.jpg", "c.jpg"]
+    assert float(frs.FACE_ENCODINGS_CACHE["c.jpg"][0][0]) == 4.0
+    assert frs._cache_stamps == {"a.jpg": (1, 1), "b.jpg": (5, 5), "c.jpg": (4, 4)}
+
+
+def test_torn_last_journal_record_is_dropped(cache_files):
+    frs._append_journal({"a.jpg": [_encoding(1)]}, {"a.jpg": (1, 1)})
+    record = pickle.dumps({'version': frs.CACHE_VERSION, 'faces': {}, 'stamps': {"b.jpg": (2, 2)}})
+    with open(frs.JOURNAL_FILE, 'ab') as f:
+        f.write(record[:len(record) // 2])
+    
+    assert [sorted(record['stamps']) for record in frs._read_journal()] == [["a.jpg"]]
+
+
+def test_full_save_folds_in_and_removes_the_journal(cache_files):
+    frs._append_journal({"a.jpg": [_encoding(1)]}, {"a.jpg": (1, 1)})
+    frs.load_face_encodings_cache()
+    frs.save_face_encodings_cache()
+    
+    assert not os.path.exists(frs.JOURNAL_FILE)
+    frs.load_face_encodings_cache()
+    assert sorted(frs.FACE_ENCODINGS_CACHE) == ["a.jpg"]
+
+
+def test_checkpoints_append_only_the_images_extracted_since_the_last_one(cache_files, monkeypatch):
+    monkeypatch.setattr(frs, "INDEX_SAVE_EVERY", 2)
+    monkeypatch.setattr(frs, "extract_face_encoding", lambda image_path: [_encoding(len(image_path))])
+    paths = [f"{name}.jpg" for name in "abcde"]
+    indexed = {}
+    
+    frs._index_paths(paths, map, indexed, {path: (1, 1) for path in paths})
+    
+    assert sorted(indexed) == paths
+    # Two full checkpoints of two images each; the fifth image waits for the caller's full save
+    assert [sorted(record['stamps']) for record in frs._read_journal()] == [["a.jpg", "b.jpg"], ["c.jpg", "d.jpg"]]
+
+
+@pytest.fixture
+def images_folder(tmp_path, cache_files, monkeypatch):
+    """(folder, extracted): fake images (files named *face* have one face) and the paths extracted so far"""
+    (tmp_path / "images" / "happy").mkdir(parents=True)
+    folder = (tmp_path / "images").resolve()  # index_images_folder keys the cache by resolved paths
+    for name in ("happy/face1.jpg", "happy/face2.jpg", "happy/landscape.jpg", "face3.png"):
+        (folder / name).write_bytes(b"x")
+    
+    extracted = []
+    
+    def fake_extract(image_path):
+        extracted.append(os.path.relpath(image_path, folder))
+        return [_encoding(len(extracted))] if "face" in os.path.basename(image_path) else []
+    
+    monkeypatch.setattr(frs, "extract_face_encoding", fake_extract)
+    return folder, extracted
+
+
+def test_unchanged_folder_is_not_extracted_or_saved_again(images_folder):
+    folder, extracted = images_folder
+    first = frs.index_images_folder(str(folder))
+    assert len(extracted) == 4
+    assert len(first) == 3
+    saved_at = os.stat(frs.CACHE_FILE).st_mtime_ns
+    
+    extracted.clear()
+    second = frs.index_images_folder(str(folder))
+    
+    # Faceless images are remembered too, so nothing is extracted
+    assert extracted == []
+    assert sorted(second) == sorted(first)
+    assert os.stat(frs.CACHE_FILE).st_mtime_ns == saved_at
+
+
+def test_only_changed_images_are_extracted_and_deleted_ones_drop_out(images_folder):
+    folder, extracted = images_folder
+    frs.index_images_folder(str(folder))
+    extracted.clear()
+    
+    (folder / "happy" / "face1.jpg").write_bytes(b"changed")
+    (folder / "face3.png").unlink()
+    (folder / "happy" / "face4.jpg").write_bytes(b"x")
+    indexed = frs.index_images_folder(str(folder))
+    
+    assert sorted(extracted) == [os.path.join("happy", "face1.jpg"), os.path.join("happy", "face4.jpg")]
+    assert sorted(os.path.relpath(path, folder) for path in indexed) == [
+        os.path.join("happy", "face1.jpg"), os.path.join("happy", "face2.jpg"), os.path.join("happy", "face4.jpg")
+    ]
+    assert not any(path.endswith("face3.png") for path in frs._cache_stamps)
+
+
+def test_force_reindex_extracts_every_image(images_folder):
+    folder, extracted = images_folder
+    frs.index_images_folder(str(folder))
+    extracted.clear()
+    
+    frs.index_images_folder(str(folder), force_reindex=True)
+    assert len(extracted) == 4
+
+
+def test_cache_saved_by_another_process_is_picked_up(images_folder):
+    folder, extracted = images_folder
+    frs.index_images_folder(str(folder))
+    extracted.clear()
+    
+    # A fresh worker has nothing in memory; it must reuse the saved cache
+    frs.FACE_ENCODINGS_CACHE, frs._cache_stamps = {}, {}
+    indexed = frs.index_images_folder(str(folder))
+    
+    assert extracted == []
+    assert len(indexed) == 3
+
+
+# Holds the cache lock in another process: argv = lock file, marker file, seconds to hold
+LOCK_HOLDER = """
+import sys, time
+from app.services import face_recognition_service as frs
+frs.LOCK_FILE = sys.argv[1]
+with frs._cache_lock():
+    open(sys.argv[2], 'w').close()
+    time.sleep(float(sys.argv[3]))
+"""
+
+
+def test_cache_lock_excludes_other_processes(cache_files):
+    marker = cache_files / "holder_has_lock"
+    holder = subprocess.Popen(
+        [sys.executable, "-c", LOCK_HOLDER, frs.LOCK_FILE, str(marker), "1.0"],
+        cwd=Path(__file__).resolve().parents[1]
+    )
+    try:
+        deadline = time.monotonic() + 60
+        while not marker.exists():
+            assert holder.poll() is None, "lock holder exited early"
+            assert time.monotonic() < deadline, "lock holder never took the lock"
+            time.sleep(0.01)
+        
+        started = time.monotonic()
+        with frs._cache_lock():
+            waited = time.monotonic() - started
+        assert waited > 0.5
+    finally:
+        assert holder.wait(timeout=60) == 0
+
+
+def test_concurrent_indexing_extracts_each_image_once(images_folder, monkeypatch):
+    folder, extracted = images_folder
+    fake_extract = frs.extract_face_encoding
+    
+    def extract_slowly(image_path):
+        time.sleep(0.05)  # Widen the window two unlocked indexers would race in
+        return fake_extract(image_path)
+    
+    monkeypatch.setattr(frs, "extract_face_encoding", extract_slowly)
+    results = []
+    workers = [
+        threading.Thread(target=lambda: results.append(frs.index_images_folder(str(folder))))
+        for _ in range(2)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    
+    # The second indexer waits, reloads the first one's cache and finds nothing to do
+    assert len(extracted) == 4
+    assert [len(result) for result in results] == [3, 3]
@@ -0,0 +1,33 @@
+"""
+Id and timestamp helper tests
+Run from backend/: python -m pytest -q
+"""
+
+import time
+import uuid
+
+from app.utils.ids import uuid7
+
+
+def test_uuid7_version_and_variant():
+    for _ in range(1000):
+        value = uuid7()
+        assert value.version == 7
+        assert value.variant == uuid.RFC_4122
+
+
+def test_uuid7_embeds_current_millis_and_is_unique():
+    before = time.time_ns() // 1_000_000
+    values = [uuid7() for _ in range(1000)]
+    after = time.time_ns() // 1_000_000
+    
+    for value in values:
+        assert before <= value.int >> 80 <= after
+    assert len(set(values)) == len(values)
+
+
+def test_uuid7_sorts_by_creation_time():
+    first = uuid7()
+    time.sleep(0.002)
+    second = uuid7()
+    assert first.int < second.int
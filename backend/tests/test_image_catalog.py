@@ -0,0 +1,81 @@
+"""
+SQLite image catalog tests
+Run from backend/: python -m pytest -q
+"""
+
+import pytest
+
+from app.services import image_catalog
+
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    """Empty catalog in tmp_path; returns the faces directory to sync"""
+    def close_connection():
+        conn = getattr(image_catalog._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            del image_catalog._local.conn
+    
+    close_connection()
+    monkeypatch.setattr(image_catalog, "CATALOG_FILE", str(tmp_path / "image_catalog.db"))
+    faces_dir = tmp_path / "faces"
+    faces_dir.mkdir()
+    yield faces_dir
+    close_connection()
+
+
+def _save(faces_dir, user_name: str, emotion: str, filename: str):
+    path = faces_dir / user_name / emotion / filename
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"image")
+    return str(path)
+
+
+def test_sync_adds_images_saved_before_the_catalog_existed(catalog):
+    _save(catalog, "alice", "happy", "1.jpg")
+    _save(catalog, "alice", "sad", "2.png")
+    _save(catalog, "bob", "happy", "3.jpg")
+    _save(catalog, "bob", "happy", "notes.txt")
+    (catalog / "stray.jpg").write_bytes(b"not in a user/emotion folder")
+    
+    image_catalog.sync_image_catalog(str(catalog))
+    
+    assert sorted(image["filename"] for image in image_catalog.list_images()) == ["1.jpg", "2.png", "3.jpg"]
+    assert [image["filename"] for image in image_catalog.list_images(user_name="alice", emotion="HAPPY")] == ["1.jpg"]
+    stats = image_catalog.catalog_stats()
+    assert stats["users"] == {"alice": 2, "bob": 1}
+    assert stats["emotions"] == {"happy": 2, "sad": 1}
+
+
+def test_sync_drops_deleted_images_and_their_stored_faces(catalog):
+    kept = _save(catalog, "alice", "happy", "1.jpg")
+    deleted = _save(catalog, "alice", "happy", "2.jpg")
+    image_catalog.sync_image_catalog(str(catalog))
+    image_catalog.add_face_encoding(kept, "alice", "happy", b"\0" * 16)
+    image_catalog.add_face_encoding(deleted, "alice", "happy", b"\1" * 16)
+    
+    (catalog / "alice" / "happy" / "2.jpg").unlink()
+    image_catalog.sync_image_catalog(str(catalog))
+    
+    assert [image["path"] for image in image_catalog.list_images()] == [kept]
+    assert [row[1] for row in image_catalog.face_encodings_after(0)] == [kept]
+
+
+def test_sync_keeps_rows_added_since_and_is_idempotent(catalog):
+    image_catalog.sync_image_catalog(str(catalog))
+    path = _save(catalog, "alice", "happy", "1.jpg")
+    image_catalog.add_image(path, "alice", "happy")
+    
+    image_catalog.sync_image_catalog(str(catalog))
+    image_catalog.sync_image_catalog(str(catalog))
+    
+    assert [image["path"] for image in image_catalog.list_images()] == [path]
+
+
+def test_face_encodings_after_returns_only_newer_rows(catalog):
+    image_catalog.add_face_encoding("a.jpg", "alice", "happy", b"a")
+    first_id = image_catalog.face_encodings_after(0)[-1][0]
+    image_catalog.add_face_encoding("b.jpg", "bob", "sad", b"b")
+    
+    assert [tuple(row)[1:] for row in image_catalog.face_encodings_after(first_id)] == [("b.jpg", "bob", "sad", b"b")]
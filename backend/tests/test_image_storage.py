@@ -0,0 +1,127 @@
+"""
+Image storage service tests
+Run from backend/: python -m pytest -q
+"""
+
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from app.services import image_storage
+
+
+@pytest.mark.parametrize("name, emotion", [
+    ("Happy_001.jpg", "happy"),
+    ("very-SAD", "sad"),
+    ("surprise", "surprise"),
+    ("img_0001.png", None),
+    # Several labels: the earliest in LOCAL_FOLDER_EMOTIONS wins, not the earliest in the name
+    ("sad_then_happy.jpg", "happy"),
+    ("neutral-angry", "angry"),
+    ("disgust_fear", "fear"),
+])
+def test_emotion_in_name(name, emotion):
+    assert image_storage._emotion_in_name(name) == emotion
+
+
+@pytest.fixture
+def local_folder(tmp_path, monkeypatch):
+    """Temporary local images folder holding happy/a.jpg, with a secret file beside it"""
+    images = tmp_path / "images"
+    (images / "happy").mkdir(parents=True)
+    (images / "happy" / "a.jpg").write_bytes(b"jpeg")
+    (tmp_path / "secret.txt").write_text("secret")
+    monkeypatch.setattr(image_storage, "LOCAL_IMAGES_FOLDER", str(images))
+    return images
+
+
+def test_resolve_image_id_finds_image_in_folder(local_folder):
+    resolved = image_storage.resolve_image_id("happy/a.jpg", "local_folder")
+    assert resolved == str((local_folder / "happy" / "a.jpg").resolve())
+
+
+@pytest.mark.parametrize("image_id", [
+    "../secret.txt",
+    "happy/../../secret.txt",
+    "happy/../../../etc/passwd",
+])
+def test_resolve_image_id_rejects_path_traversal(local_folder, image_id):
+    assert image_storage.resolve_image_id(image_id, "local_folder") is None
+
+
+def test_resolve_image_id_rejects_absolute_path(local_folder):
+    secret = local_folder.parent / "secret.txt"
+    assert image_storage.resolve_image_id(str(secret), "local_folder") is None
+
+
+def test_resolve_image_id_rejects_symlink_out_of_folder(local_folder):
+    link = local_folder / "happy" / "link.jpg"
+    try:
+        link.symlink_to(local_folder.parent / "secret.txt")
+    except OSError:
+        pytest.skip("symlinks not supported here")
+    assert image_storage.resolve_image_id("happy/link.jpg", "local_folder") is None
+
+
+def test_resolve_image_id_missing_file_and_unknown_source(local_folder):
+    assert image_storage.resolve_image_id("happy/missing.jpg", "local_folder") is None
+    assert image_storage.resolve_image_id("happy/a.jpg", "elsewhere") is None
+
+
+# ===== Thumbnails =====
+
+@pytest.fixture
+def photo(local_folder, tmp_path, monkeypatch):
+    """An 800x600 JPEG in the local folder, with thumbnails going under tmp_path"""
+    monkeypatch.setattr(image_storage, "THUMBNAILS_DIR", str(tmp_path / "thumbnails"))
+    path = local_folder / "happy" / "photo.jpg"
+    cv2.imwrite(str(path), np.full((600, 800, 3), 128, dtype=np.uint8))
+    return str(path)
+
+
+def test_thumbnail_is_a_256px_jpeg_keeping_aspect(photo):
+    thumbnail_path = image_storage.get_thumbnail_path(photo, "local_folder")
+    
+    assert thumbnail_path == os.path.join(image_storage.THUMBNAILS_DIR, "local_folder", "happy/photo.jpg.jpg")
+    height, width = cv2.imread(thumbnail_path).shape[:2]
+    assert (width, height) == (image_storage.THUMBNAIL_WIDTH, 192)
+
+
+def test_thumbnail_is_reused_until_the_original_changes(photo):
+    thumbnail_path = image_storage.get_thumbnail_path(photo, "local_folder")
+    made_at = os.stat(thumbnail_path).st_mtime_ns
+    
+    assert image_storage.get_thumbnail_path(photo, "local_folder") == thumbnail_path
+    assert os.stat(thumbnail_path).st_mtime_ns == made_at
+    
+    # Original edited after the thumbnail was made: rebuilt
+    os.utime(photo, ns=(made_at + 10**9, made_at + 10**9))
+    image_storage.get_thumbnail_path(photo, "local_folder")
+    assert os.stat(thumbnail_path).st_mtime_ns > made_at
+
+
+def test_small_images_are_not_upscaled(local_folder, tmp_path, monkeypatch):
+    monkeypatch.setattr(image_storage, "THUMBNAILS_DIR", str(tmp_path / "thumbnails"))
+    path = local_folder / "happy" / "small.jpg"
+    cv2.imwrite(str(path), np.zeros((50, 100, 3), dtype=np.uint8))
+    
+    thumbnail_path = image_storage.get_thumbnail_path(str(path), "local_folder")
+    assert cv2.imread(thumbnail_path).shape[:2] == (50, 100)
+
+
+def test_undecodable_image_has_no_thumbnail(local_folder, tmp_path, monkeypatch):
+    monkeypatch.setattr(image_storage, "THUMBNAILS_DIR", str(tmp_path / "thumbnails"))
+    # happy/a.jpg holds b"jpeg", not an image
+    assert image_storage.get_thumbnail_path(str(local_folder / "happy" / "a.jpg"), "local_folder") is None
+
+
+def test_etag_changes_with_the_file(photo):
+    etag = image_storage.get_image_etag(photo)
+    assert etag.startswith('"') and etag.endswith('"')
+    assert image_storage.get_image_etag(photo) == etag
+    
+    with open(photo, 'ab') as f:
+        f.write(b"\0")
+    assert image_storage.get_image_etag(photo) != etag
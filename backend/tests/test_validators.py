@@ -0,0 +1,35 @@
+"""
+Upload validation tests
+Run from backend/: python -m pytest -q
+"""
+
+import asyncio
+import io
+
+from fastapi import UploadFile
+
+from app.utils.validators import UPLOAD_CHUNK_SIZE, read_upload
+
+
+def _upload(data: bytes, size: int = None) -> UploadFile:
+    """UploadFile over data; size=None mimics a client that sent no part size"""
+    return UploadFile(file=io.BytesIO(data), filename="face.jpg", size=size)
+
+
+def test_read_upload_returns_whole_file_under_limit():
+    data = b"x" * (3 * UPLOAD_CHUNK_SIZE + 7)
+    assert asyncio.run(read_upload(_upload(data), max_bytes=len(data))) == data
+
+
+def test_read_upload_rejects_declared_size_over_limit():
+    upload = _upload(b"x" * 10, size=10_000)
+    assert asyncio.run(read_upload(upload, max_bytes=100)) is None
+    # Rejected from the declared size alone, before reading
+    assert upload.file.tell() == 0
+
+
+def test_read_upload_stops_streaming_once_over_limit():
+    data = b"x" * (4 * UPLOAD_CHUNK_SIZE)
+    upload = _upload(data)
+    assert asyncio.run(read_upload(upload, max_bytes=UPLOAD_CHUNK_SIZE + 1)) is None
+    assert upload.file.tell() < len(data)
@@ -1,4 +1,5 @@
 import React from 'react';
+import { API_BASE_URL } from '../utils/api';
 
 const ResultsComponent = ({ results }) => {
     if (!results) {
@@ -108,6 +109,7 @@ const ResultsComponent = ({ results }) => {
                         {similar_images.map((image, idx) => {
                             const imgEmoStyle = emotionColors[image.emotion] || emotionColors.neutral;
                             const imgConfidence = Math.round((image.confidence || 0.8) * 100);
+                            const imgSrc = image.image_base64 || (image.image_url && `${API_BASE_URL}${image.image_url}`);
                             return (
                                 <div
                                     key={idx}
@@ -115,9 +117,9 @@ const ResultsComponent = ({ results }) => {
                                 >
                                     {/* Image */}
                                     <div className="relative w-full h-48 bg-gray-100 overflow-hidden">
-                                        {image.image_base64 ? (
+                                        {imgSrc ? (
                                             <img
-                                                src={image.image_base64}
+                                                src={imgSrc}
                                                 alt={image.filename || `Image ${idx + 1}`}
                                                 className="w-full h-full object-cover"
                                             />